@@ -0,0 +1,409 @@
+# mcp-server-python/aggregation.py
+"""
+Server-side aggregation for the /aggregate endpoint.
+
+Requests use the same filters/ranges/search as /query, plus:
+
+    {
+        "group_by": ["department"],
+        "metrics": [
+            {"op": "count"},
+            {"op": "sum", "field": "project_hours", "as": "total_hours"},
+            {"op": "p90", "field": "project_hours"}
+        ],
+        "sort": {"field": "total_hours", "order": "desc"},
+        "limit": 10
+    }
+
+Supported ops are count, sum, mean, min, max, median and pNN percentiles.
+Matching rows are selected through the query planner (indexes included),
+then grouped and aggregated in one vectorized pandas pass, so only the
+aggregate rows are returned.
+
+Data processed in pieces (chunks or partitions) is aggregated through
+PartialAggregate. Percentiles there are computed exactly from per-group
+counts of each distinct value, so their memory grows with the number of
+distinct values, not matching rows; a field with more than
+PERCENTILE_MAX_VALUES distinct (group, value) pairs raises
+TooManyPercentileValues.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+from query_planner import (
+    QueryValidationError,
+    _normalize_int,
+    build_plan,
+    column_kind,
+    evaluate_predicates,
+    normalize_request,
+    result_records,
+)
+
+NUMERIC_OPS = ('sum', 'mean', 'median')
+ORDERED_OPS = ('min', 'max')
+PERCENTILE_PATTERN = re.compile(r'^p(\d{1,2}(?:\.\d+)?)$')
+
+# Distinct (group, value) pairs a partial aggregate keeps per percentile field
+PERCENTILE_MAX_VALUES = 100_000
+
+# Column of the per-value row counts kept for percentiles
+VALUE_COUNT = '.rows'
+
+
+class TooManyPercentileValues(QueryValidationError):
+    """A percentile field has too many distinct values to aggregate in pieces."""
+
+    def __init__(self, column: str):
+        super().__init__({
+            "error": f"Too many distinct {column} values for a percentile over data processed in pieces "
+                     f"(more than {PERCENTILE_MAX_VALUES})",
+            "hint": "Narrow the filters, or load the data in memory"
+        })
+
+
+@dataclass(frozen=True)
+class Metric:
+    op: str
+    field: Optional[str]
+    name: str
+    quantile: Optional[float] = None
+
+
+@dataclass
+class AggregateSpec:
+    group_by: List[str] = field(default_factory=list)
+    metrics: List[Metric] = field(default_factory=list)
+    sort_by: Optional[str] = None
+    ascending: bool = True
+    limit: Optional[int] = None
+
+    def cache_key(self) -> Tuple:
+        return (tuple(self.group_by), tuple(self.metrics), self.sort_by, self.ascending, self.limit)
+
+
+def _parse_metric(frame: pd.DataFrame, raw: Any) -> Metric:
+    if isinstance(raw, str):
+        raw = {"op": raw}
+    if not isinstance(raw, dict) or 'op' not in raw:
+        raise QueryValidationError({"error": f"Invalid metric: {raw}"})
+    op = str(raw['op']).lower()
+    column = raw.get('field')
+    quantile = None
+
+    match = PERCENTILE_PATTERN.match(op)
+    if op == 'median':
+        quantile = 0.5
+    elif match:
+        quantile = float(match.group(1)) / 100
+    elif op not in ('count',) + NUMERIC_OPS + ORDERED_OPS:
+        raise QueryValidationError({
+            "error": f"Unknown aggregate op: {op}",
+            "valid_ops": ['count', 'sum', 'mean', 'min', 'max', 'median', 'pNN']
+        })
+
+    if op != 'count' or column is not None:
+        if column not in frame.columns:
+            raise QueryValidationError({
+                "error": f"Invalid aggregate field: {column}",
+                "valid_fields": frame.columns.tolist()
+            })
+        kind = column_kind(frame[column])
+        if op in ORDERED_OPS and kind == 'string':
+            raise QueryValidationError({"error": f"{op} needs a numeric or date field: {column}"})
+        if op not in ('count',) + ORDERED_OPS and kind != 'numeric':
+            raise QueryValidationError({"error": f"{op} needs a numeric field: {column}"})
+
+    name = raw.get('as') or (op if column is None else f"{op}_{column}")
+    return Metric(op=op, field=column, name=name, quantile=quantile)
+
+
+def parse_aggregate_request(frame: pd.DataFrame, query_data: Dict[str, Any]) -> AggregateSpec:
+    """Validate group_by, metrics and output sort/limit of an /aggregate request."""
+    spec = AggregateSpec()
+    group_by = query_data.get('group_by') or []
+    spec.group_by = [group_by] if isinstance(group_by, str) else group_by
+    if not isinstance(spec.group_by, list) or not all(isinstance(column, str) for column in spec.group_by):
+        raise QueryValidationError({
+            "error": f"Invalid group_by: {group_by}",
+            "expected": "a field name or a list of field names"
+        })
+    for column in spec.group_by:
+        if column not in frame.columns:
+            raise QueryValidationError({
+                "error": f"Invalid group_by field: {column}",
+                "valid_fields": frame.columns.tolist()
+            })
+
+    metrics = query_data.get('metrics') or ['count']
+    if not isinstance(metrics, list):
+        raise QueryValidationError({
+            "error": f"Invalid metrics: {metrics}",
+            "expected": "a list of metrics, e.g. [\"count\", {\"op\": \"sum\", \"field\": \"project_hours\"}]"
+        })
+    spec.metrics = [_parse_metric(frame, raw) for raw in metrics]
+    names = [metric.name for metric in spec.metrics]
+    if len(set(names)) != len(names) or set(names) & set(spec.group_by):
+        raise QueryValidationError({"error": "Aggregate output names must be unique", "names": names})
+
+    sort_config = query_data.get('sort')
+    if isinstance(sort_config, dict):
+        spec.sort_by, order = sort_config.get('field'), sort_config.get('order', 'asc')
+    else:
+        spec.sort_by, order = sort_config, 'asc'
+    if spec.sort_by is not None and spec.sort_by not in spec.group_by + names:
+        raise QueryValidationError({
+            "error": f"Invalid sort field: {spec.sort_by}",
+            "valid_fields": spec.group_by + names
+        })
+    if order not in ('asc', 'desc'):
+        raise QueryValidationError({"error": f"Invalid sort order: {order}", "valid_orders": ['asc', 'desc']})
+    spec.ascending = order == 'asc'
+
+    spec.limit = _normalize_int('limit', query_data.get('limit'), None)
+    return spec
+
+
+def plan_aggregate(frame: pd.DataFrame, query_data: Dict[str, Any], indexes: Optional[Any] = None):
+    """Build the row-selection plan (filters/ranges/search only) and the aggregate spec."""
+    normalized = normalize_request(query_data, frame.columns.tolist())
+    plan = build_plan(
+        frame,
+        filters=normalized['filters'],
+        ranges=normalized['ranges'],
+        search=normalized['search'],
+        indexes=indexes
+    )
+    return plan, parse_aggregate_request(frame, query_data)
+
+
+def _aggregate_frame(rows: pd.DataFrame, spec: AggregateSpec) -> pd.DataFrame:
+    """Compute every metric for ``rows``, grouped by spec.group_by."""
+    if spec.group_by:
+        grouped = rows.groupby(spec.group_by, observed=True, dropna=False, sort=True)
+        size = grouped.size()
+    else:
+        grouped = None
+        size = len(rows)
+
+    columns = {}
+    for metric in spec.metrics:
+        source = None if metric.field is None else (
+            rows[metric.field] if grouped is None else grouped[metric.field]
+        )
+        if metric.op == 'count':
+            values = size if source is None else source.count()
+        elif metric.quantile is not None:
+            values = source.quantile(metric.quantile)
+        else:
+            values = getattr(source, metric.op)()
+        if grouped is None:
+            values = pd.Series([values])
+        columns[metric.name] = values
+
+    result = pd.DataFrame(columns)
+    if grouped is None:
+        return result.reset_index(drop=True)
+    return result.reset_index()
+
+
+def _needed_columns(spec: AggregateSpec) -> List[str]:
+    return list(dict.fromkeys(
+        spec.group_by + [metric.field for metric in spec.metrics if metric.field is not None]
+    ))
+
+
+def _matching_rows(frame: pd.DataFrame, positions: np.ndarray, spec: AggregateSpec) -> pd.DataFrame:
+    needed = _needed_columns(spec)
+    return frame[needed].take(positions) if needed else pd.DataFrame(index=np.arange(len(positions)))
+
+
+def _finish(result: pd.DataFrame, spec: AggregateSpec, timer: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """Order and truncate the aggregate rows, then convert them to records."""
+    with timed(timer, 'sort'):
+        if spec.sort_by is not None:
+            result = result.sort_values(spec.sort_by, ascending=spec.ascending, kind='stable', na_position='last')
+        if spec.limit is not None:
+            result = result.head(spec.limit)
+    return result_records(result)
+
+
+def run_aggregate(
+    frame: pd.DataFrame,
+    plan: Any,
+    spec: AggregateSpec,
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Return (aggregate rows, number of matching input rows)."""
+    with timed(timer, 'filter'):
+        positions = evaluate_predicates(frame, plan, indexes, timer)
+    with timed(timer, 'aggregate'):
+        result = _aggregate_frame(_matching_rows(frame, positions, spec), spec)
+    return _finish(result, spec, timer), len(positions)
+
+
+# --- Partial aggregates, for data processed in pieces (see chunked_scan.py, parallel_scan.py) ---
+
+# How partial values of each op combine
+MERGE_OPS = {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def _partial_spec(spec: AggregateSpec) -> AggregateSpec:
+    """Mergeable metrics standing in for spec's: mean becomes sum + count."""
+    metrics = []
+    for metric in spec.metrics:
+        if metric.op == 'mean':
+            metrics.append(Metric('sum', metric.field, metric.name + '.sum'))
+            metrics.append(Metric('count', metric.field, metric.name + '.count'))
+        elif metric.quantile is None:
+            metrics.append(metric)
+    if not metrics:
+        # Only percentiles: a row count keeps one partial row per group
+        metrics.append(Metric('count', None, '.matches'))
+    return AggregateSpec(group_by=spec.group_by, metrics=metrics)
+
+
+def _value_keys(group_by: List[str], column: str) -> List[str]:
+    return list(dict.fromkeys(group_by + [column]))
+
+
+def _value_counts(rows: pd.DataFrame, group_by: List[str], column: str) -> pd.DataFrame:
+    """Rows per (group, non-missing value of ``column``)."""
+    keys = _value_keys(group_by, column)
+    values = rows[keys].dropna(subset=[column])
+    return values.groupby(keys, observed=True, dropna=False, sort=False).size().reset_index(name=VALUE_COUNT)
+
+
+def _merge_value_counts(tables: List[pd.DataFrame], group_by: List[str], column: str) -> pd.DataFrame:
+    keys = _value_keys(group_by, column)
+    combined = pd.concat(tables, ignore_index=True)
+    return combined.groupby(keys, observed=True, dropna=False, sort=False)[VALUE_COUNT].sum().reset_index()
+
+
+def _quantiles_of_counts(table: pd.DataFrame, group_by: List[str], metric: Metric) -> pd.DataFrame:
+    """
+    Per group, the linearly interpolated quantile (as pandas computes it)
+    of metric.field's values, each repeated by its row count.
+    """
+    table = table.sort_values(_value_keys(group_by, metric.field), na_position='last', ignore_index=True)
+    if group_by:
+        ids = table.groupby(group_by, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, dtype=np.intp)
+    else:
+        starts = np.zeros(1 if len(table) else 0, dtype=np.intp)
+
+    values = table[metric.field].to_numpy(dtype=np.float64)
+    ends = np.cumsum(table[VALUE_COUNT].to_numpy(dtype=np.int64))
+    before = np.r_[0, ends][starts]
+    totals = np.r_[ends[starts[1:] - 1], ends[-1:]] - before if len(starts) else before
+    position = (totals - 1) * metric.quantile
+    below = np.floor(position).astype(np.int64)
+    low = values[np.searchsorted(ends, before + below, 'right')]
+    high = values[np.searchsorted(ends, before + np.minimum(below + 1, totals - 1), 'right')]
+
+    result = table.loc[starts, group_by].reset_index(drop=True)
+    result[metric.name] = low + (high - low) * (position - below)
+    if not group_by and result.empty:
+        result = pd.DataFrame({metric.name: [np.nan]})
+    return result
+
+
+class PartialAggregate:
+    """
+    Running aggregate over pieces of the matching rows.
+
+    Counts, sums, minima and maxima are reduced per piece and merged, and
+    means are carried as sum + count. Percentiles cannot be merged from
+    partial results, so each percentile field keeps its rows per distinct
+    (group, value) pair, capped at PERCENTILE_MAX_VALUES pairs; beyond that
+    the values are dropped and result() raises TooManyPercentileValues.
+    """
+
+    def __init__(self, spec: AggregateSpec):
+        self.spec = spec
+        self.partial_spec = _partial_spec(spec)
+        self.quantiles = [metric for metric in spec.metrics if metric.quantile is not None]
+        self.partials: List[pd.DataFrame] = []
+        self.value_counts: Dict[str, pd.DataFrame] = {}
+        self.overflow: Optional[str] = None
+        self.matches = 0
+
+    def add(self, frame: pd.DataFrame, positions: np.ndarray) -> None:
+        rows = _matching_rows(frame, positions, self.spec)
+        self.matches += len(rows)
+        partial = _aggregate_frame(rows, self.partial_spec)
+        self.partials = [self._merge(self.partials + [partial])]
+        if self.quantiles and self.overflow is None:
+            self._merge_values({
+                column: _value_counts(rows, self.spec.group_by, column)
+                for column in dict.fromkeys(metric.field for metric in self.quantiles)
+            })
+
+    def merge(self, other: 'PartialAggregate') -> None:
+        """Fold in the aggregate of another piece (e.g. from a worker process)."""
+        self.matches += other.matches
+        if other.partials:
+            self.partials = [self._merge(self.partials + other.partials)]
+        if other.overflow is not None:
+            self.overflow, self.value_counts = self.overflow or other.overflow, {}
+        elif self.quantiles and self.overflow is None:
+            self._merge_values(other.value_counts)
+
+    def _merge_values(self, tables: Dict[str, pd.DataFrame]) -> None:
+        for column, table in tables.items():
+            if column in self.value_counts:
+                table = _merge_value_counts([self.value_counts[column], table], self.spec.group_by, column)
+            if len(table) > PERCENTILE_MAX_VALUES:
+                self.overflow, self.value_counts = column, {}
+                return
+            self.value_counts[column] = table
+
+    def _merge(self, partials: List[pd.DataFrame]) -> pd.DataFrame:
+        combined = pd.concat(partials, ignore_index=True)
+        how = {metric.name: MERGE_OPS[metric.op] for metric in self.partial_spec.metrics}
+        if not self.spec.group_by:
+            return combined.agg(how).to_frame().T.infer_objects()
+        return combined.groupby(self.spec.group_by, dropna=False, sort=True).agg(how).reset_index()
+
+    def result(self, empty: pd.DataFrame) -> pd.DataFrame:
+        """
+        Final aggregate rows; ``empty`` is a zero-row frame with the source
+        schema, used when nothing was added.
+        """
+        no_rows = _matching_rows(empty, np.empty(0, dtype=np.intp), self.spec)
+        group_by = self.spec.group_by
+        merged = self.partials[0] if self.partials else _aggregate_frame(no_rows, self.partial_spec)
+        if not group_by and merged.empty:
+            # Only percentiles were requested: one output row regardless
+            merged = pd.DataFrame(index=[0])
+
+        columns = {column: merged[column] for column in group_by}
+        for metric in self.spec.metrics:
+            if metric.op == 'mean':
+                count = merged[metric.name + '.count']
+                columns[metric.name] = (merged[metric.name + '.sum'] / count).where(count > 0)
+            elif metric.quantile is None:
+                columns[metric.name] = merged[metric.name]
+        result = pd.DataFrame(columns, index=merged.index)
+
+        if self.overflow is not None:
+            raise TooManyPercentileValues(self.overflow)
+        for metric in self.quantiles:
+            table = self.value_counts.get(metric.field)
+            if table is None:
+                table = _value_counts(no_rows, group_by, metric.field)
+            quantiles = _quantiles_of_counts(table, group_by, metric)
+            if group_by:
+                result = result.merge(quantiles, on=group_by, how='left')
+            else:
+                result[metric.name] = quantiles[metric.name].to_numpy()
+        return result[group_by + [metric.name for metric in self.spec.metrics]].reset_index(drop=True)
+
+    def records(self, empty: pd.DataFrame, timer: Optional[Any] = None) -> List[Dict[str, Any]]:
+        return _finish(self.result(empty), self.spec, timer)
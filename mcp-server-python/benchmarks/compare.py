@@ -0,0 +1,69 @@
+# mcp-server-python/benchmarks/compare.py
+"""
+Compare two benchmark reports written by benchmarks/run_benchmark.py.
+
+    python -m benchmarks.compare baseline.json candidate.json
+
+Prints p50, p99 and throughput per query side by side with the relative
+change, and flags latency regressions above --threshold percent.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional
+
+
+def _change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def _cell(before: Optional[float], after: Optional[float]) -> str:
+    change = _change(before, after)
+    delta = "" if change is None else f" ({change:+.1f}%)"
+    return f"{before if before is not None else '-'} -> {after if after is not None else '-'}{delta}"
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> int:
+    """Print the comparison; returns how many queries regressed."""
+    for key in ("rows", "mode", "concurrency", "cache"):
+        if baseline["meta"].get(key) != candidate["meta"].get(key):
+            print(f"warning: {key} differs ({baseline['meta'].get(key)} vs {candidate['meta'].get(key)})")
+
+    regressions = 0
+    print(f"{'query':<36} {'p50 ms':<28} {'p99 ms':<28} {'throughput qps':<28}")
+    for name in sorted(set(baseline["queries"]) | set(candidate["queries"])):
+        before = baseline["queries"].get(name, {})
+        after = candidate["queries"].get(name, {})
+        p50 = (before.get("latency_ms", {}).get("p50"), after.get("latency_ms", {}).get("p50"))
+        p99 = (before.get("latency_ms", {}).get("p99"), after.get("latency_ms", {}).get("p99"))
+        qps = (before.get("throughput_qps"), after.get("throughput_qps"))
+        regressed = (_change(*p50) or 0) > threshold
+        regressions += regressed
+        print(f"{name:<36} {_cell(*p50):<28} {_cell(*p99):<28} {_cell(*qps):<28}{'  REGRESSED' if regressed else ''}")
+
+    peak = (baseline["meta"].get("peak_rss_bytes"), candidate["meta"].get("peak_rss_bytes"))
+    if all(peak):
+        print(f"peak RSS: {peak[0] / 2**20:.1f} MiB -> {peak[1] / 2**20:.1f} MiB ({_change(*peak):+.1f}%)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="p50 increase (percent) reported as a regression (default: 10)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.candidate) as handle:
+        candidate = json.load(handle)
+    # A non-zero exit lets CI fail on regressions
+    sys.exit(1 if compare(baseline, candidate, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
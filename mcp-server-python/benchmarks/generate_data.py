@@ -0,0 +1,138 @@
+# mcp-server-python/benchmarks/generate_data.py
+"""
+Synthetic datasets with the schema of data/sample_data.csv.
+
+    python -m benchmarks.generate_data --rows 1000000 --output data/bench_1m.csv
+
+Columns are id, name, department, project_hours, join_date, status, role.
+Values are skewed the way real HR data is rather than uniform:
+- departments follow a long-tailed distribution (Engineering is about a
+  third of the rows);
+- each department has its own roles, weighted towards junior ones;
+- first names are Zipf-distributed over a pool of names;
+- most people are active;
+- project hours are log-normal and depend on the role;
+- hiring accelerates towards recent years.
+
+A small share of project_hours is left empty so missing-value handling
+is exercised.
+
+Rows are generated and written in blocks, so memory stays flat up to
+50M+ rows. The same --seed always produces the same file.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Rows generated and written per block
+BLOCK_ROWS = 500_000
+
+DEPARTMENTS = {
+    "Engineering": 0.34, "Sales": 0.18, "Marketing": 0.12, "Support": 0.10, "Operations": 0.08,
+    "Finance": 0.06, "HR": 0.05, "Legal": 0.03, "Research": 0.03, "Facilities": 0.01,
+}
+
+# Roles per department with their weights and median monthly project hours
+ROLES = {
+    "Engineering": [("Developer", 0.45, 140), ("Senior Developer", 0.25, 160), ("Lead Developer", 0.08, 180),
+                    ("Intern", 0.12, 60), ("QA Engineer", 0.10, 130)],
+    "Sales": [("Sales Executive", 0.6, 120), ("Sales Manager", 0.15, 150), ("Account Manager", 0.25, 130)],
+    "Marketing": [("Content Writer", 0.35, 90), ("Marketing Specialist", 0.4, 110), ("Marketing Manager", 0.25, 140)],
+    "Support": [("Support Agent", 0.75, 150), ("Support Lead", 0.25, 160)],
+    "Operations": [("Operations Analyst", 0.6, 120), ("Operations Manager", 0.4, 140)],
+    "Finance": [("Accountant", 0.6, 130), ("Financial Analyst", 0.3, 140), ("Controller", 0.1, 160)],
+    "HR": [("HR Assistant", 0.4, 80), ("HR Specialist", 0.45, 100), ("HR Manager", 0.15, 120)],
+    "Legal": [("Paralegal", 0.5, 110), ("Counsel", 0.5, 150)],
+    "Research": [("Research Scientist", 0.7, 170), ("Research Intern", 0.3, 70)],
+    "Facilities": [("Facilities Coordinator", 1.0, 100)],
+}
+
+STATUSES = {"active": 0.86, "inactive": 0.09, "on_leave": 0.05}
+
+FIRST_NAMES = [
+    "Alice", "Bob", "Charlie", "Diana", "Ethan", "Fiona", "George", "Hannah", "Ivan", "Julia",
+    "Kevin", "Laura", "Michael", "Nathan", "Olivia", "Paul", "Quinn", "Rachel", "Samuel", "Tina",
+    "Umar", "Victoria", "William", "Xenia", "Yusuf", "Zoe", "Aiden", "Bella", "Carlos", "Daniela",
+    "Elena", "Farid", "Grace", "Hiro", "Isabel", "Jamal", "Keiko", "Liam", "Maya", "Noah",
+    "Omar", "Priya", "Rafael", "Sofia", "Tomas", "Uma", "Viktor", "Wei", "Yara", "Zain",
+]
+
+# Zipf weights: the n-th name is about 1/n as common as the first
+NAME_WEIGHTS = 1.0 / np.arange(1, len(FIRST_NAMES) + 1) ** 1.1
+NAME_WEIGHTS /= NAME_WEIGHTS.sum()
+
+FIRST_JOIN_YEAR = 2005
+LAST_JOIN_DATE = pd.Timestamp("2024-12-31")
+
+# Share of rows whose project_hours is left empty
+MISSING_HOURS_RATE = 0.005
+
+
+def _weights(values) -> np.ndarray:
+    weights = np.asarray(values, dtype=float)
+    return weights / weights.sum()
+
+
+def _block(rng: np.random.Generator, start_id: int, rows: int) -> pd.DataFrame:
+    departments = np.array(list(DEPARTMENTS))
+    department_codes = rng.choice(len(departments), rows, p=_weights(list(DEPARTMENTS.values())))
+
+    roles = np.empty(rows, dtype=object)
+    median_hours = np.empty(rows)
+    for code, department in enumerate(departments):
+        members = np.flatnonzero(department_codes == code)
+        names, weights, hours = zip(*ROLES[department])
+        picks = rng.choice(len(names), len(members), p=_weights(weights))
+        roles[members] = np.array(names, dtype=object)[picks]
+        median_hours[members] = np.array(hours)[picks]
+
+    name_ranks = rng.choice(len(FIRST_NAMES), rows, p=NAME_WEIGHTS)
+    hours = np.clip(np.rint(median_hours * rng.lognormal(0.0, 0.35, rows)), 0, 400)
+    hours[rng.random(rows) < MISSING_HOURS_RATE] = np.nan
+
+    # Join dates skew recent: the square root of a uniform draw leans towards 1
+    span = (LAST_JOIN_DATE - pd.Timestamp(f"{FIRST_JOIN_YEAR}-01-01")).days
+    days_before_end = ((1.0 - np.sqrt(rng.random(rows))) * span).astype(np.int64)
+    join_dates = LAST_JOIN_DATE - pd.to_timedelta(days_before_end, unit="D")
+
+    statuses = np.array(list(STATUSES))
+    return pd.DataFrame({
+        "id": np.arange(start_id, start_id + rows),
+        "name": np.array(FIRST_NAMES, dtype=object)[name_ranks],
+        "department": departments[department_codes],
+        "project_hours": pd.array(hours, dtype="Int64"),
+        "join_date": join_dates.strftime("%Y-%m-%d"),
+        "status": statuses[rng.choice(len(statuses), rows, p=_weights(list(STATUSES.values())))],
+        "role": roles,
+    })
+
+
+def generate(path: str, rows: int, seed: int = 42, block_rows: int = BLOCK_ROWS) -> None:
+    """Write ``rows`` synthetic rows to ``path`` as CSV."""
+    rng = np.random.default_rng(seed)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", newline="") as handle:
+        for start in range(0, rows, block_rows):
+            block = _block(rng, start + 1, min(block_rows, rows - start))
+            block.to_csv(handle, index=False, header=start == 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows to generate (default: 100000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--output", default=None, help="CSV path (default: data/bench_<rows>.csv)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join("data", f"bench_{args.rows}.csv")
+    started = time.perf_counter()
+    generate(output, args.rows, args.seed)
+    print(f"Wrote {args.rows:,} rows to {output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
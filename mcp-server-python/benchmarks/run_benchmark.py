@@ -0,0 +1,331 @@
+# mcp-server-python/benchmarks/run_benchmark.py
+"""
+Benchmark the /query path on a generated dataset.
+
+    python -m benchmarks.run_benchmark --data data/bench_1000000.csv
+    python -m benchmarks.run_benchmark --data data/bench_1000000.csv --mode http --concurrency 8
+
+Each query of the workload (benchmarks/workload.json) is run --warmup
+times untimed, then --iterations times, and reported with its throughput,
+latency mean and percentiles, and the rows it returned and matched.
+
+Modes:
+- inprocess: loads the data in this process and awaits main.handle_query
+  with requests built in memory (no network, no middleware), one call at
+  a time. Queries that main.query_data_source can express (no search,
+  offset or cursor) are also timed through it as "<name>:function".
+- http: starts benchmarks/server.py on the dataset (or uses --url) and
+  drives it over HTTP from --concurrency client threads.
+
+Peak memory is the peak RSS of the process holding the data. The result
+cache is disabled unless --cache is given, so repeated runs of a query do
+the full work every time.
+
+The report is JSON with sorted keys (stdout, or --output), so two runs can
+be compared with benchmarks/compare.py or a plain diff.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORKLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workload.json")
+
+# How long to wait for the benchmark server to load the data and listen
+SERVER_START_TIMEOUT_SECONDS = 600
+
+PERCENTILES = (50, 90, 99)
+
+# Runs one query body and returns (rows returned, total matches); raises on failure
+Call = Callable[[Dict[str, Any]], Tuple[int, Optional[int]]]
+
+
+def summarize(
+    latencies: List[float], wall_seconds: float, errors: int, returned: int, matches: Optional[int]
+) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "iterations": len(latencies) + errors,
+        "errors": errors,
+        "throughput_qps": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else None,
+        "rows_returned": returned,
+        "total_matches": matches,
+    }
+    if latencies:
+        millis = np.asarray(latencies) * 1000
+        latency = {f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, np.percentile(millis, PERCENTILES))}
+        latency["mean"] = round(float(millis.mean()), 3)
+        latency["max"] = round(float(millis.max()), 3)
+        report["latency_ms"] = latency
+    return report
+
+
+def measure(call: Call, body: Dict[str, Any], iterations: int, warmup: int, concurrency: int = 1) -> Dict[str, Any]:
+    """Time ``iterations`` calls of ``call(body)`` after ``warmup`` untimed ones."""
+    for _ in range(warmup):
+        call(body)
+
+    latencies: List[float] = []
+    errors = 0
+    returned = matches = 0
+    lock = threading.Lock()
+
+    def timed_call(_) -> None:
+        nonlocal errors, returned, matches
+        started = time.perf_counter()
+        try:
+            returned, matches = call(body)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(iterations):
+            timed_call(i)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(timed_call, range(iterations)))
+    return summarize(latencies, time.perf_counter() - started, errors, returned, matches)
+
+
+def _counts(payload: Dict[str, Any]) -> Tuple[int, int]:
+    if not payload.get("success", True):
+        raise RuntimeError(payload.get("error"))
+    return payload.get("total_count", 0), payload.get("total_matches", payload.get("total_count", 0))
+
+
+# --- In-process mode ---
+
+def _request(body: bytes):
+    from starlette.requests import Request
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/query",
+        "scheme": "http",
+        "server": ("benchmark", 80),
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+
+def run_inprocess(args, workload: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    import main
+    from query_planner import normalize_request
+
+    main.DATA_FILE_PATH = args.data
+    main.DATA_WATCH_ENABLED = False
+    if not args.cache:
+        main.result_cache.max_entries = 0
+    started = time.perf_counter()
+    main.load_data()
+    environment = {
+        "load_seconds": round(time.perf_counter() - started, 3),
+        "rows": len(main.dataset.frame),
+    }
+
+    loop = asyncio.new_event_loop()
+
+    def endpoint(body: Dict[str, Any]) -> Tuple[int, int]:
+        response = loop.run_until_complete(main.handle_query(_request(json.dumps(body).encode())))
+        return _counts(json.loads(response.body))
+
+    def function(body: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+        query = normalize_request(body, list(main.dataset.frame.columns))
+        records = main.query_data_source(
+            query["filters"], query["ranges"], query["sort_by"], query["sort_order"], query["limit"]
+        )
+        if records and "error" in records[0]:
+            raise RuntimeError(records[0]["error"])
+        # The function returns the rows only, not how many matched
+        return len(records), None
+
+    results = {}
+    try:
+        for entry in workload:
+            results[entry["name"]] = measure(endpoint, entry["body"], args.iterations, args.warmup)
+            query = normalize_request(entry["body"], list(main.dataset.frame.columns))
+            if not (query["search"] or query["offset"] or query["cursor"]):
+                results[f"{entry['name']}:function"] = measure(function, entry["body"], args.iterations, args.warmup)
+    finally:
+        loop.close()
+        main.query_executor.shutdown()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    environment["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    environment["dataset_memory_bytes"] = (main.dataset.memory or {}).get("total_after_bytes")
+    return results, environment
+
+
+# --- HTTP mode ---
+
+def _peak_rss(pid: int) -> Optional[int]:
+    """Peak RSS (VmHWM) of a process, where /proc exposes it."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def start_server(args) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.server", "--data", os.path.abspath(args.data), "--port", str(args.port)]
+    if args.cache:
+        command.append("--cache")
+    server = subprocess.Popen(command, cwd=SERVER_DIR)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with status {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", args.port, timeout=5)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Benchmark server did not start in time")
+
+
+def run_http(args, workload: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args)
+        url = f"http://127.0.0.1:{args.port}"
+    host, _, port = url.split("://", 1)[-1].rstrip("/").partition(":")
+    connections = threading.local()
+
+    def request(method: str, path: str, body: Optional[bytes] = None) -> Dict[str, Any]:
+        connection = getattr(connections, "connection", None)
+        if connection is None:
+            connection = connections.connection = http.client.HTTPConnection(host, int(port or 80), timeout=120)
+        try:
+            connection.request(method, path, body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+        except (OSError, http.client.HTTPException):
+            connections.connection = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload}")
+        return payload
+
+    def endpoint(body: Dict[str, Any]) -> Tuple[int, int]:
+        return _counts(request("POST", "/query", json.dumps(body).encode()))
+
+    try:
+        stats = request("GET", "/stats")
+        results = {
+            entry["name"]: measure(endpoint, entry["body"], args.iterations, args.warmup, args.concurrency)
+            for entry in workload
+        }
+        environment = {
+            "rows": stats.get("rows"),
+            "url": url,
+            "dataset_memory_bytes": (stats.get("memory") or {}).get("total_after_bytes"),
+        }
+        if server is not None:
+            environment["peak_rss_bytes"] = _peak_rss(server.pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return results, environment
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the /query path")
+    parser.add_argument("--data", required=True, help="CSV to load (see benchmarks/generate_data.py)")
+    parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD, help="Workload JSON file")
+    parser.add_argument("--queries", nargs="*", help="Run only these workload entries")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed runs per query (default: 20)")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed runs per query first (default: 2)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Client threads in http mode (default: 1)")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the benchmark server")
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of starting one")
+    parser.add_argument("--output", default=None, help="Write the report here instead of stdout")
+    args = parser.parse_args()
+
+    with open(args.workload) as handle:
+        workload = json.load(handle)["queries"]
+    if args.queries:
+        workload = [entry for entry in workload if entry["name"] in args.queries]
+
+    if args.mode == "inprocess":
+        from log_config import configure_logging
+        import main
+        configure_logging("WARNING", main.LOG_SAMPLE_RATES)
+        results, environment = run_inprocess(args, workload)
+    else:
+        results, environment = run_http(args, workload)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "data": os.path.basename(args.data),
+            "mode": args.mode,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency if args.mode == "http" else 1,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            **environment,
+        },
+        "queries": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main_()
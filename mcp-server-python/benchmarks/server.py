@@ -0,0 +1,38 @@
+# mcp-server-python/benchmarks/server.py
+"""
+Serve a benchmark dataset with uvicorn, for benchmarks/run_benchmark.py.
+
+    python -m benchmarks.server --data data/bench_1000000.csv --port 8765
+
+The app is main.app, configured as in production except that it serves
+--data, does not watch the file, logs at --log-level and, unless --cache
+is given, does not cache results.
+"""
+import argparse
+
+import uvicorn
+
+import main
+from log_config import configure_logging
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description="Serve a benchmark dataset")
+    parser.add_argument("--data", required=True, help="CSV file to serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level, main.LOG_SAMPLE_RATES)
+    main.DATA_FILE_PATH = args.data
+    main.DATA_WATCH_ENABLED = False
+    if not args.cache:
+        main.result_cache.max_entries = 0
+    main.load_data()
+    uvicorn.run(main.app, host=args.host, port=args.port, log_level=args.log_level.lower())
+
+
+if __name__ == "__main__":
+    main_()
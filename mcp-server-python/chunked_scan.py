@@ -0,0 +1,170 @@
+# mcp-server-python/chunked_scan.py
+"""
+Out-of-core execution: answer queries by streaming the CSV in chunks.
+
+For data files that do not fit in memory, ChunkedSource reads the file
+through a generator of fixed-size chunks instead of loading it. Each query
+is planned against a zero-row frame with the file's schema, so validation
+and predicate types are exactly those of the in-memory path, and then:
+
+- every chunk is filtered with the same predicates (evaluate_predicates);
+- unsorted pages keep only the first offset + limit matches;
+- sorted pages with a limit keep a bounded top-k: each chunk's best k rows
+  are merged with the running best k using the same (value, id) ordering,
+  missing-last and cursor rules as pagination.py;
+- aggregates are merged per chunk through aggregation.PartialAggregate;
+- count-mode queries only add up each chunk's matches.
+
+Memory is bounded by the chunk size plus the rows the response needs.
+Percentiles are the exception: they keep a count per distinct (group,
+value) pair of their field, and a field with more than
+aggregation.PERCENTILE_MAX_VALUES such pairs is answered with a 400.
+"""
+from typing import Any, Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from aggregation import AggregateSpec, PartialAggregate
+from metrics import timed
+from pagination import next_cursor, order_page
+from query_planner import QueryPlan, QueryResult, evaluate_predicates, explain_plan
+from schema import is_text_column
+
+# Rows read per chunk
+DEFAULT_CHUNK_ROWS = 250_000
+
+# Rows parsed to infer the file's schema
+SCHEMA_SAMPLE_ROWS = 1000
+
+
+class ChunkedSource:
+    """A CSV file read in chunks, converted the same way as a full load."""
+
+    def __init__(
+        self,
+        path: str,
+        prepare: Callable[[pd.DataFrame], pd.DataFrame],
+        chunk_rows: int = DEFAULT_CHUNK_ROWS
+    ):
+        self.path = path
+        self.prepare = prepare
+        self.chunk_rows = chunk_rows
+        sample = prepare(pd.read_csv(path, nrows=SCHEMA_SAMPLE_ROWS))
+        # Text columns are read as text in every chunk, whatever they contain
+        self.text_columns = [column for column in sample.columns if is_text_column(sample[column])]
+        self.schema = sample.iloc[:0]
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        """Yield the file's rows as consecutive DataFrames of up to chunk_rows rows."""
+        reader = pd.read_csv(
+            self.path,
+            chunksize=self.chunk_rows,
+            dtype={column: str for column in self.text_columns}
+        )
+        with reader:
+            for chunk in reader:
+                yield self.prepare(chunk).reset_index(drop=True)
+
+    def describe(self) -> dict:
+        return {"path": self.path, "chunk_rows": self.chunk_rows, "columns": self.schema.columns.tolist()}
+
+
+def _best_rows(frame: pd.DataFrame, plan: QueryPlan, k: Optional[int], cursor: Optional[dict]) -> pd.DataFrame:
+    """The first ``k`` rows of ``frame`` in the plan's order (all when k is None)."""
+    page = order_page(frame, None, plan.sort_by, plan.ascending, 0, k, cursor)
+    return frame.take(page)
+
+
+def scan_plan(source: ChunkedSource, plan: QueryPlan, timer: Optional[Any] = None) -> QueryResult:
+    """Run a plan over the source chunk by chunk; same results as execute_plan."""
+    k = None if plan.limit is None else plan.offset + plan.limit
+    kept: Optional[pd.DataFrame] = None
+    total_matches = 0
+
+    chunks = source.chunks()
+    while True:
+        with timed(timer, 'scan'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with timed(timer, 'filter'):
+            positions = evaluate_predicates(chunk, plan, None, timer)
+            total_matches += len(positions)
+        if len(positions) == 0:
+            continue
+        if plan.sort_by is None and k is not None and kept is not None and len(kept) >= k:
+            # The page is full; later chunks are only counted
+            continue
+        with timed(timer, 'sort'):
+            matches = chunk.take(positions)
+            if plan.sort_by is None:
+                kept = matches if kept is None else pd.concat([kept, matches], ignore_index=True)
+                if k is not None:
+                    kept = kept.iloc[:k]
+                continue
+            # The cursor only has to be applied once, to rows as they arrive
+            best = _best_rows(matches.reset_index(drop=True), plan, k, plan.cursor)
+            if kept is not None:
+                best = pd.concat([kept, best], ignore_index=True)
+                if k is not None:
+                    best = _best_rows(best, plan, k, None)
+            kept = best
+
+    with timed(timer, 'paginate'):
+        if kept is None:
+            kept = source.schema
+        elif plan.sort_by is not None and k is None:
+            # Without a limit every match is returned; order them once
+            kept = _best_rows(kept, plan, None, None)
+        page = kept.iloc[plan.offset:].reset_index(drop=True)
+        cursor = None
+        if plan.cursor_mode and plan.limit is not None and 0 < plan.limit <= len(page):
+            cursor = next_cursor(page, np.arange(len(page)), plan.sort_by, plan.ascending)
+    return QueryResult(frame=plan.project(page), total_matches=total_matches, next_cursor=cursor)
+
+
+def scan_count(source: ChunkedSource, plan: QueryPlan, timer: Optional[Any] = None) -> int:
+    """Count the rows matching ``plan`` chunk by chunk; same result as count_matches."""
+    if plan.matches_nothing:
+        return 0
+    total_matches = 0
+    chunks = source.chunks()
+    while True:
+        with timed(timer, 'scan'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return total_matches
+        with timed(timer, 'filter'):
+            total_matches += len(evaluate_predicates(chunk, plan, None, timer))
+
+
+def scan_aggregate(
+    source: ChunkedSource,
+    plan: QueryPlan,
+    spec: AggregateSpec,
+    timer: Optional[Any] = None
+):
+    """Aggregate the rows matching ``plan`` chunk by chunk; same output as run_aggregate."""
+    partial = PartialAggregate(spec)
+    chunks = source.chunks()
+    while True:
+        with timed(timer, 'scan'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with timed(timer, 'filter'):
+            positions = evaluate_predicates(chunk, plan, None, timer)
+        with timed(timer, 'aggregate'):
+            partial.add(chunk, positions)
+    with timed(timer, 'aggregate'):
+        return partial.records(source.schema, timer), partial.matches
+
+
+def explain_scan(source: ChunkedSource, plan: QueryPlan) -> dict:
+    """explain_plan for a chunked scan; row counts are unknown until the file is read."""
+    explain = explain_plan(source.schema, plan)
+    for predicate in explain["predicates"]:
+        predicate.update(matches=None, selectivity=None)
+    explain.update(strategy='chunked_scan', rows=None, chunk_rows=source.chunk_rows)
+    return explain
@@ -0,0 +1,377 @@
+# mcp-server-python/column_stats.py
+"""
+Approximate answers for "mode": "estimate" queries, in time independent of
+the number of rows.
+
+DatasetStats is built once per published dataset, mostly from its indexes:
+- RangeStats for every numeric and date column: an equi-depth histogram
+  (HISTOGRAM_BUCKETS + 1 values read off SortedIndex.sorted_values at
+  evenly spaced ranks) plus the present and distinct value counts;
+- TextStats for every text column: rows per lowercased value, which the
+  posting lists already record (TrigramIndex.bounds);
+- a uniform random sample of SAMPLE_ROWS rows, drawn with a fixed seed.
+
+After an append, DatasetStats.extend() derives the statistics of the longer
+frame from the appended rows only: distinct counts are updated by looking
+the new values up in the extended SortedIndex, and the sample stays uniform
+by drawing how many of its rows fall among the appended ones.
+
+Every predicate gets a (lower, estimate, upper) match count. Text matches
+are counted exactly. Ranges are bounded by the histogram values on either
+side of each end and interpolated in between; equality is estimated as
+rows per distinct value, within the same bounds. A conjunction is bounded
+by the Fréchet inequalities and estimated as if its predicates were
+independent. These bounds always hold.
+
+When sampling is on, the plan is also evaluated on the sample: the count is
+scaled up from the sample's matches, and the Wilson score interval at
+CONFIDENCE (with a finite-population correction) narrows the bounds. The
+sample's matching rows, in the plan's order, are returned as examples.
+"""
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indexes import SortedIndex, TrigramIndex
+from pagination import order_page
+from query_planner import DEFAULT_SELECTIVITY, Interval, Predicate, QueryPlan, evaluate_predicates
+from schema import LowercaseCodes
+
+# Histogram buckets per numeric or date column
+HISTOGRAM_BUCKETS = 64
+
+# Rows in the uniform sample, and the seed it is drawn with
+SAMPLE_ROWS = 10_000
+SAMPLE_SEED = 0
+
+# Example rows returned when the request has no limit
+PREVIEW_ROWS = 10
+
+# Confidence of sample-based bounds, and the matching two-sided normal quantile
+CONFIDENCE = 0.95
+Z_SCORE = 1.96
+
+# (lower bound, estimate, upper bound) of a match count
+Bounds = Tuple[float, float, float]
+
+
+def _clip(value: float, lower: float, upper: float) -> float:
+    return min(max(value, lower), upper)
+
+
+def conjunction_bounds(bounds: List[Bounds], row_count: int) -> Bounds:
+    """Bounds of rows matching every predicate, given each predicate's bounds."""
+    lower = max(0.0, sum(b[0] for b in bounds) - (len(bounds) - 1) * row_count)
+    upper = min(b[2] for b in bounds)
+    estimate = float(row_count)
+    for b in bounds:
+        estimate *= b[1] / row_count if row_count else 0.0
+    return lower, _clip(estimate, lower, upper), upper
+
+
+def wilson_interval(matches: int, sample_rows: int, row_count: int, z: float = Z_SCORE) -> Tuple[float, float]:
+    """Interval for the match count of ``row_count`` rows when ``matches`` of a uniform sample matched."""
+    if row_count <= sample_rows:
+        return float(matches), float(matches)
+    # Sampled without replacement: the finite-population correction enters as
+    # a larger effective sample, so it narrows the centre shift and the spread alike
+    effective = sample_rows * (row_count - 1) / (row_count - sample_rows)
+    share = matches / sample_rows
+    z2n = z * z / effective
+    center = (share + z2n / 2) / (1 + z2n)
+    half = z * math.sqrt(share * (1 - share) / effective + z2n / (4 * effective)) / (1 + z2n)
+    # No matches can still mean none in the data, and all matches all of it
+    low = 0.0 if matches == 0 else max(0.0, center - half) * row_count
+    high = float(row_count) if matches == sample_rows else min(1.0, center + half) * row_count
+    return low, high
+
+
+class RangeStats:
+    """Equi-depth histogram of one numeric or date column."""
+
+    def __init__(self, values: np.ndarray, ranks: np.ndarray, present: int, distinct: int, unit: Optional[str]):
+        self.values = values  # Column value at each rank, as float64 (date ticks for dates)
+        self.ranks = ranks  # Positions in sorted order, 0 and present - 1 included
+        self.present = present
+        self.distinct = distinct
+        self.unit = unit  # Tick unit of a date column, None for numbers
+
+    @staticmethod
+    def _keys(values: np.ndarray) -> Tuple[np.ndarray, Optional[str]]:
+        """Values comparable as numbers: date ticks for dates."""
+        values = np.asarray(values)
+        if values.dtype.kind == 'M':
+            return values.view(np.int64), np.datetime_data(values.dtype)[0]
+        return values, None
+
+    @classmethod
+    def _from_sorted(cls, values: np.ndarray, distinct: int, unit: Optional[str], buckets: int) -> 'RangeStats':
+        present = len(values)
+        if present == 0:
+            return cls(np.empty(0), np.empty(0, dtype=np.int64), 0, 0, unit)
+        ranks = np.unique(np.linspace(0, present - 1, buckets + 1).round().astype(np.int64))
+        return cls(values[ranks].astype(np.float64), ranks, present, distinct, unit)
+
+    @classmethod
+    def build(cls, index: SortedIndex, buckets: int = HISTOGRAM_BUCKETS) -> 'RangeStats':
+        values, unit = cls._keys(index.sorted_values)
+        distinct = int(np.count_nonzero(values[1:] != values[:-1])) + 1 if len(values) else 0
+        return cls._from_sorted(values, distinct, unit, buckets)
+
+    def extend(self, index: SortedIndex, appended: pd.Series, buckets: int = HISTOGRAM_BUCKETS) -> 'RangeStats':
+        """
+        Histogram of ``index`` when it extends this one's column with the
+        ``appended`` values; only those values are scanned.
+        """
+        values, unit = self._keys(index.sorted_values)
+        added = appended.to_numpy()
+        added, _ = self._keys(added[~pd.isna(added)].astype(index.sorted_values.dtype, copy=False))
+        added, occurrences = np.unique(added, return_counts=True)
+        # A value is new when all of its occurrences are appended ones
+        total = np.searchsorted(values, added, 'right') - np.searchsorted(values, added, 'left')
+        distinct = self.distinct + int(np.count_nonzero(total == occurrences))
+        return self._from_sorted(values, distinct, unit, buckets)
+
+    def _key(self, value: Any) -> float:
+        if self.unit is None:
+            return float(value)
+        return float(np.datetime64(value, self.unit).astype(np.int64))
+
+    def _rank(self, key: float, inclusive: bool) -> Bounds:
+        """Bounds of how many values are below ``key`` (or equal to it, when inclusive)."""
+        # values[:j] are the histogram values that count
+        j = int(np.searchsorted(self.values, key, 'right' if inclusive else 'left'))
+        lower = self.ranks[j - 1] + 1 if j > 0 else 0
+        upper = self.ranks[j] if j < len(self.ranks) else self.present
+        if j == 0 or j == len(self.ranks) or self.values[j] == self.values[j - 1]:
+            return lower, (lower + upper) / 2, upper
+        share = (key - self.values[j - 1]) / (self.values[j] - self.values[j - 1])
+        return lower, lower + share * (upper - lower), upper
+
+    def interval(self, interval: Interval) -> Bounds:
+        if self.present == 0:
+            return 0, 0, 0
+        high: Bounds = (self.present,) * 3
+        low: Bounds = (0, 0, 0)
+        if interval.high is not None:
+            high = self._rank(self._key(interval.high), interval.high_inclusive)
+        if interval.low is not None:
+            low = self._rank(self._key(interval.low), not interval.low_inclusive)
+        lower, upper = max(0, high[0] - low[2]), max(0, high[2] - low[0])
+        return lower, _clip(high[1] - low[1], lower, upper), upper
+
+    def equal(self, value: Any) -> Bounds:
+        lower, _, upper = self.interval(Interval(value, True, value, True))
+        return lower, _clip(self.present / self.distinct if self.distinct else 0, lower, upper), upper
+
+    def any_of(self, values: Tuple[Any, ...]) -> Bounds:
+        bounds = [self.equal(value) for value in values]
+        return (
+            sum(b[0] for b in bounds),
+            min(sum(b[1] for b in bounds), self.present),
+            min(sum(b[2] for b in bounds), self.present),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": "histogram", "buckets": max(len(self.ranks) - 1, 0),
+                "present": self.present, "distinct": self.distinct}
+
+
+class TextStats:
+    """Rows per lowercased value of one text column, read off its posting lists."""
+
+    def __init__(self, normalized: LowercaseCodes, index: TrigramIndex):
+        self.normalized = normalized
+        self.index = index
+        # Missing values sort before every code, so bounds[0] counts them
+        self.present = int(index.bounds[-1] - index.bounds[0])
+
+    def count(self, predicate: Predicate) -> int:
+        if predicate.op == 'contains':
+            codes = self.index.matching_codes(predicate.value)
+        else:
+            codes = self.normalized.matching_codes(predicate.op, predicate.value)
+        codes = codes.astype(np.intp)
+        return int(np.sum(self.index.bounds[codes + 1] - self.index.bounds[codes]))
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": "value_counts", "present": self.present, "distinct": len(self.normalized.vocabulary)}
+
+
+@dataclass
+class Estimate:
+    """An estimate-mode answer."""
+    count: int
+    lower: int
+    upper: int
+    confidence: float  # 1.0 when the bounds always hold
+    method: str  # 'exact', 'statistics' or 'sample'
+    sample_rows: int  # Rows of the sample the plan was evaluated on (0: none)
+    sample_matches: Optional[int]
+    rows: pd.DataFrame  # Matching rows of the sample
+
+
+class DatasetStats:
+    """Column statistics and a row sample of one dataset version."""
+
+    def __init__(
+        self,
+        row_count: int,
+        ranges: Dict[str, RangeStats],
+        text: Dict[str, TextStats],
+        sample: pd.DataFrame,
+        sample_positions: np.ndarray
+    ):
+        self.row_count = row_count
+        self.ranges = ranges
+        self.text = text
+        self.sample = sample
+        self.sample_positions = sample_positions  # Row positions of the sample, ascending
+
+    @classmethod
+    def build(
+        cls,
+        frame: pd.DataFrame,
+        indexes: Any,
+        sample_rows: int = SAMPLE_ROWS,
+        seed: int = SAMPLE_SEED
+    ) -> 'DatasetStats':
+        ranges = {
+            column: RangeStats.build(index)
+            for column, index in indexes.indexes.items() if isinstance(index, SortedIndex)
+        }
+        text = {column: TextStats(indexes.normalized[column], index) for column, index in indexes.text.items()}
+        row_count = len(frame)
+        if row_count <= sample_rows:
+            positions = np.arange(row_count)
+        else:
+            positions = np.sort(np.random.default_rng(seed).choice(row_count, sample_rows, replace=False))
+        return cls(row_count, ranges, text, frame.take(positions).reset_index(drop=True), positions)
+
+    def extend(
+        self,
+        frame: pd.DataFrame,
+        indexes: Any,
+        start: int,
+        sample_rows: int = SAMPLE_ROWS,
+        seed: int = SAMPLE_SEED
+    ) -> 'DatasetStats':
+        """
+        Statistics of ``frame`` (with ``indexes``) when its first ``start``
+        rows are the ones described here; only the appended rows are read.
+        """
+        ranges = {}
+        for column, index in indexes.indexes.items():
+            if not isinstance(index, SortedIndex):
+                continue
+            previous = self.ranges.get(column)
+            ranges[column] = RangeStats.build(index) if previous is None else (
+                previous.extend(index, frame[column].iloc[start:])
+            )
+        text = {column: TextStats(indexes.normalized[column], index) for column, index in indexes.text.items()}
+
+        row_count = len(frame)
+        if row_count <= sample_rows:
+            positions = np.arange(row_count)
+        else:
+            rng = np.random.default_rng([seed, row_count])
+            # How many rows of a uniform sample of every row are appended ones;
+            # the rest is a uniform subset of the current (uniform) sample
+            appended = int(rng.hypergeometric(row_count - start, start, sample_rows))
+            kept = rng.choice(self.sample_positions, sample_rows - appended, replace=False)
+            added = rng.choice(row_count - start, appended, replace=False) + start
+            positions = np.concatenate([np.sort(kept), np.sort(added)])
+        return DatasetStats(row_count, ranges, text, frame.take(positions).reset_index(drop=True), positions)
+
+    def _search_bounds(self, predicate: Predicate) -> Bounds:
+        """Each token must occur in some text column: a union per token, a conjunction over tokens."""
+        row_count = self.row_count
+        per_token = []
+        for token in predicate.value:
+            needle = Predicate(predicate.column, 'contains', (token,), 'string')
+            counts = [stats.count(needle) for stats in self.text.values()]
+            missed = 1.0
+            for count in counts:
+                missed *= 1 - count / row_count
+            per_token.append((
+                max(counts, default=0),
+                row_count * (1 - missed),
+                min(sum(counts), row_count),
+            ))
+        return conjunction_bounds(per_token, row_count)
+
+    def predicate_bounds(self, predicate: Predicate) -> Bounds:
+        if predicate.op == 'search':
+            return self._search_bounds(predicate)
+        text = self.text.get(predicate.column)
+        if text is not None and predicate.kind == 'string':
+            count = text.count(predicate)
+            return count, count, count
+        histogram = self.ranges.get(predicate.column)
+        if histogram is not None:
+            if predicate.op == 'range':
+                return histogram.interval(predicate.value)
+            if predicate.op == 'eq':
+                return histogram.equal(predicate.value)
+            if predicate.op == 'in':
+                return histogram.any_of(predicate.value)
+        return 0, DEFAULT_SELECTIVITY.get(predicate.op, 1.0) * self.row_count, self.row_count
+
+    def estimate(self, plan: QueryPlan) -> Estimate:
+        """Approximate count of the rows matching ``plan``, with bounds and sample rows."""
+        row_count = self.row_count
+        if plan.matches_nothing:
+            lower = estimate = upper = 0
+        elif not plan.predicates:
+            lower = estimate = upper = row_count
+        else:
+            lower, estimate, upper = conjunction_bounds(
+                [self.predicate_bounds(predicate) for predicate in plan.predicates], row_count
+            )
+        confidence, method = 1.0, 'statistics'
+        sample_rows, sample_matches = 0, None
+        rows = plan.project(self.sample.iloc[:0])
+
+        if plan.sample and len(self.sample):
+            positions = evaluate_predicates(self.sample, plan)
+            sample_rows, sample_matches = len(self.sample), len(positions)
+            page = order_page(
+                self.sample, positions, plan.sort_by, plan.ascending, 0, plan.limit or PREVIEW_ROWS
+            )
+            rows = plan.project(self.sample).take(page)
+            # The sample's matches are real rows, and so are its misses
+            lower = max(lower, sample_matches)
+            upper = min(upper, row_count - (sample_rows - sample_matches))
+            if sample_rows == row_count:
+                lower = upper = sample_matches
+            elif lower < upper:
+                low, high = wilson_interval(sample_matches, sample_rows, row_count)
+                if max(lower, low) <= min(upper, high):
+                    # Ignored in the rare case it misses the bounds that always hold
+                    lower, upper = max(lower, low), min(upper, high)
+                    confidence, method = CONFIDENCE, 'sample'
+                # The sample's share, even when it is zero: the statistics'
+                # independence guess is only clipped to the narrowed bounds
+                estimate = sample_matches / sample_rows * row_count
+
+        lower, upper = int(math.floor(lower)), int(math.ceil(upper))
+        if lower == upper:
+            confidence, method = 1.0, 'exact'
+        return Estimate(
+            count=int(round(_clip(estimate, lower, upper))),
+            lower=lower,
+            upper=upper,
+            confidence=confidence,
+            method=method,
+            sample_rows=sample_rows,
+            sample_matches=sample_matches,
+            rows=rows
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        columns = {column: stats.describe() for column, stats in self.ranges.items()}
+        columns.update({column: stats.describe() for column, stats in self.text.items()})
+        return {"sample_rows": len(self.sample), "columns": columns}
@@ -0,0 +1,124 @@
+# mcp-server-python/data_watcher.py
+"""
+Background watcher for the data file.
+
+The watcher polls the file's size and mtime. When the file has only grown
+and the bytes it had already consumed are unchanged (checked through a
+short anchor of the last consumed bytes), the new complete lines are handed
+to ``on_append`` so they can be parsed on their own and appended. Any other
+change (rewrite, truncation, edit in the middle) calls ``on_rebuild`` for a
+full reload. Both callbacks run on the watcher thread, never on a request.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from log_config import get_logger
+
+# Bytes before the consumed offset compared to tell an append from a rewrite
+ANCHOR_BYTES = 4096
+
+logger = get_logger('watcher')
+
+
+@dataclass(frozen=True)
+class FileState:
+    """What has been ingested from the file: its first ``consumed`` bytes."""
+    size: int
+    mtime_ns: int
+    consumed: int
+    anchor: bytes
+
+
+def _read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        return handle.read(end - start)
+
+
+# State that never matches the file, forcing a full rebuild on the next check
+UNKNOWN_STATE = FileState(size=-1, mtime_ns=-1, consumed=0, anchor=b'')
+
+
+def file_state(path: str, consumed: Optional[int] = None) -> FileState:
+    """State of ``path`` with its first ``consumed`` bytes (default: all) ingested."""
+    stat = os.stat(path)
+    consumed = stat.st_size if consumed is None else consumed
+    anchor = _read_range(path, max(consumed - ANCHOR_BYTES, 0), consumed)
+    return FileState(stat.st_size, stat.st_mtime_ns, consumed, anchor)
+
+
+class DataWatcher:
+    def __init__(
+        self,
+        path: str,
+        state: FileState,
+        on_append: Callable[[bytes], None],
+        on_rebuild: Callable[[], Optional[FileState]],
+        interval_seconds: float = 2.0
+    ):
+        self.path = path
+        self.state = state
+        self.on_append = on_append
+        self.on_rebuild = on_rebuild
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='data-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Data file check failed")
+
+    def _is_append(self, size: int) -> bool:
+        state = self.state
+        if size <= state.consumed or not state.anchor:
+            return False
+        # The consumed bytes must end a line, or the appended bytes must start
+        # by ending it (files saved without a trailing newline)
+        start = state.consumed - len(state.anchor)
+        current = _read_range(self.path, start, state.consumed + 1)
+        if current[:-1] != state.anchor:
+            return False
+        return state.anchor.endswith(b'\n') or current.endswith(b'\n')
+
+    def check(self) -> None:
+        """Compare the file with what was ingested and append or rebuild."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        # A trailing partial line keeps size above consumed; it is re-read each
+        # time until it is complete
+        if (stat.st_size, stat.st_mtime_ns) == (self.state.consumed, self.state.mtime_ns):
+            return
+
+        if self._is_append(stat.st_size):
+            tail = _read_range(self.path, self.state.consumed, stat.st_size)
+            complete = tail[:tail.rfind(b'\n') + 1]
+            try:
+                if complete:
+                    logger.info("Data file grew by %d bytes, appending", len(complete))
+                    self.on_append(complete)
+            except Exception:
+                logger.exception("Appending new rows failed, rebuilding instead")
+            else:
+                self.state = file_state(self.path, self.state.consumed + len(complete))
+                return
+
+        logger.info("Data file changed, rebuilding in the background")
+        state = self.on_rebuild()
+        if state is not None:
+            self.state = state
@@ -0,0 +1,109 @@
+# mcp-server-python/executor.py
+"""
+Bounded worker pool for query execution.
+
+Filtering, sorting and serialization are CPU-bound pandas/numpy work, so
+running them inside an ``async def`` endpoint stalls the event loop for
+every other request. QueryExecutor runs them on a thread pool instead
+(numpy releases the GIL for most column operations) and applies
+backpressure: once every worker is busy and the wait queue is full, new
+queries are rejected immediately rather than piling up.
+
+Each call has a timeout. A query that is still queued when it times out,
+or whose caller goes away, is cancelled before it starts; one that is
+already running cannot be interrupted, so its slot stays taken until it
+finishes and its result is dropped.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class QueryTimeout(TimeoutError):
+    """Raised when a query does not finish within its timeout."""
+
+
+class QueryExecutor:
+    def __init__(self, max_workers: int, max_queued: int, timeout_seconds: float):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.timeout_seconds = timeout_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    def _call(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Run ``fn(*args)`` on the pool and await its result.
+
+        Raises ExecutorBusy when the pool is saturated and QueryTimeout when
+        the call takes longer than ``timeout`` (default: timeout_seconds).
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queued:
+                self.rejected += 1
+                raise ExecutorBusy("Too many queries in progress")
+            self._pending += 1
+        # Carry the request's context (e.g. its logging flags) into the worker
+        context = contextvars.copy_context()
+        future = self._pool.submit(context.run, self._call, fn, args)
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                self.timeout_seconds if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise QueryTimeout("Query timed out")
+        except asyncio.CancelledError:
+            future.cancel()
+            with self._lock:
+                self.cancelled += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "timeout_seconds": self.timeout_seconds,
+                "running": self._running,
+                "queued": max(self._pending - self._running, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
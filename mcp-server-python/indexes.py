@@ -0,0 +1,459 @@
+# mcp-server-python/indexes.py
+"""
+Secondary indexes built once when the data is loaded.
+
+- HashIndex: lowercased value -> sorted row positions (posting list), used
+  for exact and multi-value matches on low-cardinality text columns such as
+  department and status.
+- SortedIndex: row positions ordered by column value, used for equality and
+  range lookups on numeric and date columns via searchsorted.
+- TrigramIndex: trigram -> distinct lowercased values of a text column, used
+  for substring ("contains") matches; SearchIndex combines them for the
+  free-text "search" predicate across all text columns. Columns with more
+  than TRIGRAM_MAX_VOCABULARY distinct values (names, free text) skip the
+  trigrams and scan their vocabulary instead, which costs far less memory
+  and load time than trigrams of mostly unique values.
+
+Lookups return sorted row positions, so results from several indexes can be
+intersected before any row data is touched. The IndexSet also carries the
+LowercaseCodes of every text column (see schema.py).
+
+extend_indexes() derives the indexes of a frame with rows appended from
+those of the original frame, sorting only the appended rows.
+"""
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from query_planner import PARTIAL_MATCH_COLUMNS, SEARCH_COLUMN, Predicate, column_kind
+from schema import CATEGORICAL_MAX_CARDINALITY, LowercaseCodes, is_text_column
+
+EMPTY_POSITIONS = np.empty(0, dtype=np.intp)
+
+GRAM_SIZE = 3
+
+# Text columns get trigrams when they have at most this many distinct values
+# or are named in build_indexes(trigram_columns=...); larger vocabularies
+# are scanned for substring matches
+TRIGRAM_MAX_VOCABULARY = 50_000
+
+
+def _code_postings(normalized: LowercaseCodes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row positions grouped by code: rows with code c are
+    order[bounds[c]:bounds[c + 1]], in ascending position order.
+    """
+    codes = normalized.codes
+    order = np.argsort(codes, kind='stable')
+    # Missing values get code -1 and sort to the front, outside every slice
+    bounds = np.searchsorted(codes[order], np.arange(len(normalized.vocabulary) + 1))
+    return order, bounds
+
+
+def _extend_postings(
+    order: np.ndarray,
+    bounds: np.ndarray,
+    normalized: LowercaseCodes,
+    start: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    _code_postings() of ``normalized`` when rows before ``start`` were
+    already grouped into (order, bounds): the new rows are grouped on their
+    own and slotted in after the old rows of each code, without re-sorting.
+    """
+    vocabulary_size = len(normalized.vocabulary)
+    new_codes = normalized.codes[start:]
+    new_order = np.argsort(new_codes, kind='stable')
+    new_bounds = np.searchsorted(new_codes[new_order], np.arange(vocabulary_size + 1))
+
+    # Bucket 0 holds missing values, bucket c + 1 the rows with code c
+    old_edges = np.concatenate([[0], bounds, np.full(vocabulary_size + 1 - len(bounds), len(order))])
+    new_edges = np.concatenate([[0], new_bounds])
+    old_buckets = np.repeat(np.arange(vocabulary_size + 1), np.diff(old_edges))
+    new_buckets = np.repeat(np.arange(vocabulary_size + 1), np.diff(new_edges))
+
+    merged = np.empty(len(order) + len(new_order), dtype=np.intp)
+    merged[np.arange(len(order)) + new_edges[old_buckets]] = order
+    merged[np.arange(len(new_order)) + old_edges[new_buckets + 1]] = new_order + start
+    return merged, (old_edges + new_edges)[1:]
+
+
+def _grams(text: str) -> set:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _positions_for_codes(order: np.ndarray, bounds: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    hits = [order[bounds[code]:bounds[code + 1]] for code in codes]
+    if not hits:
+        return EMPTY_POSITIONS
+    if len(hits) == 1:
+        return hits[0]
+    return np.sort(np.concatenate(hits))
+
+
+class HashIndex:
+    """Posting lists from lowercased value to row positions."""
+    kind = 'hash'
+    operators = ('eq', 'in')
+
+    def __init__(self, column: str, postings: Dict[str, np.ndarray]):
+        self.column = column
+        self.postings = postings
+
+    @classmethod
+    def build(cls, column: str, normalized: LowercaseCodes, order: np.ndarray, bounds: np.ndarray) -> 'HashIndex':
+        postings = {
+            value: order[bounds[i]:bounds[i + 1]]
+            for i, value in enumerate(normalized.vocabulary)
+        }
+        return cls(column, postings)
+
+    def supports(self, predicate: Predicate) -> bool:
+        return predicate.op in self.operators
+
+    def count(self, predicate: Predicate) -> int:
+        values = [predicate.value] if predicate.op == 'eq' else predicate.value
+        return sum(len(self.postings.get(value, EMPTY_POSITIONS)) for value in values)
+
+    def lookup(self, predicate: Predicate) -> np.ndarray:
+        if predicate.op == 'eq':
+            return self.postings.get(predicate.value, EMPTY_POSITIONS)
+        hits = [self.postings[value] for value in predicate.value if value in self.postings]
+        if not hits:
+            return EMPTY_POSITIONS
+        return np.sort(np.concatenate(hits))
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.kind, "distinct_values": len(self.postings)}
+
+    def memory_bytes(self) -> int:
+        # Posting lists are views into the shared TrigramIndex order
+        return sys.getsizeof(self.postings) + sum(sys.getsizeof(hits) for hits in self.postings.values())
+
+
+class SortedIndex:
+    """Row positions ordered by value, for O(log N + k) equality and range lookups."""
+    kind = 'sorted'
+    operators = ('eq', 'in', 'range')
+
+    def __init__(self, column: str, sorted_values: np.ndarray, order: np.ndarray, missing: np.ndarray):
+        self.column = column
+        self.sorted_values = sorted_values
+        self.order = order
+        self.missing = missing
+
+    @classmethod
+    def build(cls, column: str, series: pd.Series) -> 'SortedIndex':
+        values = series.to_numpy()
+        absent = pd.isna(values)
+        valid = np.flatnonzero(~absent)
+        order = valid[np.argsort(values[valid], kind='stable')]
+        return cls(column, values[order], order, np.flatnonzero(absent))
+
+    def supports(self, predicate: Predicate) -> bool:
+        return predicate.op in self.operators
+
+    def _key(self, value: Any) -> Any:
+        if isinstance(value, pd.Timestamp):
+            return value.to_datetime64()
+        return value
+
+    def _equal_bounds(self, value: Any) -> Tuple[int, int]:
+        key = self._key(value)
+        values = self.sorted_values
+        return (int(np.searchsorted(values, key, 'left')),
+                int(np.searchsorted(values, key, 'right')))
+
+    def _interval_bounds(self, interval: Any) -> Tuple[int, int]:
+        """The one slice of sorted_values inside an Interval (see query_planner.py)."""
+        values = self.sorted_values
+        low, high = 0, len(values)
+        if interval.low is not None:
+            side = 'left' if interval.low_inclusive else 'right'
+            low = int(np.searchsorted(values, interval.low, side))
+        if interval.high is not None:
+            side = 'right' if interval.high_inclusive else 'left'
+            high = int(np.searchsorted(values, interval.high, side))
+        return low, max(low, high)
+
+    def _slices(self, predicate: Predicate):
+        if predicate.op == 'in':
+            return [self._equal_bounds(value) for value in predicate.value]
+        if predicate.op == 'range':
+            return [self._interval_bounds(predicate.value)]
+        return [self._equal_bounds(predicate.value)]
+
+    def count(self, predicate: Predicate) -> int:
+        return sum(hi - lo for lo, hi in self._slices(predicate))
+
+    def lookup(self, predicate: Predicate) -> np.ndarray:
+        hits = [self.order[lo:hi] for lo, hi in self._slices(predicate) if hi > lo]
+        if not hits:
+            return EMPTY_POSITIONS
+        return np.sort(np.concatenate(hits))
+
+    def extend(self, series: pd.Series, start: int) -> 'SortedIndex':
+        """Index over ``series`` when rows before ``start`` are already indexed here."""
+        values = series.to_numpy()
+        new_values = values[start:]
+        absent = pd.isna(new_values)
+        valid = np.flatnonzero(~absent)
+        new_order = valid[np.argsort(new_values[valid], kind='stable')]
+        new_sorted = new_values[new_order]
+        # New rows go after equal old values, matching a stable sort by position
+        old_values = self.sorted_values.astype(values.dtype, copy=False)
+        slots = np.searchsorted(old_values, new_sorted, 'right')
+        return SortedIndex(
+            self.column,
+            np.insert(old_values, slots, new_sorted),
+            np.insert(self.order, slots, new_order + start),
+            np.concatenate([self.missing, np.flatnonzero(absent) + start])
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.kind, "entries": len(self.order)}
+
+    def memory_bytes(self) -> int:
+        return sum(sys.getsizeof(values) for values in (self.sorted_values, self.order, self.missing))
+
+
+class TrigramIndex:
+    """
+    Trigram -> codes of the distinct lowercased values containing it.
+
+    A substring lookup intersects the code lists of the needle's trigrams,
+    confirms the few surviving values, then maps them to row positions, so
+    no row is regex-scanned. Needles shorter than a trigram, and columns
+    built without trigrams (``grams`` is None), fall back to a vectorised
+    scan of the (distinct) values only.
+    """
+    kind = 'trigram'
+    operators = ('contains',)
+
+    def __init__(
+        self,
+        column: str,
+        normalized: LowercaseCodes,
+        grams: Optional[Dict[str, np.ndarray]],
+        order: np.ndarray,
+        bounds: np.ndarray
+    ):
+        self.column = column
+        self.normalized = normalized
+        self.grams = grams
+        self.order = order
+        self.bounds = bounds
+        self._last: Tuple[Any, Optional[np.ndarray]] = (None, None)
+
+    @classmethod
+    def build(
+        cls,
+        column: str,
+        normalized: LowercaseCodes,
+        order: np.ndarray,
+        bounds: np.ndarray,
+        previous: Optional['TrigramIndex'] = None,
+        trigrams: bool = True
+    ) -> 'TrigramIndex':
+        """
+        Index the vocabulary of ``normalized``, or only group its rows by
+        value when ``trigrams`` is false. With ``previous`` (an index over a
+        prefix of the same vocabulary) only the new values are added, and
+        trigrams are kept only if ``previous`` has them.
+        """
+        if not trigrams or (previous is not None and previous.grams is None):
+            return cls(column, normalized, None, order, bounds)
+        grams: Dict[str, List[int]] = defaultdict(list)
+        first = 0 if previous is None else len(previous.normalized.vocabulary)
+        for code in range(first, len(normalized.vocabulary)):
+            for gram in _grams(normalized.vocabulary[code]):
+                grams[gram].append(code)
+        dtype = normalized.codes.dtype
+        merged = {} if previous is None else {
+            gram: codes.astype(dtype, copy=False) for gram, codes in previous.grams.items()
+        }
+        for gram, codes in grams.items():
+            added = np.array(codes, dtype=dtype)
+            merged[gram] = added if gram not in merged else np.concatenate([merged[gram], added])
+        return cls(column, normalized, merged, order, bounds)
+
+    def supports(self, predicate: Predicate) -> bool:
+        return predicate.op in self.operators
+
+    def _needle_codes(self, needle: str) -> np.ndarray:
+        if self.grams is None or len(needle) < GRAM_SIZE:
+            return self.normalized.containing((needle,))
+        vocabulary = self.normalized.vocabulary
+        lists = []
+        for gram in _grams(needle):
+            codes = self.grams.get(gram)
+            if codes is None:
+                return np.empty(0, dtype=self.normalized.codes.dtype)
+            lists.append(codes)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for codes in lists[1:]:
+            candidates = np.intersect1d(candidates, codes, assume_unique=True)
+        return np.array(
+            [code for code in candidates if needle in vocabulary[code]],
+            dtype=self.normalized.codes.dtype
+        )
+
+    def matching_codes(self, needles: Tuple[str, ...]) -> np.ndarray:
+        """Codes of values containing any of ``needles``."""
+        key, codes = self._last
+        if key == needles:
+            return codes
+        per_needle = [self._needle_codes(needle) for needle in needles]
+        codes = per_needle[0] if len(per_needle) == 1 else np.unique(np.concatenate(per_needle))
+        self._last = (needles, codes)
+        return codes
+
+    def count(self, predicate: Predicate) -> int:
+        codes = self.matching_codes(predicate.value)
+        return int(sum(self.bounds[code + 1] - self.bounds[code] for code in codes))
+
+    def lookup(self, predicate: Predicate) -> np.ndarray:
+        return _positions_for_codes(self.order, self.bounds, self.matching_codes(predicate.value))
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.kind, "grams": None if self.grams is None else len(self.grams)}
+
+    def memory_bytes(self) -> int:
+        """Bytes of the row grouping and trigram lists; the codes are counted by LowercaseCodes."""
+        total = sys.getsizeof(self.order) + sys.getsizeof(self.bounds)
+        if self.grams is not None:
+            total += sys.getsizeof(self.grams) + sum(
+                sys.getsizeof(gram) + sys.getsizeof(codes) for gram, codes in self.grams.items()
+            )
+        return total
+
+
+class SearchIndex:
+    """Free-text search over every text column's TrigramIndex."""
+    kind = 'search'
+    operators = ('search',)
+
+    def __init__(self, text_indexes: Dict[str, TrigramIndex]):
+        self.text_indexes = text_indexes
+        self._last: Tuple[Any, Optional[np.ndarray]] = (None, None)
+
+    def supports(self, predicate: Predicate) -> bool:
+        return predicate.op in self.operators
+
+    def lookup(self, predicate: Predicate) -> np.ndarray:
+        key, positions = self._last
+        if key == predicate.value:
+            return positions
+        positions = None
+        for token in predicate.value:
+            needle = Predicate(SEARCH_COLUMN, 'contains', (token,), 'string')
+            hits = [index.lookup(needle) for index in self.text_indexes.values()]
+            token_hits = np.unique(np.concatenate(hits)) if hits else EMPTY_POSITIONS
+            positions = token_hits if positions is None else np.intersect1d(
+                positions, token_hits, assume_unique=True
+            )
+            if len(positions) == 0:
+                break
+        if positions is None:
+            positions = EMPTY_POSITIONS
+        self._last = (predicate.value, positions)
+        return positions
+
+    def count(self, predicate: Predicate) -> int:
+        return len(self.lookup(predicate))
+
+
+class IndexSet:
+    """All indexes for one loaded DataFrame, keyed by column."""
+
+    def __init__(
+        self,
+        indexes: Dict[str, Any],
+        row_count: int,
+        normalized: Optional[Dict[str, LowercaseCodes]] = None,
+        text: Optional[Dict[str, TrigramIndex]] = None
+    ):
+        self.indexes = indexes
+        self.row_count = row_count
+        self.normalized = normalized or {}
+        self.text = text or {}
+        self.search = SearchIndex(self.text)
+
+    def for_predicate(self, predicate: Predicate) -> Optional[Any]:
+        if predicate.op == 'search':
+            return self.search if self.text else None
+        if predicate.op == 'contains':
+            return self.text.get(predicate.column)
+        index = self.indexes.get(predicate.column)
+        if index is not None and index.supports(predicate):
+            return index
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        described = {column: [index.describe()] for column, index in self.indexes.items()}
+        for column, index in self.text.items():
+            described.setdefault(column, []).append(index.describe())
+        return described
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Bytes held by the indexes and lowercase codes of each column, and their total."""
+        columns: Dict[str, int] = defaultdict(int)
+        for group in (self.normalized, self.text, self.indexes):
+            for column, index in group.items():
+                columns[column] += index.memory_bytes()
+        return {"columns": dict(columns), "total_bytes": sum(columns.values())}
+
+
+def extend_indexes(indexes: IndexSet, frame: pd.DataFrame, start: int) -> IndexSet:
+    """
+    Indexes for ``frame`` when its first ``start`` rows are covered by
+    ``indexes``. Only the appended rows are sorted; existing posting lists,
+    sorted runs and trigram lists are merged with them. ``indexes`` itself is
+    left untouched so queries still running against it are unaffected.
+    """
+    extended: Dict[str, Any] = {}
+    normalized: Dict[str, LowercaseCodes] = {}
+    text: Dict[str, TrigramIndex] = {}
+    row_count = len(frame)
+    for column in frame.columns:
+        series = frame[column]
+        if column in indexes.normalized:
+            codes = normalized[column] = indexes.normalized[column].extend(series.iloc[start:])
+            previous = indexes.text[column]
+            order, bounds = _extend_postings(previous.order, previous.bounds, codes, start)
+            text[column] = TrigramIndex.build(column, codes, order, bounds, previous)
+            if len(codes.vocabulary) <= CATEGORICAL_MAX_CARDINALITY * row_count:
+                extended[column] = HashIndex.build(column, codes, order, bounds)
+        elif isinstance(indexes.indexes.get(column), SortedIndex):
+            extended[column] = indexes.indexes[column].extend(series, start)
+    return IndexSet(extended, row_count, normalized, text)
+
+
+def build_indexes(frame: pd.DataFrame, trigram_columns: Tuple[str, ...] = PARTIAL_MATCH_COLUMNS) -> IndexSet:
+    """
+    Precompute lowercase codes and a TrigramIndex for every text column, with
+    trigrams for ``trigram_columns`` and for columns of at most
+    TRIGRAM_MAX_VOCABULARY distinct values, then build a hash index for
+    every low-cardinality text column and a sorted index for every numeric
+    or date column of ``frame``.
+    """
+    indexes: Dict[str, Any] = {}
+    normalized: Dict[str, LowercaseCodes] = {}
+    text: Dict[str, TrigramIndex] = {}
+    row_count = len(frame)
+    for column in frame.columns:
+        series = frame[column]
+        if is_text_column(series):
+            codes = normalized[column] = LowercaseCodes.build(series)
+            order, bounds = _code_postings(codes)
+            trigrams = column in trigram_columns or len(codes.vocabulary) <= TRIGRAM_MAX_VOCABULARY
+            text[column] = TrigramIndex.build(column, codes, order, bounds, trigrams=trigrams)
+            if len(codes.vocabulary) <= CATEGORICAL_MAX_CARDINALITY * row_count:
+                indexes[column] = HashIndex.build(column, codes, order, bounds)
+        elif column_kind(series) != 'string':
+            indexes[column] = SortedIndex.build(column, series)
+    return IndexSet(indexes, row_count, normalized, text)
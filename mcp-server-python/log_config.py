@@ -0,0 +1,130 @@
+# mcp-server-python/log_config.py
+"""
+Structured, leveled and sampled logging for the server.
+
+Records are written as one JSON object per line by a background
+QueueListener: request handlers only filter and enqueue a record, and the
+listener thread renders it to JSON and writes it. Messages use lazy
+%-style arguments, so they are formatted on the listener thread too;
+arguments must not be mutated after they are logged.
+
+RequestLogFilter decides per request, through context variables set by
+the HTTP middleware in main.py:
+- WARNING and above are always kept;
+- INFO records of a route are kept for a sampled share of its requests
+  (LOG_SAMPLE_RATES), so every record of one request is kept or dropped
+  together;
+- DEBUG records, including dumps of frames and results, are kept only for
+  requests that asked for them (see debug_enabled()) or when the
+  configured level is DEBUG.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+LOGGER_NAME = 'mcp_server'
+
+request_route: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_route', default=None)
+request_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar('request_sampled', default=True)
+request_debug: contextvars.ContextVar[bool] = contextvars.ContextVar('request_debug', default=False)
+
+# LogRecord attributes that are not structured "extra" fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_threshold = logging.INFO
+_sample_rates: Dict[str, float] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, route and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records unformatted; the listener's handler formats them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RequestLogFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        route = request_route.get()
+        if route is not None:
+            record.route = route
+        if record.levelno < _threshold:
+            return request_debug.get()
+        return request_sampled.get() or request_debug.get()
+
+
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    return logging.getLogger(LOGGER_NAME if name is None else f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level: str = 'INFO', sample_rates: Optional[Dict[str, float]] = None) -> None:
+    """
+    Route the server's loggers through a non-blocking queue to stderr.
+
+    ``level`` is the default threshold; ``sample_rates`` maps a route path
+    to the share (0..1) of its requests whose INFO records are kept.
+    """
+    global _listener, _threshold, _sample_rates
+    _threshold = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    _sample_rates = dict(sample_rates or {})
+
+    logger = get_logger()
+    if _listener is None:
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        # Records are rendered to JSON and written by the listener thread
+        enqueue = RecordQueueHandler(records)
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(JsonFormatter())
+        _listener = logging.handlers.QueueListener(records, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+        enqueue.addFilter(RequestLogFilter())
+        logger.addHandler(enqueue)
+        logger.propagate = False
+    # Let every record reach the filter, which applies the threshold per request
+    logger.setLevel(logging.DEBUG)
+
+
+def begin_request(route: str, debug: bool = False) -> None:
+    """Set the route, sampling decision and debug flag for the current request."""
+    rate = _sample_rates.get(route, 1.0)
+    request_route.set(route)
+    request_sampled.set(rate >= 1.0 or random.random() < rate)
+    request_debug.set(debug)
+
+
+def debug_enabled() -> bool:
+    """
+    True when DEBUG records of the current request will be kept.
+
+    Guard expensive dumps (frames, full results) with this rather than
+    relying on lazy formatting alone.
+    """
+    return _threshold <= logging.DEBUG or request_debug.get()
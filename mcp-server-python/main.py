@@ -1,16 +1,59 @@
 # mcp-server-python/main.py
+import asyncio
+import numpy as np
 import pandas as pd
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import Dict, List, Any, Optional, Union
-import pandas as pd
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Dict, List, Any, Optional, Tuple, Union
 import os
 import json
+import io
+import threading
+import time
 import traceback
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from datetime import datetime
 
+from aggregation import TooManyPercentileValues, plan_aggregate, run_aggregate
+from chunked_scan import ChunkedSource, explain_scan, scan_aggregate, scan_count, scan_plan
+from column_stats import DatasetStats, Estimate
+from data_watcher import UNKNOWN_STATE, DataWatcher, FileState, file_state
+from log_config import begin_request, configure_logging, debug_enabled, get_logger
+from executor import ExecutorBusy, QueryExecutor, QueryTimeout
+from indexes import build_indexes, extend_indexes
+from metrics import MetricsRegistry, StageTimer, timed
+from parallel_scan import PARALLEL_MIN_ROWS, ParallelScanner, PartitionSet
+from query_planner import (
+    QueryResult,
+    QueryValidationError,
+    build_plan,
+    count_matches,
+    evaluate_batch,
+    execute_plan,
+    explain_plan,
+    normalize_request,
+    page_positions,
+    plan_next_cursor,
+    result_records,
+    scan_required,
+    select_positions,
+)
+from result_cache import ResultCache
+from shared_dataset import SharedDataset, SharedDatasetWatcher, SharedVersion
+from single_flight import SingleFlight
+from serialization import NDJSON_MEDIA_TYPE, encode_rows, iter_ndjson, join_results, render_json, with_metadata
+from schema import compact_frame, extend_frame, is_text_column, memory_by_column, memory_report
+from snapshot_store import load_snapshot, source_fingerprint, write_snapshot
+
+# --- Logging ---
+LOG_LEVEL = "INFO"  # Threshold for the server's structured JSON logs (see log_config.py)
+LOG_SAMPLE_RATES = {"/query": 1.0, "/query/batch": 1.0, "/aggregate": 1.0}  # Share of requests per route whose INFO logs are kept
+DEBUG_HEADER = "X-Debug-Log"  # Send "X-Debug-Log: 1" to log DEBUG dumps for one request
+configure_logging(LOG_LEVEL, LOG_SAMPLE_RATES)
+logger = get_logger()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Custom Data Query MCP Server",
@@ -31,8 +74,7 @@ async def global_exception_handler(request: Request, exc: Exception):
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    print("\n!!! UNHANDLED EXCEPTION !!!")
-    print(json.dumps(error_details, indent=2))
+    logger.error("Unhandled exception", extra=error_details)
     
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -46,73 +88,469 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # --- Data Loading ---
 DATA_FILE_PATH = "data/sample_data.csv"
+SNAPSHOT_ENABLED = True  # Keep a memory-mapped columnar copy of the CSV (see snapshot_store.py)
+DATA_WATCH_ENABLED = True  # Pick up appends and rewrites of the data file without a restart
+DATA_WATCH_INTERVAL_SECONDS = 2.0
+OUT_OF_CORE = False  # Scan the CSV in chunks per query instead of loading it (see chunked_scan.py)
+SCAN_CHUNK_ROWS = 250_000  # Rows read per chunk in out-of-core mode
+SHARED_DATASET = False  # Share one memory-mapped copy of the data and indexes between uvicorn workers (see shared_dataset.py)
+SHARED_ATTACH_TIMEOUT_SECONDS = 300.0  # How long a worker waits at startup for the loader's first version
+DATE_COLUMNS = ['join_date']
+NUMERIC_COLUMNS = ['project_hours', 'id']
+
+@dataclass(frozen=True)
+class Dataset:
+    """One published version of the data. Never modified once published."""
+    frame: Optional[pd.DataFrame]
+    indexes: Any
+    version: int
+    memory: Optional[Dict[str, Any]] = None  # Per-column memory, see schema.py
+    source: Optional[ChunkedSource] = None  # Set in out-of-core mode; frame is then its empty schema
+    partitions: Optional[PartitionSet] = None  # Shared-memory copy of frame for parallel scans
+    stats: Optional[DatasetStats] = None  # Column statistics and row sample for estimate mode
+
+    @property
+    def ready(self) -> bool:
+        return self.source is not None or (self.frame is not None and not self.frame.empty)
+
+# Requests read this reference once and keep using that version until they
+# finish; publish_dataset() swaps it for a new one in a single assignment
+dataset = Dataset(frame=None, indexes=None, version=0)
+data_file: FileState = UNKNOWN_STATE  # Bytes of DATA_FILE_PATH behind the live dataset
+data_watcher: Optional[DataWatcher] = None
+shared_store: Optional[SharedDataset] = None  # Set in shared mode
+shared_watcher: Optional[SharedDatasetWatcher] = None
+shared_version: Optional[str] = None  # Name of the shared version this worker serves
+_publish_lock = threading.Lock()
+
+# Aliases of the live dataset's fields
 df_data = None
+df_indexes = None  # IndexSet over df_data
+data_version = 0  # Bumped every time a new dataset is published
+data_memory = None
+
+# --- Result Cache ---
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_MAX_ENTRIES = 1024
+RESULT_CACHE_TTL_SECONDS = 300
+result_cache = ResultCache(
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESULT_CACHE_TTL_SECONDS
+)
+# Identical queries arriving while one is computed share its result
+single_flight = SingleFlight()
+
+# --- Query Execution ---
+QUERY_WORKERS = min(4, os.cpu_count() or 1)  # Threads running pandas work off the event loop
+QUERY_QUEUE_LIMIT = 32  # Queries allowed to wait for a worker before new ones get 429
+QUERY_TIMEOUT_SECONDS = 30.0  # Upper bound; requests may ask for less via "timeout_ms"
+BATCH_MAX_QUERIES = 50  # Queries accepted in one /query/batch request
+query_executor = QueryExecutor(
+    max_workers=QUERY_WORKERS,
+    max_queued=QUERY_QUEUE_LIMIT,
+    timeout_seconds=QUERY_TIMEOUT_SECONDS
+)
+
+# Scan-heavy queries over at least PARALLEL_MIN_ROWS rows are split across
+# this many processes (see parallel_scan.py); 1 disables it
+PARALLEL_WORKERS = os.cpu_count() or 1
+parallel_scanner = ParallelScanner(PARALLEL_WORKERS) if PARALLEL_WORKERS > 1 else None
+
+# --- Metrics ---
+metrics = MetricsRegistry()
+metrics.register("mcp_result_cache_hits_total", "counter", "Result cache hits",
+                 lambda: result_cache.stats()["hits"])
+metrics.register("mcp_result_cache_misses_total", "counter", "Result cache misses",
+                 lambda: result_cache.stats()["misses"])
+metrics.register("mcp_result_cache_hit_rate", "gauge", "Share of result cache lookups that hit",
+                 lambda: result_cache.stats()["hit_rate"])
+metrics.register("mcp_result_cache_bytes", "gauge", "Bytes held by the result cache",
+                 lambda: result_cache.stats()["size_bytes"])
+metrics.register("mcp_queries_in_flight", "gauge", "Distinct query computations in progress",
+                 lambda: single_flight.stats()["in_flight"])
+metrics.register("mcp_executor_queue_depth", "gauge", "Queries waiting for a worker",
+                 lambda: query_executor.stats()["queued"])
+metrics.register("mcp_executor_running", "gauge", "Queries running on a worker",
+                 lambda: query_executor.stats()["running"])
+metrics.register("mcp_executor_rejected_total", "counter", "Queries rejected because the queue was full",
+                 lambda: query_executor.stats()["rejected"])
+metrics.register("mcp_executor_timeouts_total", "counter", "Queries that exceeded their timeout",
+                 lambda: query_executor.stats()["timeouts"])
+metrics.register("mcp_data_rows", "gauge", "Rows in the loaded dataset",
+                 lambda: 0 if df_data is None else len(df_data))
+
+def record_query_metrics(route: str, timer: StageTimer) -> None:
+    """Feed one request's stage timings and row counts into the /metrics registry."""
+    for stage, seconds in timer.stages.items():
+        metrics.observe("mcp_query_stage_seconds", "Time spent per query stage",
+                        seconds, route=route, stage=stage)
+    metrics.inc("mcp_rows_scanned_total", "Rows examined by predicate evaluation",
+                timer.counts.get("rows_scanned", 0), route=route)
+    metrics.inc("mcp_rows_returned_total", "Rows (or aggregate groups) returned",
+                timer.counts.get("rows_returned", 0), route=route)
+
+def publish_dataset(
+    frame: pd.DataFrame,
+    indexes,
+    memory: Optional[Dict[str, Any]] = None,
+    source: Optional[ChunkedSource] = None,
+    partitions: Optional[PartitionSet] = None,
+    appended_to: Optional[Dataset] = None
+) -> Dataset:
+    """
+    Make a new frame and its indexes live and drop results cached for the
+    old one. When ``frame`` is ``appended_to``'s frame with rows appended,
+    its statistics are extended from the new rows instead of rebuilt.
+    """
+    global dataset, df_data, df_indexes, data_version, data_memory
+    stats = None
+    if indexes is not None:
+        if appended_to is not None and appended_to.stats is not None:
+            stats = appended_to.stats.extend(frame, indexes, len(appended_to.frame))
+        else:
+            stats = DatasetStats.build(frame, indexes)
+    with _publish_lock:
+        published = Dataset(
+            frame=frame, indexes=indexes, version=dataset.version + 1, memory=memory,
+            source=source, partitions=partitions, stats=stats
+        )
+        dataset = published
+        df_data, df_indexes, data_version, data_memory = frame, indexes, published.version, memory
+        result_cache.clear(published.version)
+    return published
+
+def parse_csv(source, names: Optional[List[str]] = None, text_columns: List[str] = ()) -> pd.DataFrame:
+    """
+    Parse CSV data and convert date and numeric columns to proper types.
+    
+    ``source`` is a path or buffer; pass ``names`` for headerless data such
+    as rows appended to the file, and ``text_columns`` to keep those as text.
+    """
+    frame = pd.read_csv(
+        source,
+        header=None if names else 'infer',
+        names=names,
+        dtype={column: str for column in text_columns} or None
+    )
+    return convert_columns(frame)
+
+def convert_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Convert the configured date and numeric columns of freshly parsed rows."""
+    # Convert date columns to datetime
+    for col in DATE_COLUMNS:
+        if col in frame.columns:
+            frame[col] = pd.to_datetime(frame[col])
+    
+    # Convert numeric columns to appropriate types
+    for col in NUMERIC_COLUMNS:
+        if col in frame.columns:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce')
+    return frame
+
+def log_memory_report(report: Dict[str, Any]) -> None:
+    total_before = report["total_before_bytes"]
+    index_bytes = report["indexes"]["total_bytes"] if "indexes" in report else None
+    logger.info(
+        "Column memory: %s -> %s bytes, indexes %s bytes",
+        f"{total_before:,}" if total_before else "n/a", f"{report['total_after_bytes']:,}",
+        f"{index_bytes:,}" if index_bytes is not None else "n/a",
+        extra={"memory": report}
+    )
+
+def index_frame(frame: pd.DataFrame, memory: Optional[Dict[str, Any]]):
+    """Build the secondary indexes of ``frame``, adding their size to the ``memory`` report."""
+    indexes = build_indexes(frame)
+    if memory is not None:
+        memory["indexes"] = indexes.memory_report()
+    return indexes
+
+def read_data_file(path: str):
+    """
+    Read ``path`` into a compact frame, returning (frame, memory report, FileState).
+    
+    A fresh columnar snapshot of the CSV is memory-mapped when available;
+    otherwise the CSV is parsed and a snapshot is written for next time.
+    Text columns with few distinct values become categoricals and integer
+    columns are downcast (see schema.py).
+    """
+    state = file_state(path)
+    frame = load_snapshot(path) if SNAPSHOT_ENABLED else None
+    if frame is not None:
+        logger.info("Loaded memory-mapped snapshot of the data file")
+        memory = memory_report(None, memory_by_column(frame))
+    else:
+        # Fingerprinted before parsing, so a snapshot never pairs these rows
+        # with a later version of the file
+        source = source_fingerprint(path) if SNAPSHOT_ENABLED else None
+        # Read the CSV file with proper type inference
+        frame = parse_csv(path)
+        before = memory_by_column(frame)
+        frame = compact_frame(frame)
+        memory = memory_report(before, memory_by_column(frame))
+        if SNAPSHOT_ENABLED:
+            try:
+                snapshot_dir = write_snapshot(path, frame, source)
+                if snapshot_dir is None:
+                    logger.warning("Data file changed while it was parsed; snapshot not written")
+                else:
+                    logger.info("Wrote columnar snapshot to %s", snapshot_dir)
+            except OSError as e:
+                logger.warning("Could not write snapshot: %s", e)
+    
+    stat = os.stat(path)
+    if (stat.st_size, stat.st_mtime_ns) != (state.size, state.mtime_ns):
+        # Written to while being read: which bytes the frame holds is unknown
+        state = UNKNOWN_STATE
+    return frame, memory, state
+
+def build_partitions(frame: pd.DataFrame, previous: Optional[PartitionSet] = None) -> Optional[PartitionSet]:
+    """
+    Shared-memory partitions of ``frame`` for parallel scans, or None when the
+    frame is too small or they cannot be written. ``previous`` partitions a
+    prefix of ``frame`` (before an append) and is reused.
+    """
+    if parallel_scanner is None or len(frame) < PARALLEL_MIN_ROWS:
+        return None
+    if SHARED_DATASET:
+        # Every worker would write its own copy; the workers themselves
+        # already spread requests over processes
+        return None
+    try:
+        if previous is not None:
+            return previous.extend(frame)
+        return PartitionSet.build(frame, PARALLEL_WORKERS)
+    except OSError as e:
+        logger.warning("Could not write scan partitions, scanning on one core: %s", e)
+        return None
 
 def load_data():
-    """Loads data from the CSV file into a pandas DataFrame."""
-    global df_data
+    """
+    Loads data into a pandas DataFrame and indexes it (see read_data_file).
+    """
+    global data_file
     try:
-        import os
-        print(f"Current working directory: {os.getcwd()}")
-        print(f"Looking for data file at: {os.path.abspath(DATA_FILE_PATH)}")
+        logger.info("Looking for data file at %s", os.path.abspath(DATA_FILE_PATH),
+                    extra={"cwd": os.getcwd()})
         
         # Check if file exists and is readable
         if not os.path.isfile(DATA_FILE_PATH):
             raise FileNotFoundError(f"File not found: {os.path.abspath(DATA_FILE_PATH)}")
-            
-        # Read the CSV file with proper type inference
-        df_data = pd.read_csv(DATA_FILE_PATH)
         
-        # Convert date columns to datetime
-        date_columns = ['join_date']
-        for col in date_columns:
-            if col in df_data.columns:
-                df_data[col] = pd.to_datetime(df_data[col])
+        if OUT_OF_CORE:
+            data_file = file_state(DATA_FILE_PATH)
+            source = ChunkedSource(DATA_FILE_PATH, convert_columns, SCAN_CHUNK_ROWS)
+            publish_dataset(source.schema, None, source=source)
+            logger.info("Scanning the data file in chunks", extra={"source": source.describe()})
+            return DATE_COLUMNS
         
-        # Convert numeric columns to appropriate types
-        numeric_columns = ['project_hours', 'id']
-        for col in numeric_columns:
-            if col in df_data.columns:
-                df_data[col] = pd.to_numeric(df_data[col], errors='coerce')
+        if SHARED_DATASET:
+            load_shared_data()
+            if df_data is None or df_data.empty:
+                return DATE_COLUMNS
+        else:
+            frame, memory, data_file = read_data_file(DATA_FILE_PATH)
+            
+            # Build secondary indexes once so queries avoid full column scans
+            indexes = index_frame(frame, memory)
+            publish_dataset(frame, indexes, memory, partitions=build_partitions(frame))
         
         # Log basic info about the loaded data
-        print("\n=== Data Loaded Successfully ===")
-        print(f"Number of records: {len(df_data)}")
-        print("\nFirst 5 rows:")
-        print(df_data.head().to_string())
-        print("\nColumn dtypes:")
-        print(df_data.dtypes)
-        print("\nUnique departments:", df_data['department'].unique().tolist())
-        print("==============================\n")
-        
-        return date_columns  # Return the date columns list for use in query handling
+        logger.info(
+            "Data loaded successfully: %d records", len(df_data),
+            extra={
+                "dtypes": {c: str(t) for c, t in df_data.dtypes.items()},
+                "indexes": df_indexes.describe()
+            }
+        )
+        if debug_enabled():
+            logger.debug("First 5 rows:\n%s", df_data.head().to_string())
+        log_memory_report(data_memory)
         
-        # Log basic info about the loaded data
-        print("\n=== Data Loaded Successfully ===")
-        print(f"Number of records: {len(df_data)}")
-        print("\nFirst 5 rows:")
-        print(df_data.head().to_string())
-        print("\nColumn dtypes:")
-        print(df_data.dtypes)
-        print("\nUnique departments:", df_data['department'].unique().tolist())
-        print("==============================\n")
+        return DATE_COLUMNS  # Return the date columns list for use in query handling
         
     except FileNotFoundError as e:
-        print(f"\n!!! ERROR: Data file not found !!!")
-        print(f"Error: {e}")
-        print("Current directory contents:", os.listdir(os.path.dirname(os.path.abspath(DATA_FILE_PATH))))
-        df_data = pd.DataFrame() # Empty DataFrame
+        logger.error(
+            "Data file not found: %s", e,
+            extra={"directory_contents": os.listdir(os.path.dirname(os.path.abspath(DATA_FILE_PATH)))}
+        )
+        publish_dataset(pd.DataFrame(), None) # Empty DataFrame
     except Exception as e:
-        print(f"\n!!! ERROR loading data !!!")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error details: {e}")
-        import traceback
-        traceback.print_exc()
-        df_data = pd.DataFrame() # Empty DataFrame
+        logger.exception("Error loading data: %s", e, extra={"error_type": type(e).__name__})
+        publish_dataset(pd.DataFrame(), None) # Empty DataFrame
+
+def use_shared(attached: SharedVersion, appended_to: Optional[Dataset] = None) -> Dataset:
+    """Shared mode: serve a memory-mapped shared version in this worker (see publish_dataset)."""
+    global shared_version
+    published = publish_dataset(attached.frame, attached.indexes, attached.memory, appended_to=appended_to)
+    shared_version = attached.name
+    return published
+
+def share_dataset(
+    frame: pd.DataFrame,
+    indexes,
+    memory: Optional[Dict[str, Any]],
+    state: FileState,
+    appended_to: Optional[Dataset] = None
+) -> Dataset:
+    """
+    Shared mode, loader only: write a new version for every worker, then
+    serve the mapped copy here too so this worker's private one is freed.
+    """
+    name = shared_store.publish(frame, indexes, memory, state)
+    return use_shared(shared_store.attach(name), appended_to)
+
+def load_shared_data() -> None:
+    """
+    Shared mode: the first worker to start becomes the loader. It attaches
+    the live shared version if that still matches the data file, and
+    otherwise builds the data and indexes and publishes them. Every other
+    worker waits for the loader's version and attaches it.
+    """
+    global shared_store, data_file
+    shared_store = SharedDataset(DATA_FILE_PATH)
+    if shared_store.try_lead():
+        live = shared_store.attach()
+        stat = os.stat(DATA_FILE_PATH)
+        if live is not None and live.state is not None and (live.state.size, live.state.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            logger.info("Attached shared dataset version %s (unchanged data file)", live.name)
+            use_shared(live)
+            data_file = live.state
+            return
+        frame, memory, data_file = read_data_file(DATA_FILE_PATH)
+        share_dataset(frame, index_frame(frame, memory), memory, data_file)
+        return
+
+    deadline = time.monotonic() + SHARED_ATTACH_TIMEOUT_SECONDS
+    while True:
+        try:
+            live = shared_store.attach()
+        except OSError:
+            # Pruned between reading the pointer and mapping it; read it again
+            live = None
+        if live is not None:
+            logger.info("Attached shared dataset version %s", live.name)
+            use_shared(live)
+            return
+        if time.monotonic() > deadline:
+            logger.warning("No shared dataset version after %ss; will attach it once published",
+                           SHARED_ATTACH_TIMEOUT_SECONDS)
+            publish_dataset(pd.DataFrame(), None)
+            return
+        time.sleep(0.5)
 
 # Load data on startup
 load_data()
 
+def append_rows(tail: bytes) -> None:
+    """
+    Parse rows appended to the data file and publish the extended dataset.
+    Only the new bytes are parsed and only the new rows are sorted into the
+    indexes; the previous dataset is left intact for requests still using it.
+    """
+    current = dataset
+    if current.frame is None or current.frame.empty:
+        raise ValueError("No dataset to append to")
+    frame = current.frame
+    text = [column for column in frame.columns if is_text_column(frame[column])]
+    tail_rows = parse_csv(io.BytesIO(tail), names=frame.columns.tolist(), text_columns=text)
+    extended = extend_frame(frame, tail_rows)
+    indexes = extend_indexes(current.indexes, extended, len(frame))
+    partitions = build_partitions(extended, current.partitions)
+    if shared_store is not None:
+        state = file_state(DATA_FILE_PATH, data_watcher.state.consumed + len(tail))
+        published = share_dataset(extended, indexes, None, state, appended_to=current)
+    else:
+        published = publish_dataset(extended, indexes, partitions=partitions, appended_to=current)
+    logger.info("Appended %d rows, now %d (version %d)",
+                len(tail_rows), len(extended), published.version)
+
+def reload_data() -> Optional[FileState]:
+    """
+    Rebuild the dataset from scratch and swap it in; on failure the live
+    dataset stays published. Returns the FileState of the new dataset.
+    """
+    try:
+        frame, memory, state = read_data_file(DATA_FILE_PATH)
+        indexes = index_frame(frame, memory)
+        partitions = build_partitions(frame)
+    except Exception as e:
+        logger.exception("Reloading data failed, keeping version %d: %s", dataset.version, e)
+        return None
+    if shared_store is not None:
+        published = share_dataset(frame, indexes, memory, state)
+    else:
+        published = publish_dataset(frame, indexes, memory, partitions=partitions)
+    logger.info("Reloaded %d rows (version %d)", len(frame), published.version)
+    return state
+
+def refresh_source() -> Optional[FileState]:
+    """
+    Out-of-core mode: every query re-reads the file, so a change only needs a
+    new version (dropping cached results) and a fresh look at the schema.
+    """
+    try:
+        state = file_state(DATA_FILE_PATH)
+        source = ChunkedSource(DATA_FILE_PATH, convert_columns, SCAN_CHUNK_ROWS)
+    except Exception as e:
+        logger.exception("Refreshing the data file failed, keeping version %d: %s", dataset.version, e)
+        return None
+    published = publish_dataset(source.schema, None, source=source)
+    logger.info("Data file changed (version %d)", published.version)
+    return state
+
+def attach_shared(name: str) -> None:
+    """Shared mode: switch to version ``name``, just published by the loader."""
+    attached = shared_store.attach(name)
+    if attached is not None:
+        published = use_shared(attached)
+        logger.info("Attached shared dataset version %s (version %d)", name, published.version)
+
+def take_over_loading() -> None:
+    """Shared mode: this worker became the loader and now watches the data file."""
+    global data_file
+    live = shared_store.attach()
+    if live is not None and live.name != shared_version:
+        use_shared(live)
+    # Without a recorded state the first check rebuilds the dataset
+    data_file = live.state if live is not None and live.state is not None else UNKNOWN_STATE
+    start_file_watcher()
+
+@app.on_event("startup")
+def start_data_watcher():
+    global shared_watcher
+    if shared_store is not None and shared_watcher is None:
+        shared_watcher = SharedDatasetWatcher(
+            shared_store, shared_version, attach_shared, take_over_loading, DATA_WATCH_INTERVAL_SECONDS
+        )
+        shared_watcher.start()
+        if not shared_store.leading:
+            # Only the loader watches the data file; the others follow its versions
+            return
+    start_file_watcher()
+
+def start_file_watcher():
+    global data_watcher
+    if DATA_WATCH_ENABLED and data_watcher is None:
+        if dataset.source is not None:
+            on_append, on_rebuild = (lambda tail: refresh_source()), refresh_source
+        else:
+            on_append, on_rebuild = append_rows, reload_data
+        data_watcher = DataWatcher(
+            DATA_FILE_PATH, data_file, on_append, on_rebuild, DATA_WATCH_INTERVAL_SECONDS
+        )
+        data_watcher.start()
+
+@app.on_event("shutdown")
+def stop_data_watcher():
+    global data_watcher, shared_watcher
+    if data_watcher is not None:
+        data_watcher.stop()
+        data_watcher = None
+    if shared_watcher is not None:
+        shared_watcher.stop()
+        shared_watcher = None
+
 # --- Query Logic ---
 def query_data_source(
     filters: Optional[Dict[str, Any]] = None,
@@ -132,130 +570,324 @@ def query_data_source(
         sort_order: Sort order ('asc' or 'desc')
         limit: Maximum number of records to return
     """
-    print(f"\n=== Query Debug ===")
-    print(f"Original filters: {filters}")
-    print(f"Range filters: {ranges}")
+    logger.debug("Query filters: %s, ranges: %s", filters, ranges)
     
-    if df_data is None or df_data.empty:
+    current = dataset
+    if not current.ready:
         error_msg = "Error: Data not loaded or empty - DataFrame is None or empty"
-        print(error_msg)
+        logger.error(error_msg)
         return [{"error": error_msg}]
 
-    # Make a copy of the dataframe to work with
-    queried_df = df_data.copy()
+    try:
+        plan = build_plan(
+            current.frame,
+            filters=filters,
+            ranges=ranges,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            limit=limit,
+            strict=True,
+            partial_match_columns=(),
+            indexes=current.indexes
+        )
+    except QueryValidationError as e:
+        logger.info("Invalid query: %s", e)
+        return [{"error": str(e)}]
+
+    for warning in plan.warnings:
+        logger.info("Plan warning: %s", warning)
+    logger.debug("Plan: %s", [p.describe() for p in plan.predicates])
+
+    result = execute_dataset(current, plan)
+    logger.info("Matching rows: %d", result.total_matches)
     
-    # Convert date strings to datetime objects for proper comparison
-    date_columns = [col for col in queried_df.columns if 'date' in col.lower()]
-    for col in date_columns:
-        if pd.api.types.is_string_dtype(queried_df[col]):
+    return result_records(result.frame)
+
+# --- API Endpoint Definition ---
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Tag this request's log records with its route, sampling decision and
+    debug flag, and record its latency and status for /metrics.
+    """
+    begin_request(request.url.path, debug=request.headers.get(DEBUG_HEADER) == "1")
+    timer = StageTimer()
+    response = await call_next(request)
+    # Unknown paths share one label so they cannot blow up metric cardinality
+    known_paths = {getattr(route, "path", None) for route in app.routes}
+    route = request.url.path if request.url.path in known_paths else "other"
+    metrics.observe("mcp_request_duration_seconds", "End-to-end request latency",
+                    timer.elapsed(), route=route)
+    metrics.inc("mcp_requests_total", "Requests served", route=route,
+                status=response.status_code)
+    return response
+
+def request_timeout(query_data: Dict[str, Any]) -> float:
+    """Timeout for this request: "timeout_ms" if given, capped at QUERY_TIMEOUT_SECONDS."""
+    timeout_ms = query_data.get('timeout_ms')
+    if timeout_ms is None:
+        return QUERY_TIMEOUT_SECONDS
+    # Only JSON numbers: booleans are ints to Python, and strings are not numbers
+    if isinstance(timeout_ms, bool) or not isinstance(timeout_ms, (int, float)) or not timeout_ms > 0:
+        raise HTTPException(status_code=400, detail={"error": f"Invalid timeout_ms: {timeout_ms}"})
+    return min(timeout_ms / 1000, QUERY_TIMEOUT_SECONDS)
+
+async def run_query_work(fn, *args, timeout: float):
+    """Run CPU-bound query work on the executor, mapping saturation/timeouts to HTTP errors."""
+    try:
+        return await query_executor.run(fn, *args, timeout=timeout)
+    except ExecutorBusy as e:
+        logger.warning("Rejected query: %s", e, extra=query_executor.stats())
+        raise HTTPException(
+            status_code=429,
+            detail={"error": str(e)},
+            headers={"Retry-After": "1"}
+        )
+    except QueryTimeout as e:
+        logger.warning("Query timed out after %ss", timeout)
+        raise HTTPException(status_code=503, detail={"error": str(e), "timeout_seconds": timeout})
+
+def runs_parallel(current: Dataset, plan) -> bool:
+    """Whether the plan is scanned across worker processes (large data, no selective index)."""
+    return (
+        parallel_scanner is not None and current.partitions is not None
+        and scan_required(current.frame, plan, current.indexes)
+    )
+
+def select_rows(current: Dataset, plan, timer: Optional[StageTimer] = None):
+    """select_positions over the dataset, in parallel when that pays off."""
+    if runs_parallel(current, plan):
+        try:
+            return parallel_scanner.select_positions(current.frame, current.partitions, plan, timer)
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning("Parallel scan failed, scanning on one core: %s", e)
+    return select_positions(current.frame, plan, current.indexes, timer)
+
+def execute_dataset(current: Dataset, plan, timer: Optional[StageTimer] = None) -> QueryResult:
+    """execute_plan against whichever form the dataset takes (in memory, partitioned or on disk)."""
+    if current.source is not None:
+        return scan_plan(current.source, plan, timer)
+    if not runs_parallel(current, plan):
+        return execute_plan(current.frame, plan, current.indexes, timer)
+    positions, total_matches = select_rows(current, plan, timer)
+    with timed(timer, 'paginate'):
+        return QueryResult(
+            frame=plan.project(current.frame).take(positions),
+            total_matches=total_matches,
+            next_cursor=plan_next_cursor(current.frame, plan, positions)
+        )
+
+def count_dataset(current: Dataset, plan, timer: Optional[StageTimer] = None) -> int:
+    """count_matches against whichever form the dataset takes."""
+    if current.source is not None:
+        return scan_count(current.source, plan, timer)
+    if runs_parallel(current, plan):
+        try:
+            return parallel_scanner.count(current.partitions, plan, timer)
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning("Parallel count failed, scanning on one core: %s", e)
+    return count_matches(current.frame, plan, current.indexes, timer)
+
+def estimate_dataset(current: Dataset, plan, timer: Optional[StageTimer] = None) -> Estimate:
+    """Answer an estimate-mode plan from the dataset's statistics and sample."""
+    if current.stats is None:
+        raise QueryValidationError({"error": "Estimate mode needs the data loaded in memory; use mode \"count\""})
+    with timed(timer, 'estimate'):
+        return current.stats.estimate(plan)
+
+def execute_batch(current: Dataset, plans: List[Any], timer: StageTimer) -> List[Any]:
+    """
+    Execute several plans, sharing predicates they have in common (see
+    evaluate_batch). Each entry is a QueryResult, or the QueryValidationError
+    raised for that plan.
+    """
+    if current.source is not None or current.partitions is not None:
+        # Chunked and parallel scans run plan by plan
+        results = []
+        for plan in plans:
             try:
-                queried_df[col] = pd.to_datetime(queried_df[col])
-                print(f"Converted {col} to datetime")
-            except Exception as e:
-                print(f"Could not convert {col} to datetime: {e}")
-
-    print(f"\nDataFrame columns: {queried_df.columns.tolist()}")
-    print(f"First few rows of data:")
-    print(queried_df.head().to_string())
-
-    # Apply exact match filters
-    if filters:
-        for column, value in filters.items():
-            if column not in queried_df.columns:
-                error_msg = f"Invalid filter column: {column}"
-                print(f"Error: {error_msg}")
-                return [{"error": error_msg}]
-            
-            print(f"\nApplying filter - Column: '{column}', Value: '{value}'")
-            print(f"Column dtype: {queried_df[column].dtype}")
-            
-            # Handle string comparisons (case-insensitive)
-            if pd.api.types.is_string_dtype(queried_df[column]):
-                print("Performing case-insensitive string comparison")
-                mask = queried_df[column].str.lower() == str(value).lower()
-            # Handle numeric comparisons
-            else:
-                print("Performing exact match comparison")
-                mask = queried_df[column] == value
-            
-            # For status field, match exactly what's requested
-            if column == 'status':
-                mask = queried_df[column].str.lower() == str(value).lower()
-            
-            print(f"Matching rows: {mask.sum()}")
-            queried_df = queried_df[mask]
-            print(f"Rows after filter: {len(queried_df)}")
-    
-    # Apply range filters
-    if ranges:
-        for column, range_filters in ranges.items():
-            if column not in queried_df.columns:
-                error_msg = f"Invalid range column: {column}"
-                print(f"Error: {error_msg}")
-                return [{"error": error_msg}]
-                
-            print(f"\nApplying range filter - Column: '{column}', Ranges: {range_filters}")
-            print(f"Column dtype: {queried_df[column].dtype}")
-            
-            # Apply each range condition
-            for op, value in range_filters.items():
-                if op == 'after':
-                    if pd.api.types.is_datetime64_any_dtype(queried_df[column]):
-                        value = pd.to_datetime(value)
-                    mask = queried_df[column] > value
-                elif op == 'before':
-                    if pd.api.types.is_datetime64_any_dtype(queried_df[column]):
-                        value = pd.to_datetime(value)
-                    mask = queried_df[column] < value
-                elif op == 'gte':
-                    if pd.api.types.is_datetime64_any_dtype(queried_df[column]):
-                        value = pd.to_datetime(value)
-                    mask = queried_df[column] >= value
-                elif op == 'lte':
-                    if pd.api.types.is_datetime64_any_dtype(queried_df[column]):
-                        value = pd.to_datetime(value)
-                    mask = queried_df[column] <= value
-                else:
-                    print(f"Warning: Unknown range operator '{op}', skipping")
-                    continue
-                    
-                print(f"Applied {op} {value}: {mask.sum()} rows match")
-                queried_df = queried_df[mask]
+                results.append(execute_dataset(current, plan, timer))
+            except QueryValidationError as e:
+                results.append(e)
+        return results
     
-    # Apply sorting if sort_by is specified
-    if sort_by and sort_by in queried_df.columns:
-        print(f"\nSorting by '{sort_by}' in {sort_order} order")
-        ascending = sort_order.lower() == 'asc'
-        queried_df = queried_df.sort_values(by=sort_by, ascending=ascending)
-    
-    # Apply limit if specified
-    if limit is not None and limit > 0:
-        print(f"Limiting results to {limit} records")
-        queried_df = queried_df.head(limit)
+    frame, indexes = current.frame, current.indexes
+    with timer.stage('filter'):
+        matches = evaluate_batch(frame, plans, indexes, timer)
+    results = []
+    for plan, positions in zip(plans, matches):
+        everything = not plan.predicates and not plan.matches_nothing
+        try:
+            with timer.stage('sort'):
+                page = page_positions(frame, plan, None if everything else positions, indexes)
+        except QueryValidationError as e:
+            results.append(e)
+            continue
+        with timer.stage('paginate'):
+            results.append(QueryResult(
+                frame=plan.project(frame).take(page),
+                total_matches=len(positions),
+                next_cursor=plan_next_cursor(frame, plan, page)
+            ))
+    return results
+
+def query_payload(result: QueryResult, plan, timer: StageTimer) -> Dict[str, Any]:
+    """The /query response payload for an executed plan."""
+    with timer.stage('serialize'):
+        # Encoded column by column straight to JSON (see serialization.py)
+        data = encode_rows(result.frame, plan.row_format)
+    returned = len(result.frame)
+    timer.count('rows_returned', returned)
     
-    # Convert datetime columns back to strings for JSON serialization
-    for col in date_columns:
-        if pd.api.types.is_datetime64_any_dtype(queried_df[col]):
-            queried_df[col] = queried_df[col].dt.strftime('%Y-%m-%d')
+    logger.info(
+        "Matched %d records, returning %d", result.total_matches, returned,
+        extra={"rows_matched": result.total_matches, "rows_returned": returned}
+    )
+    if debug_enabled():
+        logger.debug("Final result: %s", result_records(result.frame))
     
-    print(f"\nFinal result: {queried_df.to_dict(orient='records')}")
-    print("=== End Query Debug ===\n")
+    # Return results in a proper FastAPI response format
+    payload = {
+        "success": True,
+        "data": data,
+        "total_count": returned,
+        "total_matches": result.total_matches
+    }
+    if plan.cursor_mode:
+        payload["next_cursor"] = result.next_cursor
+    return payload
+
+def count_payload(total_matches: int) -> Dict[str, Any]:
+    """The /query response payload for a count-mode plan: no rows, only the count."""
+    logger.info("Counted %d records", total_matches, extra={"rows_matched": total_matches})
+    return {
+        "success": True,
+        "mode": "count",
+        "data": [],
+        "total_count": 0,
+        "total_matches": total_matches
+    }
+
+def estimate_payload(estimate: Estimate, plan, timer: StageTimer) -> Dict[str, Any]:
+    """The /query response payload for an estimate-mode plan."""
+    with timer.stage('serialize'):
+        data = encode_rows(estimate.rows, plan.row_format)
+    timer.count('rows_returned', len(estimate.rows))
+    logger.info(
+        "Estimated %d records (%d to %d, %s)", estimate.count, estimate.lower, estimate.upper, estimate.method,
+        extra={"rows_returned": len(estimate.rows)}
+    )
+    return {
+        "success": True,
+        "mode": "estimate",
+        "data": data,
+        "total_count": len(estimate.rows),
+        "total_matches": estimate.count,
+        "exact": estimate.method == 'exact',
+        "method": estimate.method,
+        "bounds": {"lower": estimate.lower, "upper": estimate.upper, "confidence": estimate.confidence},
+        "sample": {"rows": estimate.sample_rows, "matches": estimate.sample_matches}
+    }
+
+def plan_payload(current: Dataset, plan, timer: StageTimer) -> Dict[str, Any]:
+    """Run a plan in its mode (rows, count or estimate) and build the /query payload."""
+    if plan.mode == 'count':
+        return count_payload(count_dataset(current, plan, timer))
+    if plan.mode == 'estimate':
+        return estimate_payload(estimate_dataset(current, plan, timer), plan, timer)
+    return query_payload(execute_dataset(current, plan, timer), plan, timer)
+
+def render_query(current: Dataset, plan, timer: StageTimer, explain: bool = False) -> bytes:
+    """Execute a plan and serialize the /query response body (without metadata)."""
+    payload = plan_payload(current, plan, timer)
+    if explain:
+        with timer.stage('explain'):
+            payload["explain"] = explain_dataset(current, plan)
+    with timer.stage('serialize'):
+        return render_json(payload)
+
+def explain_dataset(current: Dataset, plan) -> Dict[str, Any]:
+    if current.source is not None:
+        return explain_scan(current.source, plan)
+    return explain_plan(current.frame, plan, current.indexes)
+
+def render_aggregate(current: Dataset, plan, spec, timer: StageTimer, explain: bool = False) -> bytes:
+    """Execute an aggregation and serialize the /aggregate response body (without metadata)."""
+    if current.source is not None:
+        rows, total_matches = scan_aggregate(current.source, plan, spec, timer)
+    elif runs_parallel(current, plan):
+        try:
+            rows, total_matches = parallel_scanner.aggregate(current.frame, current.partitions, plan, spec, timer)
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning("Parallel aggregate failed, scanning on one core: %s", e)
+            rows, total_matches = run_aggregate(current.frame, plan, spec, current.indexes, timer)
+        except TooManyPercentileValues as e:
+            # The frame is in memory anyway: aggregate it whole instead
+            logger.info("%s; aggregating on one core", e)
+            rows, total_matches = run_aggregate(current.frame, plan, spec, current.indexes, timer)
+    else:
+        rows, total_matches = run_aggregate(current.frame, plan, spec, current.indexes, timer)
+    timer.count('rows_returned', len(rows))
+    logger.info(
+        "Aggregated %d records into %d rows", total_matches, len(rows),
+        extra={"rows_matched": total_matches, "rows_returned": len(rows)}
+    )
+    if debug_enabled():
+        logger.debug("Aggregate result: %s", rows)
+    payload = {
+        "success": True,
+        "data": rows,
+        "total_count": len(rows),
+        "total_matches": total_matches
+    }
+    if explain:
+        with timer.stage('explain'):
+            payload["explain"] = explain_dataset(current, plan)
+    with timer.stage('serialize'):
+        return render_json(payload)
+
+async def run_coalesced(cache_key, route: str, timeout: float, fn, *args) -> Tuple[bytes, str]:
+    """
+    Compute a response body on the worker pool and cache it, once for all
+    identical requests in flight. Returns (body, "miss" or "coalesced").
+    """
+    async def work() -> bytes:
+        body = await run_query_work(fn, *args, timeout=timeout)
+        # Cache keys start with the dataset version the body was computed for
+        result_cache.put(cache_key, body, version=cache_key[0])
+        return body
     
-    return queried_df.to_dict(orient='records')
+    try:
+        body, coalesced = await single_flight.run(cache_key, work, timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Identical query in flight did not finish within %ss", timeout)
+        raise HTTPException(status_code=503, detail={"error": "Query timed out", "timeout_seconds": timeout})
+    if not coalesced:
+        return body, "miss"
+    logger.info("Joined an identical query in flight")
+    metrics.inc("mcp_coalesced_requests_total", "Requests answered by an identical request's computation",
+                route=route)
+    return body, "coalesced"
 
-# --- API Endpoint Definition ---
+def respond_json(body: bytes, route: str, timer: StageTimer, cache_status: str) -> Response:
+    """Attach this request's timings to a rendered body and record its metrics."""
+    record_query_metrics(route, timer)
+    metadata = {**timer.metadata(), "cache": cache_status}
+    return Response(
+        with_metadata(body, metadata),
+        media_type="application/json",
+        headers={"X-Cache": cache_status.upper(), "Server-Timing": timer.server_timing()}
+    )
 
-# Define the structure of the request body for the /query endpoint
-class QueryRequest(BaseModel):
-    # In a full MCP implementation, you might have more structured fields like:
-    # tool_name: str
-    # parameters: Dict[str, Any]
-    # For now, we'll keep it simple with just filters.
-    filters: Optional[Dict[str, Any]] = None
-    # We could add a 'query_string' field later for natural language or SQL-like queries
+def wants_stream(request: Request, query_data: Dict[str, Any]) -> bool:
+    """Streaming is opt-in via {"stream": true} or an NDJSON Accept header."""
+    if query_data.get('stream') is True:
+        return True
+    return NDJSON_MEDIA_TYPE in request.headers.get('accept', '')
 
 @app.post("/query", summary="Query the custom data source")
-async def handle_query(request: Request) -> Dict[str, Any]:
+async def handle_query(request: Request) -> Response:
     """
     Receives a query request (e.g., with filters) and returns matching data.
     This endpoint acts as an MCP "tool".
@@ -265,232 +897,190 @@ async def handle_query(request: Request) -> Dict[str, Any]:
     2. Nested filters: {"filters": {"department": "Engineering"}}
     3. Range queries: {"ranges": {"join_date": {"after": "2023-01-01"}}}
     4. Empty request: {}
+    
+    Set "stream": true or send "Accept: application/x-ndjson" to receive
+    the rows as newline-delimited JSON, serialized in fixed-size batches.
+    
+    For keyset pagination send "cursor": true with a limit, then pass the
+    returned "next_cursor" as "cursor" to fetch the following page.
+    
+    "mode": "count" returns only total_matches, counted from the indexes
+    when they cover every condition. "mode": "estimate" returns an
+    approximate total_matches with "bounds", answered from column
+    statistics and a uniform row sample ("sample": false skips the sample),
+    plus up to "limit" matching rows of the sample. Neither mode streams.
+    
+    Execution runs on a bounded worker pool: a full queue answers 429 and a
+    query exceeding its timeout ("timeout_ms", capped server-side) answers 503.
+    
+    Responses carry "metadata" with the query time and per-stage timings;
+    "explain": true adds the evaluated plan with per-predicate selectivity.
+    
+    Filters, ranges, the join_date_after/join_date_before shorthands, sorting
+    and limit/offset are compiled into a single QueryPlan and evaluated in
+    one pass over the loaded data (see query_planner.py). Serialized
+    responses are cached per canonical plan until the data is reloaded.
     """
+    timer = StageTimer()
     try:
-        print(f"\n=== Received Request ===")
-        # Get the raw request body
-        request_body = await request.json()
-        print(f"Request body: {request_body}")
-        print(f"Request type: {type(request_body)}")
-        
-        # Handle both dict and JSON object formats
-        if isinstance(request_body, dict):
-            query_data = request_body
-        else:
-            # If it's not a dict, try to get the first item if it's a list
-            if isinstance(request_body, list) and len(request_body) > 0:
-                query_data = request_body[0]
-            else:
-                query_data = {}
-        
-        # Handle case where request is None or empty
-        if not request:
-            print("Warning: Empty request received, returning all records")
-            results = query_data_source()
-            return format_success_response(results)
-        
-        # Extract filters and ranges from the request
-        print("\n=== Request Processing ===")
-        print(f"Request body: {query_data}")
-        
-        # Extract filters, ranges, sort, and limit from the request
-        filters = query_data.get('filters', {})
-        ranges = query_data.get('ranges', {})
-        sort_config = query_data.get('sort', None)
-        limit = query_data.get('limit')
-        offset = query_data.get('offset', 0)
-        
-        # Handle both sort formats
-        if sort_config is not None:
-            if isinstance(sort_config, dict):
-                sort_by = sort_config.get('field')
-                sort_order = sort_config.get('order', 'asc')
+        with timer.stage('parse'):
+            # Get the raw request body
+            request_body = await request.json()
+            logger.debug("Request body: %s", request_body)
+            
+            # Handle both dict and JSON object formats
+            if isinstance(request_body, dict):
+                query_data = request_body
             else:
-                # Handle legacy format where sort is a string
-                sort_by = sort_config
-                sort_order = 'asc'
-        else:
-            # Handle legacy sort_by/sort_order format
-            sort_by = query_data.get('sort_by')
-            sort_order = query_data.get('sort_order', 'asc')
+                # If it's not a dict, try to get the first item if it's a list
+                if isinstance(request_body, list) and len(request_body) > 0:
+                    query_data = request_body[0]
+                else:
+                    query_data = {}
         
-        # Validate sort parameters
-        if sort_by and sort_by not in df_data.columns:
+        # Pin the dataset so a reload mid-request cannot mix two versions
+        current = dataset
+        frame, indexes, version = current.frame, current.indexes, current.version
+        if not current.ready:
             raise HTTPException(
-                status_code=400,
-                detail={
-                    "error": f"Invalid sort field: {sort_by}",
-                    "valid_fields": df_data.columns.tolist()
-                }
+                status_code=503,
+                detail={"error": "Data not loaded or empty"}
             )
-        if sort_order not in ['asc', 'desc']:
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "error": f"Invalid sort order: {sort_order}",
-                    "valid_orders": ['asc', 'desc']
-                }
-            )
-        
-        # Start with all records
-        queried_df = df_data.copy()
-        print(f"Starting with {len(queried_df)} records")
-        
-        # Apply filters
-        for field in queried_df.columns:
-            if field in filters:
-                value = filters[field]
-                if isinstance(value, list):
-                    # If value is a list, use isin for multiple matches
-                    if pd.api.types.is_string_dtype(queried_df[field]):
-                        # Case-insensitive string comparison for text fields
-                        queried_df = queried_df[queried_df[field].str.lower().isin([str(v).lower() for v in value])]
-                    else:
-                        # Exact match for numeric fields
-                        queried_df = queried_df[queried_df[field].isin(value)]
-                else:
-                    if pd.api.types.is_string_dtype(queried_df[field]):
-                        # Case-insensitive string comparison for text fields
-                        queried_df = queried_df[queried_df[field].str.lower() == str(value).lower()]
-                    elif pd.api.types.is_numeric_dtype(queried_df[field]):
-                        # Exact match for numeric fields
-                        queried_df = queried_df[queried_df[field] == value]
-            elif field in ranges:
-                # Handle range filters
-                range_filters = ranges[field]
-                # Handle date comparisons by converting to datetime if needed
-                for op in ['after', 'before', 'gte', 'lte', 'gt', 'lt']:
-                    if op in range_filters:
-                        value = range_filters[op]
-                        # Convert string to datetime if needed
-                        if isinstance(value, str):
-                            try:
-                                value = pd.to_datetime(value)
-                            except:
-                                print(f"Warning: Could not convert {value} to datetime for {op} comparison")
-                                continue
-                        
-                        # Apply the comparison
-                        if op == 'after':
-                            queried_df = queried_df[pd.to_datetime(queried_df[field]) >= value]
-                        elif op == 'before':
-                            queried_df = queried_df[pd.to_datetime(queried_df[field]) <= value]
-                        elif op == 'gte':
-                            queried_df = queried_df[pd.to_datetime(queried_df[field]) >= value]
-                        elif op == 'lte':
-                            queried_df = queried_df[pd.to_datetime(queried_df[field]) <= value]
-                        elif op == 'gt':
-                            queried_df = queried_df[pd.to_datetime(queried_df[field]) > value]
-                        elif op == 'lt':
-                            queried_df = queried_df[pd.to_datetime(queried_df[field]) < value]
-            if field in filters:
-                filters[field] = str(filters[field]).lower()
-        
-        # Handle partial matches for role
-        if 'role' in filters:
-            role_value = filters['role'].lower()
-            # Create a mask for partial matching of role
-            role_mask = queried_df['role'].str.lower().str.contains(role_value)
-            # Also match common variations
-            variations = [
-                f"{role_value}",
-                f"{role_value} manager",
-                f"{role_value} executive",
-                f"{role_value} specialist"
-            ]
-            for variation in variations:
-                role_mask |= queried_df['role'].str.lower().str.contains(variation)
-            # Apply the mask to filter the DataFrame
-            queried_df = queried_df[role_mask]
-            print(f"Filtered by role (partial match): {len(queried_df)} records")
-        
-        # Handle simplified date range formats
-        if 'join_date_after' in filters:
-            after_date = filters.pop('join_date_after')
-            if 'join_date' not in ranges:
-                ranges['join_date'] = {}
-            ranges['join_date']['after'] = after_date
-        if 'join_date_before' in filters:
-            before_date = filters.pop('join_date_before')
-            if 'join_date' not in ranges:
-                ranges['join_date'] = {}
-            ranges['join_date']['before'] = before_date
+        timeout = request_timeout(query_data)
+        explain = query_data.get('explain') is True
         
-        # Process range filters
-        for field, conditions in ranges.items():
-            if field not in queried_df.columns:
-                print(f"Warning: Skipping unknown range field: {field}")
-                continue
-            
-            # Handle different comparison operators
-            if 'lt' in conditions:
-                queried_df = queried_df[queried_df[field] < conditions['lt']]
-            if 'lte' in conditions:
-                queried_df = queried_df[queried_df[field] <= conditions['lte']]
-            if 'gt' in conditions:
-                queried_df = queried_df[queried_df[field] > conditions['gt']]
-            if 'gte' in conditions:
-                queried_df = queried_df[queried_df[field] >= conditions['gte']]
-            if 'after' in conditions:
-                queried_df = queried_df[queried_df[field] > conditions['after']]
-            if 'before' in conditions:
-                queried_df = queried_df[queried_df[field] < conditions['before']]
-            
-            # Log the filtering
-            print(f"Filtered by {field} range: {len(queried_df)} records remaining")
-            
-        # Convert date ranges to proper format
-        if 'join_date' in ranges:
-            # Convert date strings to datetime objects
-            for op, value in ranges['join_date'].items():
-                if isinstance(value, str):
-                    try:
-                        # Convert to datetime and ensure timezone is handled correctly
-                        ranges['join_date'][op] = pd.to_datetime(value).tz_localize(None)
-                    except ValueError:
-                        print(f"Warning: Invalid date format for {op}: {value}")
-                        continue
-            
-            # Apply date range filters
-            if 'after' in ranges['join_date']:
-                queried_df = queried_df[queried_df['join_date'] > ranges['join_date']['after']]
-            if 'before' in ranges['join_date']:
-                queried_df = queried_df[queried_df['join_date'] < ranges['join_date']['before']]
-        
-        # Apply sorting if sort_by is specified
-        if sort_by and sort_by in queried_df.columns:
-            print(f"\nSorting by '{sort_by}' in {sort_order} order")
-            ascending = sort_order.lower() == 'asc'
-            queried_df = queried_df.sort_values(by=sort_by, ascending=ascending)
-            print(f"Sorted {len(queried_df)} records")
+        try:
+            with timer.stage('parse'):
+                normalized = normalize_request(query_data, frame.columns.tolist())
+            with timer.stage('plan'):
+                plan = build_plan(frame, indexes=indexes, **normalized)
+        except QueryValidationError as e:
+            raise HTTPException(status_code=400, detail=e.detail)
         
-        # Apply limit and offset if specified
-        if limit is not None and limit > 0:
-            print(f"Limiting results to {limit} records")
-            queried_df = queried_df.iloc[offset:offset + limit]
-            print(f"Final record count: {len(queried_df)}")
+        for warning in plan.warnings:
+            logger.info("Plan warning: %s", warning)
+        logger.info(
+            "Plan: %s, sort=%s (%s), limit=%s, offset=%s",
+            [p.describe() for p in plan.predicates], plan.sort_by,
+            'asc' if plan.ascending else 'desc', plan.limit, plan.offset
+        )
         
-        # Convert datetime columns back to strings for JSON serialization
-        date_columns = ['join_date']  # Define date columns here
-        for col in date_columns:
-            if pd.api.types.is_datetime64_any_dtype(queried_df[col]):
-                queried_df[col] = queried_df[col].dt.strftime('%Y-%m-%d')
+        if plan.mode == 'rows' and wants_stream(request, query_data):
+            if current.source is not None:
+                # Chunked scans produce the page itself rather than positions
+                result = await run_query_work(scan_plan, current.source, plan, timer, timeout=timeout)
+                frame, total_matches = result.frame, result.total_matches
+                positions = np.arange(len(frame))
+            else:
+                positions, total_matches = await run_query_work(
+                    select_rows, current, plan, timer, timeout=timeout
+                )
+            logger.info("Streaming %d of %d matching records", len(positions), total_matches)
+            timer.count('rows_returned', len(positions))
+            record_query_metrics(request.url.path, timer)
+            headers = {"X-Total-Count": str(len(positions)), "Server-Timing": timer.server_timing()}
+            cursor = plan_next_cursor(frame, plan, positions)
+            if cursor is not None:
+                headers["X-Next-Cursor"] = cursor
+            return StreamingResponse(
+                iter_ndjson(plan.project(frame), positions),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=headers
+            )
         
-        print(f"\nFinal result: {queried_df.to_dict(orient='records')}")
-        print("=== End Query Debug ===\n")
+        # Explained responses describe this evaluation, so they bypass the cache
+        cache_key = (version, plan.cache_key())
+        body = None if explain else result_cache.get(cache_key)
+        if body is not None:
+            logger.info("Serving cached result")
+            return respond_json(body, request.url.path, timer, "hit")
         
-        # Return results in a proper FastAPI response format
-        return {
-            "success": True,
-            "data": queried_df.to_dict(orient='records'),
-            "total_count": len(queried_df)
-        }
+        if explain:
+            body = await run_query_work(render_query, current, plan, timer, explain, timeout=timeout)
+            return respond_json(body, request.url.path, timer, "miss")
+        body, cache_status = await run_coalesced(
+            cache_key, request.url.path, timeout, render_query, current, plan, timer
+        )
+        return respond_json(body, request.url.path, timer, cache_status)
+    except HTTPException:
+        raise
+    except QueryValidationError as e:
+        raise HTTPException(status_code=400, detail=e.detail)
+    except Exception as e:
+        logger.exception("Error processing query: %s", e, extra={"error_type": type(e).__name__})
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": str(e),
+                "type": type(e).__name__,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        )
+
+@app.post("/aggregate", summary="Aggregate the custom data source")
+async def handle_aggregate(request: Request) -> Response:
+    """
+    Groups the rows matching filters/ranges/search (same semantics as /query)
+    and returns one row per group with the requested metrics, e.g.
+    {"department": "Engineering", "group_by": ["status"],
+     "metrics": [{"op": "count"}, {"op": "p90", "field": "project_hours"}]}
+
+    Ops: count, sum, mean, min, max, median and pNN percentiles. The output
+    rows can be ordered with "sort" and truncated with "limit".
+    Runs on the same bounded worker pool as /query, and takes the same
+    "explain" flag. See aggregation.py.
+    """
+    timer = StageTimer()
+    try:
+        with timer.stage('parse'):
+            query_data = await request.json()
+            logger.debug("Request body: %s", query_data)
+            if not isinstance(query_data, dict):
+                query_data = {}
+
+        current = dataset
+        frame, indexes, version = current.frame, current.indexes, current.version
+        if not current.ready:
+            raise HTTPException(
+                status_code=503,
+                detail={"error": "Data not loaded or empty"}
+            )
+        timeout = request_timeout(query_data)
+        explain = query_data.get('explain') is True
+
+        try:
+            with timer.stage('plan'):
+                plan, spec = plan_aggregate(frame, query_data, indexes)
+        except QueryValidationError as e:
+            raise HTTPException(status_code=400, detail=e.detail)
+
+        for warning in plan.warnings:
+            logger.info("Plan warning: %s", warning)
+        logger.info(
+            "Plan: %s, group_by=%s, metrics=%s",
+            [p.describe() for p in plan.predicates], spec.group_by, [m.name for m in spec.metrics]
+        )
+
+        cache_key = (version, 'aggregate', plan.cache_key(), spec.cache_key())
+        body = None if explain else result_cache.get(cache_key)
+        if body is not None:
+            logger.info("Serving cached result")
+            return respond_json(body, request.url.path, timer, "hit")
+
+        if explain:
+            body = await run_query_work(render_aggregate, current, plan, spec, timer, explain, timeout=timeout)
+            return respond_json(body, request.url.path, timer, "miss")
+        body, cache_status = await run_coalesced(
+            cache_key, request.url.path, timeout, render_aggregate, current, plan, spec, timer
+        )
+        return respond_json(body, request.url.path, timer, cache_status)
+    except HTTPException:
+        raise
+    except QueryValidationError as e:
+        # Raised while aggregating, e.g. TooManyPercentileValues in out-of-core mode
+        raise HTTPException(status_code=400, detail=e.detail)
     except Exception as e:
-        print(f"\n!!! ERROR processing query !!!")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error details: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error processing aggregate: %s", e, extra={"error_type": type(e).__name__})
         raise HTTPException(
             status_code=500,
             detail={
@@ -499,67 +1089,153 @@ async def handle_query(request: Request) -> Dict[str, Any]:
                 "timestamp": datetime.utcnow().isoformat()
             }
         )
+
+@app.post("/query/batch", summary="Run several queries in one request")
+async def handle_query_batch(request: Request) -> Response:
+    """
+    Runs a list of /query bodies against the same dataset version and
+    returns their results in order:
+    {"queries": [{"department": "Engineering"}, {"department": "Sales", "limit": 5}]}
+    (a bare JSON list is accepted too).
+    
+    Predicates shared by several queries, e.g. the same department filter,
+    are evaluated once for the whole batch. Every result has the shape of a
+    /query response; a query that fails validation gets
+    {"success": false, "error": ...} without failing the others. Results
+    come from and go to the same cache as /query. Streaming and "explain"
+    are not available per query; "timeout_ms" applies to the whole batch.
+    """
+    timer = StageTimer()
+    try:
+        with timer.stage('parse'):
+            request_body = await request.json()
+            logger.debug("Request body: %s", request_body)
+            options = request_body if isinstance(request_body, dict) else {}
+            queries = request_body if isinstance(request_body, list) else options.get('queries')
+        if not isinstance(queries, list) or not queries:
+            raise HTTPException(status_code=400, detail={"error": "Expected a non-empty list of queries"})
+        if len(queries) > BATCH_MAX_QUERIES:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": f"Too many queries: {len(queries)}", "max_queries": BATCH_MAX_QUERIES}
+            )
         
-        # Convert project_hours range filter if present
-        if 'project_hours' in ranges:
-            if 'gt' in ranges['project_hours']:
-                ranges['project_hours']['gte'] = ranges['project_hours']['gt']
-                del ranges['project_hours']['gt']
-            if 'lt' in ranges['project_hours']:
-                ranges['project_hours']['lte'] = ranges['project_hours']['lt']
-                del ranges['project_hours']['lt']
+        current = dataset
+        frame, indexes, version = current.frame, current.indexes, current.version
+        if not current.ready:
+            raise HTTPException(
+                status_code=503,
+                detail={"error": "Data not loaded or empty"}
+            )
+        timeout = request_timeout(options)
         
-        # Convert project_hours range filter if present
-        if 'project_hours' in ranges:
-            if 'gt' in ranges['project_hours']:
-                ranges['project_hours']['gte'] = ranges['project_hours']['gt']
-                del ranges['project_hours']['gt']
-            if 'lt' in ranges['project_hours']:
-                ranges['project_hours']['lte'] = ranges['project_hours']['lt']
-                del ranges['project_hours']['lt']
+        bodies: List[Optional[bytes]] = [None] * len(queries)
+        pending = []  # (position in the batch, plan, cache key)
+        hits = 0
+        for i, query_data in enumerate(queries):
+            try:
+                if not isinstance(query_data, dict):
+                    raise QueryValidationError({"error": f"Invalid query: {query_data}"})
+                with timer.stage('parse'):
+                    normalized = normalize_request(query_data, frame.columns.tolist())
+                with timer.stage('plan'):
+                    plan = build_plan(frame, indexes=indexes, **normalized)
+            except QueryValidationError as e:
+                bodies[i] = render_json({"success": False, "error": e.detail})
+                continue
+            cache_key = (version, plan.cache_key())
+            bodies[i] = result_cache.get(cache_key)
+            if bodies[i] is None:
+                pending.append((i, plan, cache_key))
+            else:
+                hits += 1
+        logger.info("Batch of %d queries, %d not cached", len(queries), len(pending))
         
-        if sort_by:
-            print(f"Sorting by: {sort_by} ({sort_order})")
-        if limit is not None:
-            print(f"Limiting to: {limit} records")
-            
-        print(f"Filters to apply: {filters}")
-        print(f"Ranges to apply: {ranges}")
-        print("=======================")
+        def render_pending() -> List[Tuple[bytes, bool]]:
+            # Row queries share predicate work; count and estimate queries run on their own
+            results = iter(execute_batch(current, [plan for _, plan, _ in pending if plan.mode == 'rows'], timer))
+            rendered = []
+            for _, plan, _ in pending:
+                try:
+                    result = next(results) if plan.mode == 'rows' else plan_payload(current, plan, timer)
+                except QueryValidationError as e:
+                    result = e
+                if isinstance(result, QueryValidationError):
+                    payload = {"success": False, "error": result.detail}
+                elif plan.mode == 'rows':
+                    payload = query_payload(result, plan, timer)
+                else:
+                    payload = result
+                with timer.stage('serialize'):
+                    rendered.append((render_json(payload), payload["success"]))
+            return rendered
         
-        # Process the query with filters, ranges, sorting, and limiting
-        results = query_data_source(
-            filters=filters,
-            ranges=ranges,
-            sort_by=sort_by,
-            sort_order=sort_order,
-            limit=limit
-        )
-        return format_success_response(results)
+        if pending:
+            rendered = await run_query_work(render_pending, timeout=timeout)
+            for (i, _, cache_key), (body, succeeded) in zip(pending, rendered):
+                bodies[i] = body
+                if succeeded:
+                    result_cache.put(cache_key, body, version=version)
         
+        cache_status = "miss" if not hits else "partial" if pending else "hit"
+        return respond_json(join_results(bodies), request.url.path, timer, cache_status)
+    except HTTPException:
+        raise
     except Exception as e:
-        error_msg = f"Error in handle_query: {str(e)}"
-        print(f"\n!!! {error_msg}")
-        print(traceback.format_exc())
+        logger.exception("Error processing batch: %s", e, extra={"error_type": type(e).__name__})
         raise HTTPException(
             status_code=500,
             detail={
-                "error": "Internal server error",
-                "details": str(e),
-                "type": e.__class__.__name__
+                "error": str(e),
+                "type": type(e).__name__,
+                "timestamp": datetime.utcnow().isoformat()
             }
         )
 
-def format_success_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Format a successful response in the expected format."""
-    return {
-        "data": results,
-        "metadata": {
-            "query_time_ms": 0,  # You can add actual timing if needed
-            "total_matches": len(results)
+@app.get("/metrics", summary="Prometheus-style metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache", summary="Result cache statistics")
+async def cache_stats():
+    return {**result_cache.stats(), "single_flight": single_flight.stats()}
+
+@app.get("/stats", summary="Loaded data statistics")
+async def data_stats():
+    current = dataset
+    frame, memory = current.frame, current.memory
+    if memory is None and frame is not None:
+        # Appends do not recompute the (O(rows)) memory report eagerly
+        memory = memory_report(None, memory_by_column(frame))
+        if current.indexes is not None:
+            memory["indexes"] = current.indexes.memory_report()
+    if current.source is not None:
+        return {
+            "mode": "out_of_core",
+            "version": current.version,
+            "source": current.source.describe(),
+            "dtypes": {c: str(t) for c, t in frame.dtypes.items()},
+            "executor": query_executor.stats()
         }
+    return {
+        "mode": "in_memory",
+        "rows": 0 if frame is None else len(frame),
+        "version": current.version,
+        "dtypes": {} if frame is None else {c: str(t) for c, t in frame.dtypes.items()},
+        "memory": memory,
+        "indexes": current.indexes.describe() if current.indexes is not None else {},
+        "partitions": current.partitions.describe() if current.partitions is not None else None,
+        "statistics": current.stats.describe() if current.stats is not None else None,
+        "shared": dict(shared_store.describe(), attached_version=shared_version) if shared_store is not None else None,
+        "executor": query_executor.stats()
     }
 
+@app.on_event("shutdown")
+def shutdown_executor():
+    query_executor.shutdown()
+    if parallel_scanner is not None:
+        parallel_scanner.shutdown()
+
 @app.get("/", summary="Server status")
 async def root():
     return {"message": "Custom Data Query MCP Server is running."}
@@ -0,0 +1,148 @@
+# mcp-server-python/metrics.py
+"""
+Query timing and Prometheus-style metrics.
+
+StageTimer measures the stages of one request (parse, plan, filter, sort,
+paginate, serialize) and counts the rows it scanned; the totals end up in
+the response metadata and in the process-wide MetricsRegistry, which
+renders counters, gauges and latency histograms in the Prometheus text
+exposition format for GET /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class StageTimer:
+    """Wall-clock time per named stage of a single request, plus row counters."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def metadata(self) -> Dict[str, Any]:
+        """Timings in milliseconds for the response metadata."""
+        return {
+            "query_time_ms": round(self.elapsed() * 1000, 3),
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            **self.counts,
+        }
+
+    def server_timing(self) -> str:
+        """Stage timings as a Server-Timing header value."""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items())
+
+
+def timed(timer: Optional[StageTimer], name: str):
+    """timer.stage(name), or a no-op when no timer is attached."""
+    return nullcontext() if timer is None else timer.stage(name)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = []
+    for key, value in pairs:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        # [count per bucket..., +Inf count, sum]
+        state = self.series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def render(self, name: str) -> List[str]:
+        lines = []
+        for labels, state in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', repr(bound)))} {count}")
+            total = state[len(self.buckets)]
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {total}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {state[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, plus gauges read at render time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        self._help.setdefault(name, (kind, help_text))
+
+    def inc(self, name: str, help_text: str, value: float = 1, **labels: Any) -> None:
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            series = self._counters.setdefault(name, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, help_text: str, value: float,
+                buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels: Any) -> None:
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            self._histograms.setdefault(name, Histogram(buckets)).observe(_labels(labels), value)
+
+    def register(self, name: str, kind: str, help_text: str, read: Callable[[], float]) -> None:
+        """Expose a value owned elsewhere (cache counters, queue depth) under ``name``."""
+        with self._lock:
+            self._declare(name, kind, help_text)
+            self._callbacks[name] = read
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for name, (kind, help_text) in self._help.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if name in self._counters:
+                    for labels, value in sorted(self._counters[name].items()):
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                elif name in self._histograms:
+                    lines.extend(self._histograms[name].render(name))
+                elif name in self._callbacks:
+                    lines.append(f"{name} {self._callbacks[name]()}")
+            return "\n".join(lines) + "\n"
@@ -0,0 +1,212 @@
+# mcp-server-python/pagination.py
+"""
+Ordering and paging of matching rows.
+
+Sorted results are ordered by (sort column, id); rows whose sort value is
+missing come last. When only offset + limit rows are needed they are picked
+with np.argpartition in O(m) and only those rows are sorted, instead of
+sorting every match.
+
+Keyset cursors encode the sort value and id of the last row of a page, so
+the next page starts right after it instead of skipping offset rows. When
+nothing is filtered and the sort column has a SortedIndex, each page is cut
+straight out of the index in O(log N + k).
+"""
+import base64
+import json
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Unique column used to break ties between equal sort values
+TIE_BREAK_COLUMN = 'id'
+
+
+class CursorError(ValueError):
+    """Raised for cursors that are malformed or belong to another sort."""
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def encode_cursor(sort_by: str, ascending: bool, value: Any, tie: Any) -> str:
+    """Opaque token for the row after which the next page starts."""
+    missing = bool(pd.isna(value))
+    payload = {
+        "s": sort_by,
+        "a": ascending,
+        "k": None if missing else _json_value(value),
+        "m": missing,
+        "t": _json_value(tie),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort_by: str, ascending: bool) -> dict:
+    """Decode and validate a cursor against the request's sort."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        cursor = {"value": payload["k"], "missing": bool(payload["m"]), "tie": payload["t"]}
+        cursor_sort, cursor_ascending = payload["s"], payload["a"]
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise CursorError("Malformed cursor")
+    if cursor_sort != sort_by or cursor_ascending != ascending:
+        raise CursorError("Cursor was issued for a different sort")
+    return cursor
+
+
+def _key_space(series: pd.Series) -> Tuple[np.ndarray, np.ndarray, Callable[[Any], Any]]:
+    """
+    Map a column's values to numeric keys that sort like the values.
+
+    Returns (keys, missing mask, function mapping a raw value to key space).
+    Values absent from a text column map between neighbouring keys.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy()
+        unit = values.dtype
+
+        def to_key(value):
+            return pd.Timestamp(value).tz_localize(None).to_datetime64().astype(unit).astype(np.int64)
+        return values.astype(np.int64), np.isnat(values), to_key
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+            keys = series.to_numpy(dtype=np.int64)
+            return keys, np.zeros(len(keys), dtype=bool), float
+        keys = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return keys, np.isnan(keys), float
+
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.is_monotonic_increasing:
+        codes = series.cat.codes.to_numpy().astype(np.float64)
+        uniques = series.cat.categories.to_numpy()
+    else:
+        codes, uniques = pd.factorize(series, sort=True)
+        codes = codes.astype(np.float64)
+        uniques = np.asarray(uniques, dtype=object)
+
+    def to_key(value):
+        left = int(np.searchsorted(uniques, value, 'left'))
+        if left < len(uniques) and uniques[left] == value:
+            return float(left)
+        return left - 0.5
+    return codes, codes < 0, to_key
+
+
+def _tie_values(frame: pd.DataFrame, positions: np.ndarray) -> np.ndarray:
+    if TIE_BREAK_COLUMN in frame.columns:
+        return frame[TIE_BREAK_COLUMN].to_numpy()[positions]
+    return positions
+
+
+def _ordered(keys: np.ndarray, ties: np.ndarray, missing: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Indices of the first ``k`` rows (all when k is None) in (key, tie) order."""
+    present = np.flatnonzero(~missing)
+    if k is not None and k < len(present):
+        present_keys = keys[present]
+        boundary = present_keys[np.argpartition(present_keys, k - 1)[k - 1]]
+        # Keep every row tied with the k-th key; ties are resolved below
+        present = present[present_keys <= boundary]
+    order = present[np.lexsort((ties[present], keys[present]))]
+    if k is None or len(order) < k:
+        absent = np.flatnonzero(missing)
+        order = np.concatenate([order, absent[np.argsort(ties[absent], kind='stable')]])
+    return order if k is None else order[:k]
+
+
+def _index_window(index: Any, ascending: bool, cursor: Optional[dict], k: int) -> np.ndarray:
+    """
+    Positions that are guaranteed to contain the next ``k`` rows of an
+    unfiltered result, read directly from the column's SortedIndex.
+    """
+    values, order = index.sorted_values, index.order
+    size = len(values)
+    key = None
+    if cursor is not None and not cursor["missing"]:
+        key = cursor["value"]
+        if np.issubdtype(values.dtype, np.datetime64):
+            key = pd.Timestamp(key).tz_localize(None).to_datetime64()
+
+    if cursor is not None and cursor["missing"]:
+        # Every row with a value has already been returned
+        window, reaches_end = order[:0], True
+    elif ascending:
+        start = 0 if key is None else int(np.searchsorted(values, key, 'left'))
+        tied_end = start if key is None else int(np.searchsorted(values, key, 'right'))
+        stop = min(tied_end + k, size)
+        if 0 < stop < size:
+            stop = int(np.searchsorted(values, values[stop - 1], 'right'))
+        window, reaches_end = order[start:stop], stop == size
+    else:
+        end = size if key is None else int(np.searchsorted(values, key, 'right'))
+        tied_start = end if key is None else int(np.searchsorted(values, key, 'left'))
+        start = max(tied_start - k, 0)
+        if start > 0:
+            start = int(np.searchsorted(values, values[start], 'left'))
+        window, reaches_end = order[start:end], start == 0
+
+    if reaches_end and len(index.missing):
+        window = np.concatenate([window, index.missing])
+    return window
+
+
+def order_page(
+    frame: pd.DataFrame,
+    positions: Optional[np.ndarray],
+    sort_by: Optional[str],
+    ascending: bool,
+    offset: int,
+    limit: Optional[int],
+    cursor: Optional[dict] = None,
+    indexes: Optional[Any] = None
+) -> np.ndarray:
+    """
+    Ordered row positions of the requested page.
+
+    ``positions`` are the matching rows in position order, or None when
+    every row matches (which lets a SortedIndex serve the page directly).
+    """
+    k = None if limit is None else offset + limit
+    if sort_by is None:
+        if positions is None:
+            positions = np.arange(len(frame))
+        return positions[offset:k]
+
+    if positions is None:
+        index = indexes.indexes.get(sort_by) if indexes is not None else None
+        if index is not None and hasattr(index, 'sorted_values') and k is not None:
+            positions = _index_window(index, ascending, cursor, k)
+        else:
+            positions = np.arange(len(frame))
+
+    keys, missing, to_key = _key_space(frame[sort_by].iloc[positions])
+    if not ascending:
+        keys = -keys
+    ties = _tie_values(frame, positions)
+
+    if cursor is not None:
+        if cursor["missing"]:
+            after = missing & (ties > cursor["tie"])
+        else:
+            cursor_key = to_key(cursor["value"])
+            if not ascending:
+                cursor_key = -cursor_key
+            after = missing | (keys > cursor_key) | ((keys == cursor_key) & (ties > cursor["tie"]))
+        positions, keys, missing, ties = positions[after], keys[after], missing[after], ties[after]
+
+    return positions[_ordered(keys, ties, missing, k)][offset:]
+
+
+def next_cursor(frame: pd.DataFrame, page: np.ndarray, sort_by: str, ascending: bool) -> str:
+    """Cursor pointing just past the last row of ``page``."""
+    last = page[-1]
+    tie = frame[TIE_BREAK_COLUMN].iloc[last] if TIE_BREAK_COLUMN in frame.columns else last
+    return encode_cursor(sort_by, ascending, frame[sort_by].iloc[last], tie)
@@ -0,0 +1,235 @@
+# mcp-server-python/parallel_scan.py
+"""
+Parallel execution of scan-heavy queries across processes.
+
+Predicates that no index narrows down (substring matches on role, equality
+on project_hours, long "in" lists) are evaluated over every row, which
+takes a single core when done in the query thread. For large datasets the
+rows are split into contiguous partitions and each partition's columns are
+written once as .npy files to shared memory (/dev/shm, same encoding as the
+snapshots in snapshot_store.py). Worker processes memory-map them
+read-only, so no rows are copied or pickled: a task carries only the plan
+and where its partition lives.
+
+Each worker evaluates the plan over its partition and returns
+- for /query, its match count and its own first offset + limit rows in the
+  plan's order (every match when there is no limit), which the parent then
+  orders once more with order_page, exactly as for one partition;
+- for /aggregate, a PartialAggregate (see aggregation.py) that the parent
+  merges; percentile fields travel as counts per distinct value, and past
+  aggregation.PERCENTILE_MAX_VALUES of them the parent aggregates the
+  in-memory frame on one core instead;
+- for count-mode queries, only its match count.
+
+Partitions never change once written. Appended rows go into new
+partitions, so consecutive dataset versions share most of them, and a
+partition's files are deleted once no dataset refers to it.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from aggregation import AggregateSpec, PartialAggregate
+from metrics import timed
+from pagination import order_page
+from query_planner import QueryPlan, QueryValidationError, evaluate_predicates
+from snapshot_store import read_columns, write_columns
+
+# Datasets smaller than this are scanned in the query thread: below it,
+# dispatching to processes costs more than it saves
+PARALLEL_MIN_ROWS = 1_000_000
+
+# Where partition files are written; tmpfs keeps them in memory
+PARTITION_ROOT = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Partitions each worker process keeps mapped (least recently used dropped)
+ATTACHED_PARTITIONS = 256
+
+Task = Tuple[str, List[Dict[str, Any]], int]
+
+
+class Partition:
+    """Rows [start, stop) of a dataset, stored as memory-mappable column files."""
+
+    def __init__(self, frame: pd.DataFrame, start: int, stop: int, root: Optional[str] = None):
+        self.start = start
+        self.stop = stop
+        self.directory = tempfile.mkdtemp(prefix='mcp-partition-', dir=root or PARTITION_ROOT)
+        try:
+            self.columns = write_columns(self.directory, frame.iloc[start:stop])
+        except Exception:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            raise
+        # The files go away with the last dataset version using them
+        weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def task(self) -> Task:
+        return self.directory, self.columns, self.start
+
+
+def _cover(frame: pd.DataFrame, start: int, stop: int, size: int) -> List[Partition]:
+    bounds = list(range(start, stop, size)) + [stop]
+    return [Partition(frame, low, high) for low, high in zip(bounds[:-1], bounds[1:])]
+
+
+class PartitionSet:
+    """The partitions covering every row of one dataset version, in row order."""
+
+    def __init__(self, partitions: List[Partition], partition_rows: int):
+        self.partitions = partitions
+        self.partition_rows = partition_rows
+        self.rows = partitions[-1].stop if partitions else 0
+
+    @classmethod
+    def build(cls, frame: pd.DataFrame, count: int) -> 'PartitionSet':
+        """Split ``frame`` into ``count`` partitions of (nearly) equal size."""
+        size = max(-(-len(frame) // count), 1)
+        return cls(_cover(frame, 0, len(frame), size), size)
+
+    def extend(self, frame: pd.DataFrame) -> 'PartitionSet':
+        """
+        Partitions of ``frame``, whose first ``rows`` rows are the ones
+        partitioned here. An undersized last partition is rewritten together
+        with the new rows; every other partition is reused as is.
+        """
+        partitions = list(self.partitions)
+        start = self.rows
+        if partitions and partitions[-1].stop - partitions[-1].start < self.partition_rows:
+            start = partitions.pop().start
+        return PartitionSet(partitions + _cover(frame, start, len(frame), self.partition_rows), self.partition_rows)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "partitions": len(self.partitions),
+            "partition_rows": self.partition_rows,
+            "root": PARTITION_ROOT,
+        }
+
+
+# --- Worker process side ---
+
+_attached: 'OrderedDict[str, pd.DataFrame]' = OrderedDict()
+
+
+def _attach(task: Task) -> pd.DataFrame:
+    """Memory-map a partition (once per process); text stays dictionary-encoded."""
+    directory, columns, _ = task
+    frame = _attached.get(directory)
+    if frame is None:
+        frame = read_columns(directory, columns, dictionary_as_categorical=True)
+        _attached[directory] = frame
+        if len(_attached) > ATTACHED_PARTITIONS:
+            _attached.popitem(last=False)
+    else:
+        _attached.move_to_end(directory)
+    return frame
+
+
+def _select_partition(task: Task, plan: QueryPlan, k: Optional[int]) -> Tuple[int, np.ndarray]:
+    frame = _attach(task)
+    positions = evaluate_predicates(frame, plan)
+    page = order_page(frame, positions, plan.sort_by, plan.ascending, 0, k, plan.cursor)
+    return len(positions), page + task[2]
+
+
+def _count_partition(task: Task, plan: QueryPlan) -> int:
+    return len(evaluate_predicates(_attach(task), plan))
+
+
+def _aggregate_partition(task: Task, plan: QueryPlan, spec: AggregateSpec) -> PartialAggregate:
+    frame = _attach(task)
+    partial = PartialAggregate(spec)
+    partial.add(frame, evaluate_predicates(frame, plan))
+    return partial
+
+
+# --- Query thread side ---
+
+class ParallelScanner:
+    """A pool of worker processes evaluating plans over a PartitionSet."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Forking a process that runs threads is unsafe; workers start clean
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _map(self, fn, partitions: PartitionSet, *args: Any) -> list:
+        pool = self._pool
+        try:
+            futures = [pool.submit(fn, partition.task(), *args) for partition in partitions.partitions]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            # A worker died; replace the pool so later queries can use it
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = self._new_pool()
+            raise
+
+    def select_positions(
+        self,
+        frame: pd.DataFrame,
+        partitions: PartitionSet,
+        plan: QueryPlan,
+        timer: Optional[Any] = None
+    ) -> Tuple[np.ndarray, int]:
+        """Same result as query_planner.select_positions, evaluated per partition."""
+        k = None if plan.limit is None else plan.offset + plan.limit
+        try:
+            with timed(timer, 'filter'):
+                results = self._map(_select_partition, partitions, plan, k)
+                total_matches = sum(count for count, _ in results)
+                candidates = np.concatenate([page for _, page in results])
+            with timed(timer, 'sort'):
+                page = order_page(
+                    frame, candidates, plan.sort_by, plan.ascending,
+                    plan.offset, plan.limit, plan.cursor
+                )
+        except (TypeError, ValueError) as e:
+            raise QueryValidationError({"error": f"Invalid cursor: {e}"})
+        if timer is not None:
+            timer.count('rows_scanned', partitions.rows)
+        return page, total_matches
+
+    def count(self, partitions: PartitionSet, plan: QueryPlan, timer: Optional[Any] = None) -> int:
+        """Same result as query_planner.count_matches, evaluated per partition."""
+        with timed(timer, 'filter'):
+            total_matches = sum(self._map(_count_partition, partitions, plan))
+        if timer is not None:
+            timer.count('rows_scanned', partitions.rows)
+        return total_matches
+
+    def aggregate(
+        self,
+        frame: pd.DataFrame,
+        partitions: PartitionSet,
+        plan: QueryPlan,
+        spec: AggregateSpec,
+        timer: Optional[Any] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Same result as aggregation.run_aggregate, evaluated per partition."""
+        with timed(timer, 'filter'):
+            partials = self._map(_aggregate_partition, partitions, plan, spec)
+        if timer is not None:
+            timer.count('rows_scanned', partitions.rows)
+        with timed(timer, 'aggregate'):
+            merged = PartialAggregate(spec)
+            for partial in partials:
+                merged.merge(partial)
+            return merged.records(frame.iloc[:0], timer), merged.matches
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
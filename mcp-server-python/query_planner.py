@@ -0,0 +1,969 @@
+# mcp-server-python/query_planner.py
+"""
+Query planning and single-pass evaluation for the /query endpoint.
+
+A request is normalized into a QueryPlan: a flat conjunction of predicates
+(exact, multi-value, partial, free-text search and range matches), plus sorting and
+pagination. Duplicate conditions are dropped, the remaining predicates are
+ordered by estimated selectivity and evaluated into one boolean mask over
+the base DataFrame. Only the rows that survive pagination are ever copied.
+
+When an IndexSet (see indexes.py) is supplied, selectivity comes from exact
+index counts, and index-backed predicates are resolved and intersected as
+row positions before the remaining predicates look at any row data.
+"""
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+from pagination import TIE_BREAK_COLUMN, CursorError, decode_cursor, next_cursor, order_page
+from schema import is_text_column
+
+# Layouts of the result rows: a list of objects, or column names plus row arrays
+ROW_FORMATS = ('records', 'columns')
+
+# What a query returns: the matching rows, only their exact count, or an
+# approximate count with sample rows (see column_stats.py)
+QUERY_MODES = ('rows', 'count', 'estimate')
+
+# Range operators accepted in "ranges"; 'after'/'before' are aliases. All
+# conditions on one column are merged into a single 'range' predicate
+RANGE_OPERATORS = {'gt', 'gte', 'lt', 'lte'}
+RANGE_ALIASES = {'after': 'gt', 'before': 'lt'}
+
+# Columns matched by case-insensitive substring instead of equality
+PARTIAL_MATCH_COLUMNS = ('role',)
+
+# Pseudo-column of the free-text "search" predicate, which matches a token
+# against every text column
+SEARCH_COLUMN = '*'
+
+# Shorthand filter keys that are really ranges on another column
+SHORTHAND_RANGES = {
+    'join_date_after': ('join_date', 'gt'),
+    'join_date_before': ('join_date', 'lt'),
+}
+
+# Fallback selectivity guesses used when nothing better is known
+DEFAULT_SELECTIVITY = {
+    'eq': 0.1,
+    'in': 0.2,
+    'contains': 0.3,
+    'search': 0.3,
+    'range': 0.5,
+}
+
+# Once fewer than 1/SPARSE_RATIO of the rows remain, later predicates are
+# evaluated only on the surviving rows instead of the whole column
+SPARSE_RATIO = 8
+
+# An index lookup is intersected with the current candidates only while it
+# is at most this many times larger; otherwise the candidates are checked
+# against the column directly
+INTERSECT_RATIO = 4
+
+
+class QueryValidationError(ValueError):
+    """Raised when a request cannot be turned into a valid plan."""
+
+    def __init__(self, detail: Dict[str, Any]):
+        super().__init__(detail.get('error', 'Invalid query'))
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class Interval:
+    """
+    Bounds of a 'range' predicate; a bound of None leaves that side open.
+    Bounds are in the column's own representation: numbers for numeric
+    columns, numpy datetime64 in the column's unit for datetime columns.
+    """
+    low: Any = None
+    low_inclusive: bool = False
+    high: Any = None
+    high_inclusive: bool = False
+
+    def tighten(self, op: str, bound: Any) -> 'Interval':
+        """This interval intersected with ``value <op> bound``."""
+        inclusive = op in ('gte', 'lte')
+        if op in ('gt', 'gte'):
+            if self.low is None or bound > self.low or (bound == self.low and not inclusive):
+                return replace(self, low=bound, low_inclusive=inclusive)
+        elif self.high is None or bound < self.high or (bound == self.high and not inclusive):
+            return replace(self, high=bound, high_inclusive=inclusive)
+        return self
+
+    def is_empty(self) -> bool:
+        if self.low is None or self.high is None:
+            return False
+        return self.low > self.high or (
+            self.low == self.high and not (self.low_inclusive and self.high_inclusive)
+        )
+
+    def describe(self) -> str:
+        bounds = []
+        if self.low is not None:
+            bounds.append(f"{'>=' if self.low_inclusive else '>'} {_format_bound(self.low)}")
+        if self.high is not None:
+            bounds.append(f"{'<=' if self.high_inclusive else '<'} {_format_bound(self.high)}")
+        return ' and '.join(bounds)
+
+
+def _format_bound(value: Any) -> str:
+    return str(pd.Timestamp(value)) if isinstance(value, np.datetime64) else repr(value)
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """A single condition on one column. Values are already normalized."""
+    column: str
+    op: str
+    value: Any
+    kind: str
+
+    def describe(self) -> str:
+        if self.op == 'range':
+            return f"{self.column} {self.value.describe()}"
+        return f"{self.column} {self.op} {self.value!r}"
+
+
+@dataclass
+class QueryPlan:
+    """Normalized, deduplicated and ordered form of a query request."""
+    predicates: List[Predicate] = field(default_factory=list)
+    sort_by: Optional[str] = None
+    ascending: bool = True
+    limit: Optional[int] = None
+    offset: int = 0
+    cursor_mode: bool = False
+    cursor: Optional[Dict[str, Any]] = None
+    cursor_token: Optional[str] = None
+    matches_nothing: bool = False
+    fields: Optional[Tuple[str, ...]] = None  # Columns returned (None: all)
+    row_format: str = 'records'
+    mode: str = 'rows'
+    sample: bool = True  # Estimate mode: also evaluate the plan on the row sample
+    warnings: List[str] = field(default_factory=list)
+
+    def cache_key(self) -> Tuple:
+        """Canonical, hashable form of the plan; equal for equivalent requests."""
+        return (
+            frozenset(self.predicates),
+            self.sort_by,
+            self.ascending,
+            self.limit,
+            self.offset,
+            self.cursor_mode,
+            self.cursor_token,
+            self.matches_nothing,
+            self.fields,
+            self.row_format,
+            self.mode,
+            self.sample,
+        )
+
+    def project(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """``frame`` restricted to the requested fields."""
+        return frame if self.fields is None else frame[list(self.fields)]
+
+
+@dataclass
+class QueryResult:
+    """Rows selected by a plan, before serialization."""
+    frame: pd.DataFrame
+    total_matches: int
+    next_cursor: Optional[str] = None
+
+
+def column_kind(series: pd.Series) -> str:
+    """Classify a column as 'datetime', 'numeric' or 'string'."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return 'string'
+    return 'numeric'
+
+
+def _coerce_operand(kind: str, value: Any) -> Tuple[bool, Any]:
+    """Convert a raw request value to the column's type. Returns (ok, value)."""
+    try:
+        if kind == 'datetime':
+            timestamp = pd.Timestamp(value)
+            if pd.isna(timestamp):
+                return False, value
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.tz_localize(None)
+            return True, timestamp
+        if kind == 'numeric':
+            if isinstance(value, bool):
+                return False, value
+            number = pd.to_numeric(value)
+            if pd.isna(number):
+                return False, value
+            return True, number.item() if hasattr(number, 'item') else number
+        return True, str(value).lower()
+    except (TypeError, ValueError):
+        return False, value
+
+
+def _datetime_bound(timestamp: pd.Timestamp, dtype: Any) -> np.datetime64:
+    """``timestamp`` in the unit of a datetime column, clamped to the unit's range."""
+    unit = getattr(dtype, 'unit', None) or np.datetime_data(dtype)[0]
+    try:
+        return timestamp.as_unit(unit).to_datetime64()
+    except (OverflowError, ValueError):
+        # Beyond every representable value (the smallest int64 is NaT)
+        info = np.iinfo(np.int64)
+        return np.datetime64(info.max if timestamp.year > 1970 else info.min + 1, unit)
+
+
+def _normalize_sort(query_data: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    """Accept both the {"sort": {...}} and the legacy sort_by/sort_order formats."""
+    sort_config = query_data.get('sort')
+    if sort_config is not None:
+        if isinstance(sort_config, dict):
+            return sort_config.get('field'), sort_config.get('order', 'asc')
+        return sort_config, 'asc'
+    return query_data.get('sort_by'), query_data.get('sort_order', 'asc')
+
+
+def _normalize_int(name: str, value: Any, default: Optional[int]) -> Optional[int]:
+    if value is None:
+        return default
+    # Booleans are ints to Python, and floats would be truncated silently
+    if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, np.integer)) or value < 0:
+        raise QueryValidationError({"error": f"Invalid {name}: {value}"})
+    return int(value)
+
+
+def normalize_request(query_data: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    """
+    Flatten the accepted request formats into filters/ranges/search/sort/pagination.
+
+    Top-level column keys are treated as filters, and the join_date_after /
+    join_date_before shorthands are folded into join_date ranges. The input
+    dictionary is never modified. Filters, ranges and each range condition
+    must be JSON objects; anything else raises QueryValidationError.
+    """
+    filters = query_data.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise QueryValidationError({"error": f"Invalid filters: {filters}", "expected": "object"})
+    filters = dict(filters)
+    search = filters.pop('search', None) or query_data.get('search')
+    for key, value in query_data.items():
+        if key in columns and key not in filters:
+            filters[key] = value
+
+    raw_ranges = query_data.get('ranges') or {}
+    if not isinstance(raw_ranges, dict):
+        raise QueryValidationError({"error": f"Invalid ranges: {raw_ranges}", "expected": "object"})
+    ranges: Dict[str, Dict[str, Any]] = {}
+    for column, conditions in raw_ranges.items():
+        if not isinstance(conditions, dict):
+            raise QueryValidationError({
+                "error": f"Invalid range for {column}: {conditions}",
+                "expected": "object of operator to value, e.g. {\"gte\": 10}"
+            })
+        ranges[column] = dict(conditions)
+    for shorthand, (column, op) in SHORTHAND_RANGES.items():
+        for source in (filters, query_data):
+            if shorthand in source:
+                ranges.setdefault(column, {})[op] = source[shorthand]
+        filters.pop(shorthand, None)
+
+    sort_by, sort_order = _normalize_sort(query_data)
+    return {
+        'filters': filters,
+        'ranges': ranges,
+        'search': search,
+        'sort_by': sort_by,
+        'sort_order': sort_order,
+        'limit': query_data.get('limit'),
+        'offset': query_data.get('offset', 0),
+        'cursor': query_data.get('cursor'),
+        'fields': query_data.get('fields'),
+        'row_format': query_data.get('format', 'records'),
+        'mode': query_data.get('mode', 'rows'),
+        'sample': query_data.get('sample', True),
+    }
+
+
+def build_plan(
+    frame: pd.DataFrame,
+    filters: Optional[Dict[str, Any]] = None,
+    ranges: Optional[Dict[str, Dict[str, Any]]] = None,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: str = 'asc',
+    limit: Optional[int] = None,
+    offset: Optional[int] = 0,
+    cursor: Optional[Any] = None,
+    fields: Optional[Any] = None,
+    row_format: str = 'records',
+    mode: str = 'rows',
+    sample: Any = True,
+    strict: bool = False,
+    partial_match_columns: Tuple[str, ...] = PARTIAL_MATCH_COLUMNS,
+    indexes: Optional[Any] = None,
+) -> QueryPlan:
+    """
+    Compile filters, ranges, sorting and pagination into a QueryPlan.
+
+    Args:
+        frame: DataFrame the plan will run against (used for column types)
+        filters: Column-value pairs; list values match any of the values and
+                 {"contains": text} matches a case-insensitive substring
+                 (any other operator object raises QueryValidationError)
+        ranges: Column to {operator: value}; operators are gt/gte/lt/lte
+                plus the after/before aliases. An unknown operator, or a
+                value that does not fit the column's type, raises
+                QueryValidationError rather than dropping the bound
+        search: Free text; every whitespace-separated token must appear
+                (case-insensitively) in at least one text column
+        sort_by: Column name to sort by
+        sort_order: 'asc' or 'desc'
+        limit: Maximum number of records to return
+        offset: Number of matching records to skip
+        cursor: Keyset pagination; True (or "") for the first page, then the
+                next_cursor token of the previous response. Cursor pages are
+                ordered by (sort_by, id) and ignore offset.
+        fields: Columns to return, as a list or a comma-separated string
+        row_format: 'records' (list of objects) or 'columns' (column names
+                    plus one array per row)
+        mode: 'rows' (the matching rows), 'count' (only the exact number of
+              matches) or 'estimate' (an approximate count with bounds and
+              up to ``limit`` sample rows). Count and estimate ignore offset
+              and cursor; count also ignores sorting, limit and fields.
+        sample: Estimate mode only; False answers from column statistics
+                alone, without evaluating the row sample
+        strict: Raise on unknown filter/range columns instead of skipping them
+        partial_match_columns: Columns matched by substring instead of equality
+        indexes: Optional IndexSet used for exact selectivity estimates
+    """
+    plan = QueryPlan()
+    columns = frame.columns
+
+    if sort_by is not None and not isinstance(sort_by, str):
+        raise QueryValidationError({"error": f"Invalid sort field: {sort_by}", "valid_fields": columns.tolist()})
+    if sort_by and sort_by not in columns:
+        raise QueryValidationError({
+            "error": f"Invalid sort field: {sort_by}",
+            "valid_fields": columns.tolist()
+        })
+    if not isinstance(sort_order, str) or sort_order not in ['asc', 'desc']:
+        raise QueryValidationError({
+            "error": f"Invalid sort order: {sort_order}",
+            "valid_orders": ['asc', 'desc']
+        })
+    if row_format not in ROW_FORMATS:
+        raise QueryValidationError({
+            "error": f"Invalid format: {row_format}",
+            "valid_formats": list(ROW_FORMATS)
+        })
+    if mode not in QUERY_MODES:
+        raise QueryValidationError({
+            "error": f"Invalid mode: {mode}",
+            "valid_modes": list(QUERY_MODES)
+        })
+    if not isinstance(sample, bool):
+        raise QueryValidationError({"error": f"Invalid sample: {sample}"})
+    plan.mode = mode
+    plan.sample = sample
+    plan.row_format = row_format
+    if fields is not None:
+        if isinstance(fields, str):
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+        if not isinstance(fields, list) or not fields:
+            raise QueryValidationError({"error": f"Invalid fields: {fields}"})
+        for name in fields:
+            if not isinstance(name, str) or name not in columns:
+                raise QueryValidationError({
+                    "error": f"Invalid field: {name}",
+                    "valid_fields": columns.tolist()
+                })
+        plan.fields = tuple(dict.fromkeys(fields))
+    plan.sort_by = sort_by or None
+    plan.ascending = sort_order == 'asc'
+    plan.limit = _normalize_int('limit', limit, None) or None
+    plan.offset = _normalize_int('offset', offset, 0)
+
+    if mode != 'rows':
+        if plan.offset:
+            plan.warnings.append(f"offset is ignored in {mode} mode")
+            plan.offset = 0
+        if cursor is not None and cursor is not False:
+            plan.warnings.append(f"cursor is ignored in {mode} mode")
+            cursor = None
+        if mode == 'count':
+            # Only the number of matches is returned; equal counts share a cache entry
+            plan.sort_by, plan.ascending, plan.limit = None, True, None
+            plan.fields, plan.row_format = None, 'records'
+
+    if cursor is not None and cursor is not False:
+        plan.cursor_mode = True
+        if plan.sort_by is None:
+            if TIE_BREAK_COLUMN not in columns:
+                raise QueryValidationError({"error": "Cursor pagination requires a sort field"})
+            plan.sort_by = TIE_BREAK_COLUMN
+        if plan.offset:
+            plan.warnings.append("offset is ignored with cursor pagination")
+            plan.offset = 0
+        if isinstance(cursor, str) and cursor:
+            try:
+                plan.cursor = decode_cursor(cursor, plan.sort_by, plan.ascending)
+            except CursorError as e:
+                raise QueryValidationError({"error": f"Invalid cursor: {e}"})
+            plan.cursor_token = cursor
+        elif cursor is not True and cursor != "":
+            raise QueryValidationError({"error": f"Invalid cursor: {cursor}"})
+
+    seen = set()
+
+    def add(predicate: Predicate) -> None:
+        if predicate in seen:
+            return
+        seen.add(predicate)
+        plan.predicates.append(predicate)
+
+    for column, value in (filters or {}).items():
+        if column not in columns:
+            if strict:
+                raise QueryValidationError({"error": f"Invalid filter column: {column}"})
+            plan.warnings.append(f"Unknown filter column ignored: {column}")
+            continue
+
+        kind = column_kind(frame[column])
+        partial = kind == 'string' and column in partial_match_columns
+        if isinstance(value, dict):
+            if kind != 'string' or set(value) != {'contains'}:
+                raise QueryValidationError({
+                    "error": f"Unsupported filter operator on {column}: {value}",
+                    "expected": "a value, a list of values or {\"contains\": text} on a text column"
+                })
+            partial, value = True, value['contains']
+        raw_values = value if isinstance(value, (list, tuple, set)) else [value]
+        operands = set()
+        for raw in raw_values:
+            ok, operand = _coerce_operand(kind, raw)
+            if ok:
+                operands.add(operand)
+        if not operands:
+            # Nothing can equal a value that does not fit the column's type
+            plan.matches_nothing = True
+            continue
+
+        if partial:
+            add(Predicate(column, 'contains', tuple(sorted(operands)), kind))
+        elif len(operands) == 1:
+            add(Predicate(column, 'eq', next(iter(operands)), kind))
+        else:
+            add(Predicate(column, 'in', tuple(sorted(operands)), kind))
+
+    for column, conditions in (ranges or {}).items():
+        if column not in columns:
+            if strict:
+                raise QueryValidationError({"error": f"Invalid range column: {column}"})
+            plan.warnings.append(f"Unknown range column ignored: {column}")
+            continue
+
+        kind = column_kind(frame[column])
+        if kind == 'string':
+            plan.warnings.append(f"Range filter on non-numeric column ignored: {column}")
+            continue
+
+        # Operands are coerced once, here, and every operator on the column
+        # narrows one interval, evaluated in a single pass or index slice
+        interval = Interval()
+        for op, raw in conditions.items():
+            op = RANGE_ALIASES.get(op, op)
+            if op not in RANGE_OPERATORS:
+                raise QueryValidationError({
+                    "error": f"Unknown range operator on {column}: {op}",
+                    "valid_operators": sorted(RANGE_OPERATORS | set(RANGE_ALIASES))
+                })
+            ok, operand = _coerce_operand(kind, raw)
+            if not ok:
+                raise QueryValidationError({"error": f"Invalid {column} value for {op}: {raw}"})
+            if kind == 'datetime':
+                operand = _datetime_bound(operand, frame[column].dtype)
+            interval = interval.tighten(op, operand)
+        if interval == Interval():
+            continue
+        if interval.is_empty():
+            plan.matches_nothing = True
+            continue
+        add(Predicate(column, 'range', interval, kind))
+
+    if search:
+        tokens = tuple(sorted(set(str(search).lower().split())))
+        if tokens:
+            add(Predicate(SEARCH_COLUMN, 'search', tokens, 'string'))
+
+    plan.predicates.sort(key=lambda p: estimate_selectivity(p, len(frame), indexes))
+    return plan
+
+
+def estimate_selectivity(predicate: Predicate, row_count: int, indexes: Optional[Any] = None) -> float:
+    """Fraction of rows expected to match; exact when an index covers the predicate."""
+    index = indexes.for_predicate(predicate) if indexes is not None else None
+    if index is not None and row_count:
+        return index.count(predicate) / row_count
+    return DEFAULT_SELECTIVITY.get(predicate.op, 1.0)
+
+
+def plan_request(frame: pd.DataFrame, query_data: Dict[str, Any], indexes: Optional[Any] = None) -> QueryPlan:
+    """Build a plan straight from a /query request body."""
+    return build_plan(
+        frame,
+        indexes=indexes,
+        **normalize_request(query_data, frame.columns.tolist())
+    )
+
+
+def _interval_mask(series: pd.Series, interval: Interval) -> np.ndarray:
+    """Rows of a numeric or datetime column inside ``interval``, compared natively."""
+    values = series.to_numpy()
+    low, high = interval.low, interval.high
+    low_inclusive = interval.low_inclusive
+    if values.dtype.kind == 'M':
+        # Datetimes compare as int64 ticks of the column's unit. NaT is the
+        # smallest int64, so an open lower bound becomes "> NaT"
+        values = values.view(np.int64)
+        if low is None:
+            low, low_inclusive = np.iinfo(np.int64).min, False
+        else:
+            low = low.astype(series.dtype).astype(np.int64)
+        if high is not None:
+            high = high.astype(series.dtype).astype(np.int64)
+    elif values.dtype.kind not in 'iufb':
+        # Nullable extension dtypes: missing values become NaN, which never matches
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = None
+    if low is not None:
+        mask = values >= low if low_inclusive else values > low
+    if high is not None:
+        upper = values <= high if interval.high_inclusive else values < high
+        mask = upper if mask is None else np.logical_and(mask, upper, out=mask)
+    return np.asarray(mask, dtype=bool)
+
+
+def _predicate_mask(series: pd.Series, predicate: Predicate) -> np.ndarray:
+    """Evaluate one predicate over a column, returning a numpy bool array."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Evaluate once per category and map the result through the codes
+        # (code -1, a missing value, picks the trailing False)
+        matches = _predicate_mask(pd.Series(series.cat.categories), predicate)
+        return np.append(matches, False)[series.cat.codes.to_numpy()]
+    op, value = predicate.op, predicate.value
+    if op == 'range':
+        return _interval_mask(series, value)
+    if predicate.kind == 'string':
+        series = series.str.lower()
+        if op == 'eq':
+            result = series == value
+        elif op == 'in':
+            result = series.isin(value)
+        else:
+            result = pd.Series(False, index=series.index)
+            for needle in value:
+                result |= series.str.contains(needle, regex=False)
+    elif op == 'eq':
+        result = series == value
+    else:
+        result = series.isin(value)
+    return result.to_numpy(dtype=bool, na_value=False)
+
+
+def text_columns(frame: pd.DataFrame) -> List[str]:
+    """Columns searched by the free-text "search" predicate."""
+    return [column for column in frame.columns if is_text_column(frame[column])]
+
+
+def _search_mask(
+    frame: pd.DataFrame,
+    predicate: Predicate,
+    indexes: Optional[Any] = None,
+    positions: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Every token must be a substring of at least one text column."""
+    mask = None
+    for token in predicate.value:
+        token_mask = None
+        for column in text_columns(frame):
+            contains = Predicate(column, 'contains', (token,), 'string')
+            hits = _column_mask(frame, contains, indexes, positions)
+            token_mask = hits if token_mask is None else token_mask | hits
+        if token_mask is None:
+            size = len(frame) if positions is None else len(positions)
+            return np.zeros(size, dtype=bool)
+        mask = token_mask if mask is None else mask & token_mask
+    return mask
+
+
+def _column_mask(
+    frame: pd.DataFrame,
+    predicate: Predicate,
+    indexes: Optional[Any] = None,
+    positions: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Evaluate one predicate over all rows, or only the rows at ``positions``.
+    Text predicates compare precomputed lowercase codes when available.
+    """
+    if predicate.op == 'search':
+        return _search_mask(frame, predicate, indexes, positions)
+    if predicate.kind == 'string' and indexes is not None:
+        normalized = indexes.normalized.get(predicate.column)
+        if normalized is not None:
+            text_index = indexes.text.get(predicate.column)
+            if predicate.op == 'contains' and text_index is not None:
+                targets = text_index.matching_codes(predicate.value)
+            else:
+                targets = normalized.matching_codes(predicate.op, predicate.value)
+            return normalized.mask_codes(targets, positions)
+    series = frame[predicate.column]
+    if positions is not None:
+        series = series.iloc[positions]
+    return _predicate_mask(series, predicate)
+
+
+def _filter_positions(
+    frame: pd.DataFrame,
+    positions: np.ndarray,
+    predicates: List[Predicate],
+    indexes: Optional[Any] = None
+) -> np.ndarray:
+    """Narrow ``positions`` by evaluating predicates on those rows only."""
+    for predicate in predicates:
+        if len(positions) == 0:
+            break
+        positions = positions[_column_mask(frame, predicate, indexes, positions)]
+    return positions
+
+
+def _index_positions(
+    frame: pd.DataFrame,
+    plan: QueryPlan,
+    indexes: Any,
+    timer: Optional[Any] = None
+) -> Optional[np.ndarray]:
+    """
+    Resolve the plan through its indexes: intersect index hits, then check
+    the remaining predicates on the surviving rows. Returns None when no
+    index is selective enough to beat a full scan.
+    """
+    indexed = []
+    residual = []
+    for predicate in plan.predicates:
+        index = indexes.for_predicate(predicate)
+        if index is None:
+            residual.append(predicate)
+        else:
+            indexed.append((index.count(predicate), predicate, index))
+    if not indexed:
+        return None
+    indexed.sort(key=lambda item: item[0])
+    if indexed[0][0] * SPARSE_RATIO >= len(frame):
+        return None
+
+    candidates = None
+    for count, predicate, index in indexed:
+        if candidates is None:
+            candidates = index.lookup(predicate)
+        elif len(candidates) == 0:
+            break
+        elif count <= len(candidates) * INTERSECT_RATIO:
+            candidates = np.intersect1d(candidates, index.lookup(predicate), assume_unique=True)
+        else:
+            residual.append(predicate)
+    if timer is not None:
+        timer.count('rows_scanned', len(candidates))
+    return _filter_positions(frame, candidates, residual, indexes)
+
+
+def scan_required(frame: pd.DataFrame, plan: QueryPlan, indexes: Optional[Any] = None) -> bool:
+    """True when evaluating the plan visits every row (no index is selective enough)."""
+    if plan.matches_nothing or not plan.predicates:
+        return False
+    if indexes is None:
+        return True
+    for predicate in plan.predicates:
+        index = indexes.for_predicate(predicate)
+        if index is not None and index.count(predicate) * SPARSE_RATIO < len(frame):
+            return False
+    return True
+
+
+def evaluate_predicates(
+    frame: pd.DataFrame,
+    plan: QueryPlan,
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> np.ndarray:
+    """
+    Return the row positions in ``frame`` matching every predicate in the plan.
+    A StageTimer (see metrics.py), if given, counts the rows that were scanned.
+    """
+    row_count = len(frame)
+    if plan.matches_nothing:
+        return np.empty(0, dtype=np.intp)
+    if not plan.predicates:
+        return np.arange(row_count)
+
+    if indexes is not None:
+        positions = _index_positions(frame, plan, indexes, timer)
+        if positions is not None:
+            return positions
+
+    if timer is not None:
+        timer.count('rows_scanned', row_count)
+
+    mask = None
+    for predicate in plan.predicates:
+        if mask is None:
+            mask = _column_mask(frame, predicate, indexes)
+            if not mask.flags.writeable:
+                mask = mask.copy()
+            continue
+        remaining = np.count_nonzero(mask)
+        if remaining == 0:
+            break
+        if remaining * SPARSE_RATIO < row_count:
+            candidates = np.flatnonzero(mask)
+            keep = _column_mask(frame, predicate, indexes, candidates)
+            mask[candidates[~keep]] = False
+        else:
+            mask &= _column_mask(frame, predicate, indexes)
+    return np.flatnonzero(mask)
+
+
+def _shared_hits(
+    frame: pd.DataFrame,
+    predicate: Predicate,
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> Tuple[int, np.ndarray]:
+    """(match count, positions from an index or a full-column mask) for one predicate."""
+    index = indexes.for_predicate(predicate) if indexes is not None else None
+    if index is not None:
+        positions = index.lookup(predicate)
+        return len(positions), positions
+    if timer is not None:
+        timer.count('rows_scanned', len(frame))
+    mask = _column_mask(frame, predicate, indexes)
+    return int(np.count_nonzero(mask)), mask
+
+
+def evaluate_batch(
+    frame: pd.DataFrame,
+    plans: List[QueryPlan],
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> List[np.ndarray]:
+    """
+    evaluate_predicates for several plans over the same frame.
+
+    A predicate used by more than one plan is evaluated once, over the whole
+    frame or through its index, and every plan using it starts from the
+    intersection of its shared predicates; the rest are checked only on the
+    surviving rows. Plans sharing nothing are evaluated on their own.
+    """
+    uses = Counter(
+        predicate for plan in plans if not plan.matches_nothing for predicate in plan.predicates
+    )
+    shared: Dict[Predicate, Tuple[int, np.ndarray]] = {}
+    results = []
+    for plan in plans:
+        common = [predicate for predicate in plan.predicates if uses[predicate] > 1]
+        if plan.matches_nothing or not common:
+            results.append(evaluate_predicates(frame, plan, indexes, timer))
+            continue
+        for predicate in common:
+            if predicate not in shared:
+                shared[predicate] = _shared_hits(frame, predicate, indexes, timer)
+
+        candidates = None
+        for _, hits in sorted((shared[predicate] for predicate in common), key=lambda item: item[0]):
+            is_mask = hits.dtype == bool
+            if candidates is None:
+                candidates = np.flatnonzero(hits) if is_mask else hits
+            elif len(candidates) == 0:
+                break
+            elif is_mask:
+                candidates = candidates[hits[candidates]]
+            else:
+                candidates = np.intersect1d(candidates, hits, assume_unique=True)
+        residual = [predicate for predicate in plan.predicates if uses[predicate] <= 1]
+        results.append(_filter_positions(frame, candidates, residual, indexes))
+    return results
+
+
+def page_positions(
+    frame: pd.DataFrame,
+    plan: QueryPlan,
+    positions: Optional[np.ndarray],
+    indexes: Optional[Any] = None
+) -> np.ndarray:
+    """Order and paginate matching positions (None: every row) as the plan asks."""
+    try:
+        return order_page(
+            frame, positions, plan.sort_by, plan.ascending,
+            plan.offset, plan.limit, plan.cursor, indexes
+        )
+    except (TypeError, ValueError) as e:
+        raise QueryValidationError({"error": f"Invalid cursor: {e}"})
+
+
+def select_positions(
+    frame: pd.DataFrame,
+    plan: QueryPlan,
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> Tuple[np.ndarray, int]:
+    """
+    Return the ordered, paginated row positions and the total match count.
+    Sorting with a limit only orders the rows needed (see pagination.py).
+    """
+    with timed(timer, 'filter'):
+        if plan.predicates or plan.matches_nothing:
+            positions = evaluate_predicates(frame, plan, indexes, timer)
+            total_matches = len(positions)
+        else:
+            positions, total_matches = None, len(frame)
+    with timed(timer, 'sort'):
+        page = page_positions(frame, plan, positions, indexes)
+    return page, total_matches
+
+
+def _intersect_postings(smaller: np.ndarray, larger: np.ndarray) -> np.ndarray:
+    """Sorted positions in both posting lists, by binary search of the larger one."""
+    slots = np.searchsorted(larger, smaller)
+    found = slots < len(larger)
+    found[found] = larger[slots[found]] == smaller[found]
+    return smaller[found]
+
+
+def count_matches(
+    frame: pd.DataFrame,
+    plan: QueryPlan,
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> int:
+    """
+    The number of rows matching the plan (the total_matches of
+    select_positions), without ordering or copying any rows. A single
+    indexed predicate is answered by its index count. When indexes cover
+    every predicate and the most selective one is sparse, posting lists are
+    intersected smallest first, and a list much larger than the surviving
+    candidates is replaced by a check of the candidates' lowercase codes,
+    so no row data is read. Otherwise the plan is evaluated as usual.
+    """
+    with timed(timer, 'filter'):
+        if plan.matches_nothing:
+            return 0
+        if not plan.predicates:
+            return len(frame)
+        indexed = []
+        for predicate in plan.predicates:
+            index = indexes.for_predicate(predicate) if indexes is not None else None
+            if index is None:
+                return len(evaluate_predicates(frame, plan, indexes, timer))
+            indexed.append((index.count(predicate), predicate, index))
+        if len(indexed) == 1:
+            return indexed[0][0]
+        indexed.sort(key=lambda item: item[0])
+        if indexed[0][0] * SPARSE_RATIO >= len(frame):
+            return len(evaluate_predicates(frame, plan, indexes, timer))
+
+        candidates = indexed[0][2].lookup(indexed[0][1])
+        for count, predicate, index in indexed[1:]:
+            if len(candidates) == 0:
+                break
+            if count > len(candidates) * INTERSECT_RATIO and predicate.column in indexes.normalized:
+                candidates = candidates[_column_mask(frame, predicate, indexes, candidates)]
+            else:
+                candidates = _intersect_postings(candidates, index.lookup(predicate))
+        return len(candidates)
+
+
+def plan_next_cursor(frame: pd.DataFrame, plan: QueryPlan, page: np.ndarray) -> Optional[str]:
+    """Cursor for the page after ``page``, or None when there are no more rows."""
+    if not plan.cursor_mode or plan.limit is None or len(page) < plan.limit:
+        return None
+    return next_cursor(frame, page, plan.sort_by, plan.ascending)
+
+
+def execute_plan(
+    frame: pd.DataFrame,
+    plan: QueryPlan,
+    indexes: Optional[Any] = None,
+    timer: Optional[Any] = None
+) -> QueryResult:
+    """Run a plan against ``frame`` without copying anything but the result rows."""
+    positions, total_matches = select_positions(frame, plan, indexes, timer)
+    with timed(timer, 'paginate'):
+        return QueryResult(
+            frame=plan.project(frame).take(positions),
+            total_matches=total_matches,
+            next_cursor=plan_next_cursor(frame, plan, positions)
+        )
+
+
+def explain_plan(frame: pd.DataFrame, plan: QueryPlan, indexes: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Describe how a plan is evaluated: predicates in evaluation order with the
+    index serving each one, estimated and actual selectivity, and whether
+    rows are found through index lookups or a full scan.
+    """
+    row_count = len(frame)
+    predicates = []
+    smallest_indexed = None
+    for predicate in plan.predicates:
+        index = indexes.for_predicate(predicate) if indexes is not None else None
+        if index is not None:
+            matches = index.count(predicate)
+            smallest_indexed = matches if smallest_indexed is None else min(smallest_indexed, matches)
+        else:
+            matches = int(np.count_nonzero(_column_mask(frame, predicate, indexes)))
+        predicates.append({
+            "predicate": predicate.describe(),
+            "index": type(index).__name__ if index is not None else None,
+            "estimated_selectivity": estimate_selectivity(predicate, row_count, indexes),
+            "matches": matches,
+            "selectivity": matches / row_count if row_count else 0.0,
+        })
+
+    if plan.matches_nothing:
+        strategy = 'matches_nothing'
+    elif not plan.predicates:
+        strategy = 'all_rows'
+    elif smallest_indexed is not None and smallest_indexed * SPARSE_RATIO < row_count:
+        strategy = 'index_intersection'
+    else:
+        strategy = 'scan'
+    return {
+        "strategy": strategy,
+        "mode": plan.mode,
+        "rows": row_count,
+        "predicates": predicates,
+        "sort": {"field": plan.sort_by, "order": 'asc' if plan.ascending else 'desc'},
+        "limit": plan.limit,
+        "offset": plan.offset,
+        "cursor_mode": plan.cursor_mode,
+        "warnings": plan.warnings,
+    }
+
+
+def result_records(result: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert result rows to JSON-friendly records (dates as YYYY-MM-DD, missing as None)."""
+    result = result.copy(deep=False)
+    for column in result.columns:
+        if pd.api.types.is_datetime64_any_dtype(result[column]):
+            result[column] = result[column].dt.strftime('%Y-%m-%d')
+    if result.isna().to_numpy().any():
+        result = result.astype(object).where(result.notna(), None)
+    return result.to_dict(orient='records')
@@ -0,0 +1,103 @@
+# mcp-server-python/result_cache.py
+"""
+In-process cache of serialized /query responses.
+
+Entries are keyed on the canonical form of a QueryPlan, so requests that
+differ only in key order or sort syntax share one entry. The cache is
+bounded by entry count and total bytes, evicts least-recently-used entries
+first and expires entries after a TTL. It must be cleared with the new
+version whenever a dataset is published; results computed for an older
+version and stored after that are dropped.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL cache of response bodies (bytes)."""
+
+    def __init__(self, max_bytes: int, max_entries: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self._version: Optional[int] = None
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            body, expires_at = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Hashable, body: bytes, version: Optional[int] = None) -> bool:
+        """
+        Store ``body``; returns False if it is too large to cache at all or
+        was computed for a dataset ``version`` older than the live one.
+        """
+        if len(body) > self.max_bytes or self.max_entries <= 0:
+            return False
+        with self._lock:
+            if version is not None and self._version is not None and version < self._version:
+                self.stale_puts += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, time.monotonic() + self.ttl_seconds)
+            self._size += len(body)
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def clear(self, version: Optional[int] = None) -> None:
+        """Drop every entry; ``version`` is the dataset version now live."""
+        with self._lock:
+            if version is not None:
+                self._version = version
+            self._entries.clear()
+            self._size = 0
+            self.invalidations += 1
+
+    def _remove(self, key: Hashable) -> None:
+        body, _ = self._entries.pop(key)
+        self._size -= len(body)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
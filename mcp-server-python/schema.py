@@ -0,0 +1,180 @@
+# mcp-server-python/schema.py
+"""
+Compact in-memory representation of the loaded data.
+
+compact_frame() stores low-cardinality text columns as categoricals and
+downcasts integer columns to the smallest width that holds every value.
+Float columns stay float64: sums and means over float32 lose precision and
+would differ from the same aggregate computed in chunks or in parallel. LowercaseCodes precomputes, once per text column, an integer code
+per row for the lowercased value, so case-insensitive equality, membership
+and substring matches compare small integers instead of strings.
+"""
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORICAL_MAX_CARDINALITY = 0.5
+
+
+def is_text_column(series: pd.Series) -> bool:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return True
+    return not (
+        pd.api.types.is_numeric_dtype(series)
+        or pd.api.types.is_bool_dtype(series)
+        or pd.api.types.is_datetime64_any_dtype(series)
+    )
+
+
+def _smallest_int_dtype(max_value: int) -> np.dtype:
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _compact_column(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if is_text_column(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        if series.nunique() <= CATEGORICAL_MAX_CARDINALITY * len(series):
+            return series.astype('category')
+    return series
+
+
+def compact_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Return ``frame`` with categorical text columns and downcast integers."""
+    return pd.DataFrame(
+        {column: _compact_column(frame[column]) for column in frame.columns},
+        copy=False
+    )
+
+
+def _extend_categorical(old: pd.Series, new: pd.Series) -> pd.Series:
+    """Append ``new`` to a categorical column, keeping its existing codes."""
+    categories = old.cat.categories
+    values = pd.Index(new.astype(object))
+    unseen = values[(categories.get_indexer(values) < 0) & values.notna()].unique()
+    if len(unseen):
+        categories = categories.append(unseen)
+    codes = np.concatenate([old.cat.codes.to_numpy(), categories.get_indexer(values)])
+    return pd.Series(pd.Categorical.from_codes(codes, categories, validate=False), name=old.name)
+
+
+def extend_frame(frame: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return ``frame`` with ``tail``'s rows appended, in the same compact
+    representation. ``frame`` itself is left untouched.
+    """
+    columns = {}
+    for column in frame.columns:
+        old, new = frame[column], tail[column]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            columns[column] = _extend_categorical(old, new)
+        else:
+            combined = pd.concat([old, new], ignore_index=True)
+            columns[column] = _compact_column(combined) if not is_text_column(combined) else combined
+    return pd.DataFrame(columns, copy=False)
+
+
+def memory_by_column(frame: pd.DataFrame) -> Dict[str, int]:
+    """Bytes held by each column, including string payloads."""
+    return {
+        column: int(size)
+        for column, size in frame.memory_usage(index=False, deep=True).items()
+    }
+
+
+def memory_report(before: Optional[Dict[str, int]], after: Dict[str, int]) -> Dict[str, Any]:
+    """Per-column and total memory before/after compaction (before may be unknown)."""
+    columns = {
+        column: {"before_bytes": before.get(column) if before else None, "after_bytes": size}
+        for column, size in after.items()
+    }
+    return {
+        "columns": columns,
+        "total_before_bytes": sum(before.values()) if before else None,
+        "total_after_bytes": sum(after.values()),
+    }
+
+
+class LowercaseCodes:
+    """Per-row integer codes for a text column's lowercased values."""
+
+    def __init__(self, codes: np.ndarray, vocabulary: np.ndarray):
+        self.codes = codes
+        self.vocabulary = vocabulary
+        self.lookup = {value: code for code, value in enumerate(vocabulary)}
+        self._strings: Optional[pd.Series] = None  # Vocabulary as a string Series, built on first scan
+
+    @classmethod
+    def build(cls, series: pd.Series) -> 'LowercaseCodes':
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Lowercase the categories only, then remap the existing codes
+            category_codes, vocabulary = pd.factorize(series.cat.categories.str.lower())
+            remap = np.append(category_codes, -1)
+            codes = remap[series.cat.codes.to_numpy()]
+        else:
+            codes, vocabulary = pd.factorize(series.str.lower())
+        codes = codes.astype(_smallest_int_dtype(len(vocabulary)), copy=False)
+        return cls(codes, np.asarray(vocabulary, dtype=object))
+
+    def matching_codes(self, op: str, value: Any) -> np.ndarray:
+        """Codes whose lowercased value satisfies eq/in/contains."""
+        if op == 'eq':
+            values = [value]
+        elif op == 'in':
+            values = value
+        else:
+            return self.containing(value)
+        return np.array(
+            [self.lookup[v] for v in values if v in self.lookup],
+            dtype=self.codes.dtype
+        )
+
+    def containing(self, needles: Tuple[str, ...]) -> np.ndarray:
+        """Codes whose value contains any of ``needles``, by a vectorised scan of the vocabulary."""
+        if self._strings is None:
+            self._strings = pd.Series(self.vocabulary, dtype="str")
+        found = np.zeros(len(self.vocabulary), dtype=bool)
+        for needle in needles:
+            found |= self._strings.str.contains(needle, regex=False).to_numpy(dtype=bool, na_value=False)
+        return np.flatnonzero(found).astype(self.codes.dtype)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the codes, the vocabulary strings and the value lookup."""
+        return (
+            sys.getsizeof(self.codes) + sys.getsizeof(self.vocabulary) + sys.getsizeof(self.lookup)
+            + sum(sys.getsizeof(value) for value in self.vocabulary)
+        )
+
+    def extend(self, series: pd.Series) -> 'LowercaseCodes':
+        """Codes for this column with ``series`` appended; new values get new codes."""
+        local, uniques = pd.factorize(series.astype(object).str.lower())
+        vocabulary = list(self.vocabulary)
+        remap = np.empty(len(uniques) + 1, dtype=np.int64)
+        remap[-1] = -1
+        for i, value in enumerate(uniques):
+            code = self.lookup.get(value)
+            if code is None:
+                code = len(vocabulary)
+                vocabulary.append(value)
+            remap[i] = code
+        dtype = _smallest_int_dtype(len(vocabulary))
+        codes = np.concatenate([self.codes.astype(dtype, copy=False), remap[local].astype(dtype)])
+        return LowercaseCodes(codes, np.asarray(vocabulary, dtype=object))
+
+    def mask(self, op: str, value: Any, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.mask_codes(self.matching_codes(op, value), positions)
+
+    def mask_codes(self, targets: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows (all, or those at ``positions``) whose code is one of ``targets``."""
+        codes = self.codes if positions is None else self.codes[positions]
+        if len(targets) == 1:
+            return codes == targets[0]
+        return np.isin(codes, targets)
@@ -0,0 +1,132 @@
+# mcp-server-python/serialization.py
+"""
+Response serialization helpers.
+
+render_json produces the same bytes JSONResponse would for a payload, so
+bodies can be cached and replayed. iter_ndjson streams result rows as
+newline-delimited JSON in fixed-size batches, keeping memory bounded by
+the batch size rather than the size of the result.
+
+Result rows are encoded column by column (encode_rows) rather than through
+one dict per row: each column becomes a list of JSON fragments, with the
+distinct values of dates, categoricals and text encoded once and spread
+by their codes, and numbers rendered with repr. The fragments are then
+joined into rows by a single %-template. The output is byte-for-byte what
+render_json(result_records(frame)) would produce.
+"""
+import json
+import uuid
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+
+# Rows materialized per chunk when streaming
+STREAM_BATCH_SIZE = 1000
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class RawJSON:
+    """Already-encoded JSON that render_json embeds as is."""
+
+    def __init__(self, encoded: bytes):
+        self.encoded = encoded
+
+
+def _dumps(value: Any, default=str) -> str:
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=default)
+
+
+def render_json(payload: Any) -> bytes:
+    """
+    Serialize a response payload the same way JSONResponse does. RawJSON
+    values are spliced in without being decoded.
+    """
+    raw: List[RawJSON] = []
+    token = uuid.uuid4().hex
+
+    def default(value: Any) -> Any:
+        if isinstance(value, RawJSON):
+            raw.append(value)
+            return f"{token}:{len(raw) - 1}"
+        return str(value)
+
+    body = _dumps(payload, default).encode("utf-8")
+    for i, value in enumerate(raw):
+        body = body.replace(f'"{token}:{i}"'.encode("ascii"), value.encoded, 1)
+    return body
+
+
+def with_metadata(body: bytes, metadata: Dict[str, Any]) -> bytes:
+    """
+    Add a "metadata" member to a rendered JSON object without re-rendering it,
+    so cached bodies can carry per-request timings.
+    """
+    return body[:-1] + b',"metadata":' + render_json(metadata) + b"}"
+
+
+def join_results(bodies: List[bytes]) -> bytes:
+    """Combine rendered /query bodies into one /query/batch body, in order."""
+    return b'{"success":true,"results":[' + b",".join(bodies) + b"]}"
+
+
+def _encode_distinct(codes: np.ndarray, uniques: List[Any]) -> List[str]:
+    """JSON for each row from its code into ``uniques`` (-1: missing)."""
+    encoded = np.array([_dumps(value) for value in uniques] + ["null"], dtype=object)
+    return encoded[codes].tolist()
+
+
+def _encode_column(series: pd.Series) -> List[str]:
+    """One JSON fragment per value, matching result_records + render_json."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return _encode_distinct(series.cat.codes.to_numpy(), series.cat.categories.tolist())
+    if pd.api.types.is_datetime64_any_dtype(series):
+        codes, uniques = pd.factorize(series)
+        return _encode_distinct(codes, [value.strftime('%Y-%m-%d') for value in uniques])
+    if pd.api.types.is_bool_dtype(series) and series.dtype != object:
+        return ["true" if value else "false" for value in series.to_numpy(dtype=bool)]
+    if pd.api.types.is_integer_dtype(series) and not series.hasnans:
+        return list(map(str, series.to_numpy().tolist()))
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        encoded = list(map(float.__repr__, values.tolist()))
+        for i in np.flatnonzero(~np.isfinite(values)):
+            encoded[i] = "null" if np.isnan(values[i]) else _dumps(float(values[i]))
+        return encoded
+    codes, uniques = pd.factorize(series)
+    return _encode_distinct(codes, [value.item() if isinstance(value, np.generic) else value for value in uniques])
+
+
+def _row_strings(frame: pd.DataFrame, row_format: str) -> List[str]:
+    columns = [_encode_column(frame[column]) for column in frame.columns]
+    if row_format == 'columns':
+        template = "[" + ",".join(["%s"] * len(columns)) + "]"
+    else:
+        keys = [_dumps(str(column)).replace("%", "%%") for column in frame.columns]
+        template = "{" + ",".join(f"{key}:%s" for key in keys) + "}"
+    if not columns:
+        return [template] * len(frame)
+    return list(map(template.__mod__, zip(*columns)))
+
+
+def encode_rows(frame: pd.DataFrame, row_format: str = 'records') -> RawJSON:
+    """
+    The rows of ``frame`` as JSON: a list of objects ('records'), or
+    {"columns": [...], "rows": [[...], ...]} ('columns').
+    """
+    rows = "[" + ",".join(_row_strings(frame, row_format)) + "]"
+    if row_format == 'columns':
+        rows = '{"columns":' + _dumps([str(column) for column in frame.columns]) + ',"rows":' + rows + "}"
+    return RawJSON(rows.encode("utf-8"))
+
+
+def iter_ndjson(
+    frame: pd.DataFrame,
+    positions: np.ndarray,
+    batch_size: int = STREAM_BATCH_SIZE
+) -> Iterator[bytes]:
+    """Yield the rows at ``positions`` as NDJSON, one chunk per batch."""
+    for start in range(0, len(positions), batch_size):
+        batch = frame.take(positions[start:start + batch_size])
+        yield ("\n".join(_row_strings(batch, 'records')) + "\n").encode("utf-8")
@@ -0,0 +1,320 @@
+# mcp-server-python/shared_dataset.py
+"""
+One copy of the dataset and its indexes shared by every uvicorn worker.
+
+With ``uvicorn main:app --workers N`` each worker would otherwise parse the
+CSV, build its indexes and hold all of it privately, so memory grows with
+N. In shared mode one worker, the loader, builds the typed columns and the
+index arrays and writes them as .npy files to shared memory (/dev/shm);
+every worker, the loader included, memory-maps them read-only. Pages are
+shared between processes and nothing is copied: text columns stay
+dictionary-encoded (categoricals over the mapped codes), and posting lists,
+sorted runs and trigram lists are views into the mapped arrays. Only the
+dictionaries and the per-gram lookup tables are built per worker.
+
+Layout, per data file:
+
+    <SHARED_ROOT>/mcp-dataset-<key>/loader.lock     held by the loader
+    <SHARED_ROOT>/mcp-dataset-<key>/current.json    pointer to the live version
+    <SHARED_ROOT>/mcp-dataset-<key>/v-<n>/manifest.json
+    <SHARED_ROOT>/mcp-dataset-<key>/v-<n>/columns/<n>.npy, <array>.npy
+
+The loader is whichever worker holds an exclusive lock on loader.lock; if
+it exits, the lock is released and the next worker to try takes over. Only
+the loader publishes: a version is written to a staging directory, renamed
+into place, and current.json is replaced atomically. Other workers poll
+current.json and attach each new version as it appears (see
+SharedDatasetWatcher); requests already running keep the version they
+started with, whose mapping stays valid even after its files are removed.
+"""
+import base64
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_watcher import FileState
+from indexes import HashIndex, IndexSet, SortedIndex, TrigramIndex
+from log_config import get_logger
+from parallel_scan import PARTITION_ROOT
+from schema import LowercaseCodes
+from snapshot_store import POINTER_FILE, MANIFEST_FILE, read_columns, read_json, write_columns, write_json_atomic
+
+# Where shared versions are written; tmpfs keeps them in memory
+SHARED_ROOT = PARTITION_ROOT
+
+SHARED_FORMAT_VERSION = 2
+LOCK_FILE = "loader.lock"
+
+# Old versions kept (besides the live one) for workers about to attach them
+KEEP_OLD_VERSIONS = 1
+
+logger = get_logger('shared')
+
+
+@dataclass(frozen=True)
+class SharedVersion:
+    """One attached version: mapped columns and indexes plus what was recorded with them."""
+    name: str
+    frame: pd.DataFrame
+    indexes: IndexSet
+    memory: Optional[Dict[str, Any]]
+    state: Optional[FileState]
+
+
+def _save(directory: str, name: str, values: np.ndarray) -> str:
+    np.save(os.path.join(directory, f"{name}.npy"), values, allow_pickle=False)
+    return name
+
+
+def _load(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+
+def write_indexes(directory: str, indexes: IndexSet) -> Dict[str, Any]:
+    """Write the arrays of ``indexes`` as .npy files; returns the spec to rebuild it."""
+    sorted_specs = {}
+    for column, index in indexes.indexes.items():
+        if isinstance(index, SortedIndex):
+            position = len(sorted_specs)
+            sorted_specs[column] = {
+                "sorted_values": _save(directory, f"sorted-{position}-values", index.sorted_values),
+                "order": _save(directory, f"sorted-{position}-order", index.order),
+                "missing": _save(directory, f"sorted-{position}-missing", index.missing),
+            }
+
+    text_specs = {}
+    for position, (column, index) in enumerate(indexes.text.items()):
+        normalized = indexes.normalized[column]
+        text_specs[column] = {
+            "vocabulary": [str(value) for value in normalized.vocabulary],
+            "codes": _save(directory, f"text-{position}-codes", normalized.codes),
+            "order": _save(directory, f"text-{position}-order", index.order),
+            "bounds": _save(directory, f"text-{position}-bounds", index.bounds),
+            "grams": None,
+            "hash": isinstance(indexes.indexes.get(column), HashIndex),
+        }
+        if index.grams is not None:
+            # Every gram's code list back to back; gram i owns codes[offsets[i]:offsets[i + 1]]
+            grams = sorted(index.grams)
+            lists = [index.grams[gram] for gram in grams]
+            offsets = np.cumsum([0] + [len(codes) for codes in lists])
+            codes = np.concatenate(lists) if lists else np.empty(0, dtype=normalized.codes.dtype)
+            text_specs[column].update(
+                grams=grams,
+                gram_codes=_save(directory, f"text-{position}-gram-codes", codes),
+                gram_offsets=_save(directory, f"text-{position}-gram-offsets", offsets),
+            )
+    return {"row_count": indexes.row_count, "sorted": sorted_specs, "text": text_specs}
+
+
+def read_indexes(directory: str, spec: Dict[str, Any]) -> IndexSet:
+    """Rebuild an IndexSet written by write_indexes over memory-mapped arrays."""
+    built: Dict[str, Any] = {}
+    normalized: Dict[str, LowercaseCodes] = {}
+    text: Dict[str, TrigramIndex] = {}
+    for column, arrays in spec["sorted"].items():
+        built[column] = SortedIndex(
+            column,
+            _load(directory, arrays["sorted_values"]),
+            _load(directory, arrays["order"]),
+            _load(directory, arrays["missing"])
+        )
+    for column, arrays in spec["text"].items():
+        codes = normalized[column] = LowercaseCodes(
+            _load(directory, arrays["codes"]), np.asarray(arrays["vocabulary"], dtype=object)
+        )
+        order, bounds = _load(directory, arrays["order"]), _load(directory, arrays["bounds"])
+        grams = None
+        if arrays["grams"] is not None:
+            gram_codes, offsets = _load(directory, arrays["gram_codes"]), _load(directory, arrays["gram_offsets"])
+            grams = {
+                gram: gram_codes[offsets[i]:offsets[i + 1]]
+                for i, gram in enumerate(arrays["grams"])
+            }
+        text[column] = TrigramIndex(column, codes, grams, order, bounds)
+        if arrays["hash"]:
+            built[column] = HashIndex.build(column, codes, order, bounds)
+    return IndexSet(built, spec["row_count"], normalized, text)
+
+
+def _encode_state(state: Optional[FileState]) -> Optional[Dict[str, Any]]:
+    if state is None:
+        return None
+    return {
+        "size": state.size,
+        "mtime_ns": state.mtime_ns,
+        "consumed": state.consumed,
+        "anchor": base64.b64encode(state.anchor).decode("ascii"),
+    }
+
+
+def _decode_state(payload: Optional[Dict[str, Any]]) -> Optional[FileState]:
+    if not payload:
+        return None
+    return FileState(payload["size"], payload["mtime_ns"], payload["consumed"], base64.b64decode(payload["anchor"]))
+
+
+class SharedDataset:
+    """The shared versions of one data file."""
+
+    def __init__(self, csv_path: str, root: Optional[str] = None):
+        key = hashlib.sha1(os.path.abspath(csv_path).encode()).hexdigest()[:16]
+        self.directory = os.path.join(root or SHARED_ROOT, f"mcp-dataset-{key}")
+        self._lock_handle = None
+
+    @property
+    def leading(self) -> bool:
+        """True when this process is the loader."""
+        return self._lock_handle is not None
+
+    def try_lead(self) -> bool:
+        """Become the loader unless another process already is."""
+        if self._lock_handle is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        handle = open(os.path.join(self.directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        # Held until this process exits
+        self._lock_handle = handle
+        for entry in os.listdir(self.directory):
+            if entry.startswith(".staging-"):
+                # Left behind by a loader that died while publishing
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        return True
+
+    def live_version(self) -> Optional[str]:
+        pointer = read_json(os.path.join(self.directory, POINTER_FILE))
+        return pointer.get("version") if pointer else None
+
+    def publish(
+        self,
+        frame: pd.DataFrame,
+        indexes: IndexSet,
+        memory: Optional[Dict[str, Any]] = None,
+        state: Optional[FileState] = None
+    ) -> str:
+        """Write ``frame`` and ``indexes`` as the new live version (loader only); returns its name."""
+        if not self.leading:
+            raise RuntimeError("Only the loader process publishes shared versions")
+        live = self.live_version()
+        number = int(live.split("-")[1]) + 1 if live else 1
+        name = f"v-{number:06d}"
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+        try:
+            os.chmod(staging, 0o755)
+            os.mkdir(os.path.join(staging, "columns"))
+            write_json_atomic(os.path.join(staging, MANIFEST_FILE), {
+                "format": SHARED_FORMAT_VERSION,
+                "version": name,
+                "rows": len(frame),
+                "columns": write_columns(os.path.join(staging, "columns"), frame),
+                "indexes": write_indexes(staging, indexes),
+                "memory": memory,
+                "source": _encode_state(state),
+            })
+            os.rename(staging, os.path.join(self.directory, name))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        write_json_atomic(os.path.join(self.directory, POINTER_FILE), {"version": name})
+        self._prune(keep=name)
+        logger.info("Published shared dataset version %s", name, extra={"rows": len(frame)})
+        return name
+
+    def attach(self, name: Optional[str] = None) -> Optional[SharedVersion]:
+        """
+        Memory-map version ``name`` (default: the live one). Returns None when
+        there is none yet or it was written in another format.
+        """
+        name = name or self.live_version()
+        if name is None:
+            return None
+        version_dir = os.path.join(self.directory, name)
+        manifest = read_json(os.path.join(version_dir, MANIFEST_FILE))
+        if not manifest or manifest.get("format") != SHARED_FORMAT_VERSION:
+            return None
+        frame = read_columns(os.path.join(version_dir, "columns"), manifest["columns"], dictionary_as_categorical=True)
+        indexes = read_indexes(version_dir, manifest["indexes"])
+        return SharedVersion(name, frame, indexes, manifest.get("memory"), _decode_state(manifest.get("source")))
+
+    def _prune(self, keep: str) -> None:
+        versions = sorted(
+            (entry for entry in os.listdir(self.directory) if entry.startswith("v-") and entry != keep),
+            reverse=True
+        )
+        for entry in versions[KEEP_OLD_VERSIONS:]:
+            # Workers that mapped it keep their pages until they unmap them
+            shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "live_version": self.live_version(),
+            "loader": self.leading,
+        }
+
+
+class SharedDatasetWatcher:
+    """
+    Polls for new shared versions and for the chance to become the loader.
+
+    ``on_version`` is called with the name of each new live version while
+    this process follows; ``on_lead`` once, when it takes over as loader
+    (from then on it publishes versions instead of attaching them).
+    """
+
+    def __init__(
+        self,
+        store: SharedDataset,
+        version: Optional[str],
+        on_version: Callable[[str], None],
+        on_lead: Callable[[], None],
+        interval_seconds: float = 2.0
+    ):
+        self.store = store
+        self.version = version
+        self.on_version = on_version
+        self.on_lead = on_lead
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='shared-dataset-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Shared dataset check failed")
+
+    def check(self) -> None:
+        if self.store.leading:
+            return
+        if self.store.try_lead():
+            logger.info("Took over as the shared dataset loader")
+            self.on_lead()
+            return
+        version = self.store.live_version()
+        if version is not None and version != self.version:
+            self.on_version(version)
+            self.version = version
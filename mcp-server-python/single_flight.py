@@ -0,0 +1,68 @@
+# mcp-server-python/single_flight.py
+"""
+Request coalescing for identical concurrent queries.
+
+During bursts many clients send the same query at the same moment; the
+result cache only helps once the first of them has finished. SingleFlight
+lets the first request for a key start the work and makes every identical
+request that arrives while it runs await that same computation instead of
+queueing its own.
+
+The work runs as its own task, so a caller that goes away (or times out)
+does not cancel it for the others still waiting. Failures are shared too:
+every waiter receives the exception the work raised.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    def _finished(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as seen even if every waiter has gone away
+            task.exception()
+
+    async def run(
+        self,
+        key: Hashable,
+        work: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Await ``work()``, or the run of it already in flight for ``key``.
+
+        Returns (result, coalesced); coalesced is True when this call joined
+        a computation started by another request. ``timeout`` bounds how
+        long a joining caller waits; the caller that starts the work relies
+        on the work's own timeout.
+        """
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        with self._lock:
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.started += 1
+        result = await asyncio.wait_for(asyncio.shield(task), timeout if coalesced else None)
+        return result, coalesced
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "started": self.started,
+                "coalesced": self.coalesced,
+            }
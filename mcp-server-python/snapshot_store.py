@@ -0,0 +1,242 @@
+# mcp-server-python/snapshot_store.py
+"""
+Typed columnar snapshots of the CSV data file.
+
+After the CSV has been parsed once, every column is written as a .npy file
+next to a JSON manifest recording the CSV's size, mtime and SHA-256. Later
+startups memory-map those files instead of re-parsing the CSV: numeric and
+date columns are used in place (zero copy, shared page cache across worker
+processes), categorical columns map their codes in place, and other text
+columns are stored dictionary-encoded.
+
+Layout, relative to the CSV's directory:
+
+    .snapshots/<csv name>/current.json      pointer to the live version
+    .snapshots/<csv name>/v-<format>-<sha>/manifest.json
+    .snapshots/<csv name>/v-<format>-<sha>/<n>.npy   one file per column
+
+Versions are written to a temporary directory and renamed into place, and
+current.json is replaced atomically, so concurrent workers never observe a
+half-written snapshot.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FORMAT_VERSION = 3
+SNAPSHOT_DIR_NAME = ".snapshots"
+POINTER_FILE = "current.json"
+MANIFEST_FILE = "manifest.json"
+
+# Old snapshot versions kept on disk (besides the live one) for workers
+# that may still have them mapped
+KEEP_OLD_VERSIONS = 1
+
+
+def snapshot_root(csv_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, SNAPSHOT_DIR_NAME, name)
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(csv_path: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+    stat = os.stat(csv_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256 or file_sha256(csv_path),
+    }
+
+
+def write_json_atomic(path: str, payload: Dict[str, Any]) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as handle:
+        json.dump(payload, handle)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def current_version_dir(csv_path: str) -> Optional[str]:
+    """Directory of the live snapshot version, if any."""
+    root = snapshot_root(csv_path)
+    pointer = read_json(os.path.join(root, POINTER_FILE))
+    if not pointer or "version" not in pointer:
+        return None
+    path = os.path.join(root, pointer["version"])
+    return path if os.path.isdir(path) else None
+
+
+def _is_fresh(csv_path: str, version_dir: str, manifest: Dict[str, Any]) -> bool:
+    """
+    Fresh if size and mtime match, or if the content hash still matches (the
+    manifest then records the new mtime so the hash is not recomputed).
+    """
+    source = manifest.get("source", {})
+    stat = os.stat(csv_path)
+    if stat.st_size != source.get("size"):
+        return False
+    if stat.st_mtime_ns == source.get("mtime_ns"):
+        return True
+    sha256 = file_sha256(csv_path)
+    if sha256 != source.get("sha256"):
+        return False
+    manifest["source"] = source_fingerprint(csv_path, sha256)
+    write_json_atomic(os.path.join(version_dir, MANIFEST_FILE), manifest)
+    return True
+
+
+def load_snapshot(csv_path: str) -> Optional[pd.DataFrame]:
+    """
+    Memory-map the live snapshot for ``csv_path``.
+
+    Returns None when there is no snapshot, it was written by another format
+    version, or the CSV has changed since it was taken.
+    """
+    version_dir = current_version_dir(csv_path)
+    if version_dir is None:
+        return None
+    manifest = read_json(os.path.join(version_dir, MANIFEST_FILE))
+    if not manifest or manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    if not _is_fresh(csv_path, version_dir, manifest):
+        return None
+
+    return read_columns(version_dir, manifest["columns"])
+
+
+def read_columns(directory: str, specs: List[Dict[str, Any]], dictionary_as_categorical: bool = False) -> pd.DataFrame:
+    """
+    Memory-map columns written by write_columns. Dictionary-encoded text is
+    decoded to its original dtype, or kept as a categorical over the mapped
+    codes when ``dictionary_as_categorical`` is set (no per-row strings).
+    """
+    columns = {}
+    for spec in specs:
+        values = np.load(os.path.join(directory, spec["file"]), mmap_mode="r")
+        if spec["encoding"] == "categorical":
+            categories = pd.Index(pd.array(spec["dictionary"], dtype=spec["dtype"]))
+            columns[spec["name"]] = pd.Categorical.from_codes(
+                values,
+                dtype=pd.CategoricalDtype(categories, ordered=spec.get("ordered", False)),
+                validate=False
+            )
+        elif spec["encoding"] == "dictionary":
+            uniques = pd.array(spec["dictionary"], dtype=spec["dtype"])
+            categorical = pd.Categorical.from_codes(values, categories=pd.Index(uniques), validate=False)
+            columns[spec["name"]] = pd.Series(
+                categorical if dictionary_as_categorical else categorical.astype(spec["dtype"]),
+                name=spec["name"]
+            )
+        else:
+            columns[spec["name"]] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def encode_column(series: pd.Series):
+    """Return (encoding, array, extra manifest fields) for one column."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        return "categorical", series.cat.codes.to_numpy(), {
+            "dictionary": [str(value) for value in categories],
+            "dtype": str(categories.dtype),
+            "ordered": bool(series.cat.ordered),
+        }
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy()
+        if values.dtype != object:
+            return "plain", values, {}
+    codes, uniques = pd.factorize(series)
+    return "dictionary", codes.astype(np.int32), {
+        "dictionary": [str(value) for value in uniques],
+        "dtype": str(series.dtype),
+    }
+
+
+def write_columns(directory: str, frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Write each column of ``frame`` as a .npy file; returns the column specs."""
+    specs = []
+    for position, column in enumerate(frame.columns):
+        encoding, values, extra = encode_column(frame[column])
+        file_name = f"{position}.npy"
+        np.save(os.path.join(directory, file_name), values, allow_pickle=False)
+        specs.append({"name": column, "file": file_name, "encoding": encoding, **extra})
+    return specs
+
+
+def write_snapshot(csv_path: str, frame: pd.DataFrame, source: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Write ``frame`` as the new live snapshot for ``csv_path``; returns its
+    directory. ``source`` is the fingerprint taken before ``frame`` was
+    parsed (default: taken now). Nothing is written, and None is returned,
+    when the CSV has changed since then, as the rows would not match it.
+    """
+    source = source or source_fingerprint(csv_path)
+    stat = os.stat(csv_path)
+    if (stat.st_size, stat.st_mtime_ns) != (source["size"], source["mtime_ns"]):
+        return None
+    root = snapshot_root(csv_path)
+    os.makedirs(root, exist_ok=True)
+    version = f"v-{SNAPSHOT_FORMAT_VERSION}-{source['sha256'][:16]}"
+    version_dir = os.path.join(root, version)
+
+    if not os.path.isdir(version_dir):
+        staging = tempfile.mkdtemp(dir=root, prefix=".staging-")
+        os.chmod(staging, 0o755)
+        try:
+            specs = write_columns(staging, frame)
+            write_json_atomic(os.path.join(staging, MANIFEST_FILE), {
+                "format": SNAPSHOT_FORMAT_VERSION,
+                "version": version,
+                "source": source,
+                "rows": len(frame),
+                "columns": specs,
+            })
+            try:
+                os.rename(staging, version_dir)
+            except OSError:
+                # Another worker published the same version first
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    else:
+        # Same content under a new mtime: refresh the fingerprint in place
+        manifest = read_json(os.path.join(version_dir, MANIFEST_FILE)) or {}
+        if manifest:
+            manifest["source"] = source
+            write_json_atomic(os.path.join(version_dir, MANIFEST_FILE), manifest)
+
+    write_json_atomic(os.path.join(root, POINTER_FILE), {"version": version})
+    _prune_versions(root, keep=version)
+    return version_dir
+
+
+def _prune_versions(root: str, keep: str) -> None:
+    versions = [
+        entry for entry in os.listdir(root)
+        if entry.startswith("v-") and entry != keep
+    ]
+    versions.sort(key=lambda entry: os.path.getmtime(os.path.join(root, entry)), reverse=True)
+    for entry in versions[KEEP_OLD_VERSIONS:]:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
@@ -0,0 +1,123 @@
+# mcp-server-python/tests/test_aggregation.py
+"""Aggregates of the compacted frame against pandas on the frame as parsed (aggregation.py)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregation
+from aggregation import (
+    PartialAggregate,
+    TooManyPercentileValues,
+    parse_aggregate_request,
+    plan_aggregate,
+    run_aggregate,
+)
+from indexes import build_indexes
+from query_planner import QueryValidationError, evaluate_predicates
+from schema import compact_frame
+
+
+@pytest.fixture(scope="module")
+def parsed():
+    """Whole hours with gaps, as read_csv gives project_hours: float64 with NaN."""
+    rows = 300_001
+    rng = np.random.default_rng(3)
+    hours = rng.integers(200, 400, rows).astype(float)
+    hours[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "department": rng.choice(["Engineering", "Sales", "HR"], rows),
+        "project_hours": hours,
+    })
+
+
+def test_compaction_keeps_float_columns_at_float64(parsed):
+    assert compact_frame(parsed)["project_hours"].dtype == np.float64
+
+
+def test_aggregate_of_compacted_frame_matches_pandas(parsed):
+    frame = compact_frame(parsed)
+    body = {
+        "group_by": "department",
+        "metrics": [
+            {"op": "sum", "field": "project_hours"},
+            {"op": "mean", "field": "project_hours"},
+            {"op": "p90", "field": "project_hours"},
+        ],
+    }
+    plan, spec = plan_aggregate(frame, body, build_indexes(frame))
+    rows, matches = run_aggregate(frame, plan, spec, build_indexes(frame))
+    assert matches == len(parsed)
+
+    grouped = parsed.groupby("department")["project_hours"]
+    expected = pd.DataFrame({
+        "sum": grouped.sum(),
+        "mean": grouped.mean(),
+        "p90": grouped.quantile(0.9),
+    })
+    # Well past 2**24, where float32 stops holding whole numbers exactly
+    assert expected["sum"].min() > 2 ** 24
+    for row in rows:
+        reference = expected.loc[row["department"]]
+        assert row["sum_project_hours"] == reference["sum"]
+        assert row["mean_project_hours"] == reference["mean"]
+        assert row["p90_project_hours"] == reference["p90"]
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"metrics": "count"}, "Invalid metrics: count"),
+    ({"metrics": {"op": "count"}}, "Invalid metrics"),
+    ({"group_by": 5}, "Invalid group_by: 5"),
+    ({"group_by": ["department", ["id"]]}, "Invalid group_by"),
+    ({"limit": "5"}, "Invalid limit: 5"),
+    ({"limit": 5.9}, "Invalid limit: 5.9"),
+    ({"limit": True}, "Invalid limit: True"),
+    ({"limit": -1}, "Invalid limit: -1"),
+])
+def test_malformed_aggregate_requests_are_rejected(parsed, body, error):
+    with pytest.raises(QueryValidationError) as raised:
+        parse_aggregate_request(parsed, body)
+    assert raised.value.detail["error"].startswith(error)
+
+
+def test_aggregate_request_accepts_a_single_group_by_field(parsed):
+    spec = parse_aggregate_request(parsed, {"group_by": "department", "metrics": ["count"], "limit": 2})
+    assert spec.group_by == ["department"]
+    assert spec.limit == 2
+
+
+def aggregate_in_pieces(frame, plan, spec, rows_per_piece):
+    """PartialAggregate over consecutive pieces, merged as the parallel scanner does."""
+    merged = PartialAggregate(spec)
+    for start in range(0, len(frame), rows_per_piece):
+        piece = frame.iloc[start:start + rows_per_piece].reset_index(drop=True)
+        partial = PartialAggregate(spec)
+        partial.add(piece, evaluate_predicates(piece, plan))
+        merged.merge(partial)
+    return merged
+
+
+@pytest.mark.parametrize("body", [
+    {"group_by": "department", "metrics": [{"op": "p90", "field": "project_hours"}]},
+    {"metrics": ["count", {"op": "median", "field": "project_hours"}, {"op": "p5", "field": "project_hours"}]},
+    {"group_by": "department", "department": "Sales",
+     "metrics": [{"op": "mean", "field": "project_hours"}, {"op": "p99.5", "field": "project_hours"}]},
+    {"ranges": {"project_hours": {"gt": 1000}}, "metrics": [{"op": "p50", "field": "project_hours"}]},
+])
+def test_percentiles_in_pieces_match_the_whole_frame(parsed, body):
+    frame = compact_frame(parsed)
+    plan, spec = plan_aggregate(frame, body)
+    merged = aggregate_in_pieces(frame, plan, spec, 40_000)
+    # Counts per distinct (department, hours) pair, not one entry per matching row
+    assert len(merged.value_counts["project_hours"]) <= 3 * 200
+    assert merged.records(frame.iloc[:0]) == pytest.approx(run_aggregate(frame, plan, spec)[0])
+
+
+def test_percentiles_over_too_many_distinct_values_are_refused(parsed, monkeypatch):
+    monkeypatch.setattr(aggregation, "PERCENTILE_MAX_VALUES", 150)
+    frame = compact_frame(parsed)
+    plan, spec = plan_aggregate(frame, {"metrics": [{"op": "p90", "field": "project_hours"}]})
+    merged = aggregate_in_pieces(frame, plan, spec, 100_000)
+    assert merged.value_counts == {}
+    with pytest.raises(TooManyPercentileValues):
+        merged.records(frame.iloc[:0])
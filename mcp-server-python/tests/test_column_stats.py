@@ -0,0 +1,130 @@
+# mcp-server-python/tests/test_column_stats.py
+"""Bounds of estimate-mode answers (column_stats.py)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from column_stats import CONFIDENCE, SAMPLE_ROWS, DatasetStats, wilson_interval
+from indexes import build_indexes, extend_indexes
+from query_planner import plan_request, select_positions
+from schema import compact_frame, extend_frame
+
+
+@pytest.fixture(scope="module")
+def correlated():
+    """Two perfectly correlated text columns: kind == 'x' exactly when group == 'p'."""
+    rows = 50_000
+    even = np.arange(rows) % 2 == 0
+    frame = pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "kind": np.where(even, "x", "y"),
+        "group": np.where(even, "p", "q"),
+        "hours": np.arange(rows) % 400,
+    })
+    indexes = build_indexes(frame)
+    return frame, indexes, DatasetStats.build(frame, indexes)
+
+
+def test_wilson_interval_without_matches_starts_at_zero():
+    low, high = wilson_interval(0, 10_000, 50_000)
+    assert low == 0
+    assert 0 < high < 50
+
+
+def test_wilson_interval_with_every_row_matching_ends_at_row_count():
+    low, high = wilson_interval(10_000, 10_000, 50_000)
+    assert high == 50_000
+    assert 49_950 < low < 50_000
+
+
+def test_wilson_interval_contains_scaled_share():
+    low, high = wilson_interval(500, 10_000, 50_000)
+    assert low < 2_500 < high
+
+
+def test_estimate_without_sample_matches_keeps_lower_bound_at_zero(correlated):
+    frame, indexes, stats = correlated
+    # Each condition matches half the rows, together none of them
+    plan = plan_request(frame, {"kind": "x", "group": "q", "mode": "estimate"}, indexes)
+    assert select_positions(frame, plan, indexes)[1] == 0
+
+    estimate = stats.estimate(plan)
+    assert estimate.sample_matches == 0
+    assert estimate.method == 'sample'
+    assert estimate.lower == 0
+    assert estimate.count == 0
+    assert estimate.upper > 0
+
+
+def test_estimate_bounds_contain_the_exact_count(correlated):
+    frame, indexes, stats = correlated
+    for body in (
+        {"kind": "x", "group": "p"},
+        {"kind": "y", "ranges": {"hours": {"gte": 100, "lt": 250}}},
+        {"hours": [5, 6, 7]},
+        {"ranges": {"hours": {"gt": 399}}},
+    ):
+        plan = plan_request(frame, {**body, "mode": "estimate"}, indexes)
+        exact = select_positions(frame, plan, indexes)[1]
+        for sample in (True, False):
+            plan.sample = sample
+            estimate = stats.estimate(plan)
+            assert estimate.lower <= estimate.count <= estimate.upper
+            assert estimate.lower <= exact <= estimate.upper, (body, sample, estimate)
+            if not sample:
+                assert estimate.confidence == 1.0
+            else:
+                assert estimate.confidence in (1.0, CONFIDENCE)
+
+
+def people(first_id: int, rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, 500, rows).astype(float)
+    hours[rng.random(rows) < 0.02] = np.nan
+    return pd.DataFrame({
+        "id": np.arange(first_id, first_id + rows),
+        "team": rng.choice(["a", "b", "c"], rows),
+        "hours": hours,
+        "joined": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2_000, rows), unit="D"),
+    })
+
+
+def test_extended_statistics_match_a_rebuild():
+    frame = compact_frame(people(1, 30_000, 1))
+    indexes = build_indexes(frame)
+    stats = DatasetStats.build(frame, indexes)
+    # The appended rows repeat some values and bring new ones
+    tail = people(30_001, 25_000, 2)
+    tail["hours"] += 250
+    extended = extend_frame(frame, tail)
+    extended_indexes = extend_indexes(indexes, extended, len(frame))
+
+    grown = stats.extend(extended, extended_indexes, len(frame))
+    rebuilt = DatasetStats.build(extended, extended_indexes)
+    assert grown.row_count == len(extended)
+    for column, histogram in rebuilt.ranges.items():
+        assert grown.ranges[column].present == histogram.present
+        assert grown.ranges[column].distinct == histogram.distinct
+        assert np.array_equal(grown.ranges[column].ranks, histogram.ranks)
+        assert np.array_equal(grown.ranges[column].values, histogram.values)
+    assert grown.text["team"].present == rebuilt.text["team"].present
+
+    positions = grown.sample_positions
+    assert len(positions) == SAMPLE_ROWS
+    assert np.all(np.diff(positions) > 0)
+    assert grown.sample.equals(extended.take(positions).reset_index(drop=True))
+    # A uniform sample holds the appended rows in proportion
+    appended_share = np.mean(positions >= len(frame))
+    assert abs(appended_share - 25_000 / 55_000) < 0.02
+
+    plan = plan_request(extended, {"team": "a", "ranges": {"hours": {"gte": 400}}, "mode": "estimate"}, extended_indexes)
+    estimate = grown.estimate(plan)
+    assert estimate.lower <= select_positions(extended, plan, extended_indexes)[1] <= estimate.upper
+
+
+def test_extended_statistics_of_a_small_frame_sample_every_row():
+    frame = compact_frame(people(1, 4_000, 3))
+    indexes = build_indexes(frame)
+    extended = extend_frame(frame, people(4_001, 3_000, 4))
+    grown = DatasetStats.build(frame, indexes).extend(extended, extend_indexes(indexes, extended, 4_000), 4_000)
+    assert np.array_equal(grown.sample_positions, np.arange(7_000))
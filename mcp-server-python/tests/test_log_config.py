@@ -0,0 +1,31 @@
+# mcp-server-python/tests/test_log_config.py
+"""Records are queued unformatted and rendered by the listener's handler (log_config.py)."""
+import json
+import logging
+import queue
+
+from log_config import JsonFormatter, RecordQueueHandler
+
+
+class Probe:
+    """A log argument that counts how often it is rendered."""
+
+    def __init__(self):
+        self.renders = 0
+
+    def __str__(self):
+        self.renders += 1
+        return "probe"
+
+
+def test_records_are_queued_unformatted():
+    records = queue.SimpleQueue()
+    probe = Probe()
+    record = logging.LogRecord("mcp_server", logging.INFO, __file__, 1, "Rendered %s", (probe,), None)
+    RecordQueueHandler(records).handle(record)
+
+    queued = records.get_nowait()
+    assert (queued.msg, queued.args) == ("Rendered %s", (probe,))
+    assert probe.renders == 0
+    assert json.loads(JsonFormatter().format(queued))["message"] == "Rendered probe"
+    assert probe.renders == 1
@@ -0,0 +1,481 @@
+# mcp-server-python/tests/test_query_reference.py
+"""
+Query answers checked against plain pandas over the same CSV.
+
+The server's planner, indexes, pagination, batching, aggregation and query
+modes all have to agree with a straightforward boolean-mask evaluation of
+the request on a frame read with pd.read_csv.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import indexes as index_module
+import main
+import parallel_scan
+import shared_dataset
+import snapshot_store
+from benchmarks.generate_data import generate
+from parallel_scan import ParallelScanner
+from aggregation import plan_aggregate
+from query_planner import plan_request, select_positions
+
+# More rows than column_stats.SAMPLE_ROWS, so estimates come from a sample
+ROWS = 40_000
+
+TEXT_COLUMNS = ('name', 'department', 'status', 'role')
+
+QUERIES = [
+    {},
+    {"department": "Engineering"},
+    {"department": "engineering", "status": ["inactive", "ON_LEAVE"]},
+    {"role": "manager"},
+    {"role": "developer", "ranges": {"project_hours": {"gte": 150, "lt": 200}}},
+    {"ranges": {"join_date": {"after": "2020-01-01", "before": "2021-06-30"}}},
+    {"ranges": {"project_hours": {"gt": 300}, "join_date": {"before": "2010-01-01"}}},
+    {"name": "alice", "department": ["Sales", "Legal"]},
+    {"project_hours": 140},
+    {"search": "research"},
+    {"search": "sales man"},
+    {"department": "Engineering", "role": "sales"},
+    {"department": "Nowhere"},
+    {"status": "on_leave", "sort_by": "project_hours", "sort_order": "desc", "limit": 25, "offset": 10},
+    {"department": "Finance", "sort_by": "join_date", "limit": 40},
+    {"sort_by": "name", "limit": 15, "offset": 39_990},
+]
+
+
+@pytest.fixture(scope="module")
+def data_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("data") / "employees.csv")
+    generate(path, ROWS, seed=7)
+    return path
+
+
+@pytest.fixture(scope="module")
+def reference(data_path):
+    return pd.read_csv(data_path, parse_dates=['join_date'])
+
+
+@pytest.fixture(scope="module")
+def client(data_path):
+    """The app serving the generated file; the sample data is reloaded afterwards."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main, "DATA_FILE_PATH", data_path)
+        patch.setattr(main, "DATA_WATCH_ENABLED", False)
+        main.load_data()
+        assert len(main.dataset.frame) == ROWS
+        yield TestClient(main.app)
+    main.load_data()
+
+
+def reference_mask(frame: pd.DataFrame, body: dict) -> np.ndarray:
+    """Rows matching ``body`` by plain pandas comparisons."""
+    mask = pd.Series(True, index=frame.index)
+    for column in ('name', 'department', 'status'):
+        if column in body:
+            wanted = body[column] if isinstance(body[column], list) else [body[column]]
+            mask &= frame[column].str.lower().isin([value.lower() for value in wanted])
+    if 'role' in body:
+        mask &= frame['role'].str.lower().str.contains(body['role'].lower(), regex=False)
+    if 'project_hours' in body:
+        mask &= frame['project_hours'] == body['project_hours']
+    for column, conditions in body.get('ranges', {}).items():
+        values = frame[column]
+        for op, bound in conditions.items():
+            if column == 'join_date':
+                bound = pd.Timestamp(bound)
+            compare = {'gt': values.gt, 'gte': values.ge, 'lt': values.lt, 'lte': values.le,
+                       'after': values.gt, 'before': values.lt}[op]
+            mask &= compare(bound).fillna(False)
+    for token in body.get('search', '').lower().split():
+        mask &= np.logical_or.reduce([
+            frame[column].str.lower().str.contains(token, regex=False).fillna(False)
+            for column in TEXT_COLUMNS
+        ])
+    return mask.to_numpy(dtype=bool)
+
+
+def reference_ids(frame: pd.DataFrame, body: dict) -> list:
+    """Ids of the rows matching ``body`` in response order, before pagination."""
+    matches = frame[reference_mask(frame, body)]
+    field = body.get('sort_by')
+    if field is not None:
+        ascending = body.get('sort_order', 'asc') == 'asc'
+        matches = matches.sort_values([field, 'id'], ascending=[ascending, True], na_position='last')
+    return matches['id'].tolist()
+
+
+def reference_page(frame: pd.DataFrame, body: dict) -> list:
+    ids = reference_ids(frame, body)
+    offset = body.get('offset', 0)
+    limit = body.get('limit')
+    return ids[offset:] if limit is None else ids[offset:offset + limit]
+
+
+@pytest.mark.parametrize("build", ["none", "trigram", "scan"])
+@pytest.mark.parametrize("body", QUERIES)
+def test_select_positions_matches_pandas(client, reference, body, build, monkeypatch):
+    frame = main.dataset.frame
+    if build == "none":
+        indexes = None
+    elif build == "trigram":
+        indexes = main.dataset.indexes
+    else:
+        # Substring matches by scanning the vocabulary instead of trigrams
+        monkeypatch.setattr(index_module, "TRIGRAM_MAX_VOCABULARY", 0)
+        indexes = index_module.build_indexes(frame, trigram_columns=())
+    positions, total_matches = select_positions(frame, plan_request(frame, body, indexes), indexes)
+    assert total_matches == reference_mask(reference, body).sum()
+    assert frame['id'].to_numpy()[positions].tolist() == reference_page(reference, body)
+
+
+@pytest.mark.parametrize("body", QUERIES)
+def test_query_endpoint_matches_pandas(client, reference, body):
+    response = client.post('/query', json=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["total_matches"] == reference_mask(reference, body).sum()
+    assert [row["id"] for row in result["data"]] == reference_page(reference, body)
+
+
+@pytest.mark.parametrize("body", [
+    {"sort_by": "project_hours", "limit": 700},
+    {"department": "Sales", "sort_by": "join_date", "sort_order": "desc", "limit": 333},
+    {"role": "developer", "sort_by": "name", "limit": 1_000},
+    {"status": "inactive", "limit": 250},
+])
+def test_cursor_pages_concatenate_to_the_sorted_reference(client, reference, body):
+    ids, cursor = [], True
+    for _ in range(ROWS):
+        result = client.post('/query', json={**body, "cursor": cursor}).json()
+        ids += [row["id"] for row in result["data"]]
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == reference_ids(reference, body)
+
+
+def test_aggregate_matches_pandas_groupby(client, reference):
+    body = {
+        "status": "active",
+        "ranges": {"join_date": {"after": "2015-01-01"}},
+        "group_by": ["department"],
+        "metrics": [
+            "count",
+            {"op": "sum", "field": "project_hours"},
+            {"op": "mean", "field": "project_hours", "as": "mean_hours"},
+            {"op": "p90", "field": "project_hours", "as": "p90_hours"},
+            {"op": "max", "field": "join_date", "as": "latest"},
+        ],
+    }
+    response = client.post('/aggregate', json=body)
+    assert response.status_code == 200
+    groups = {row["department"]: row for row in response.json()["data"]}
+
+    matches = reference[reference_mask(reference, body)].groupby('department')
+    expected = pd.DataFrame({
+        "count": matches.size(),
+        "sum": matches['project_hours'].sum(),
+        "mean": matches['project_hours'].mean(),
+        "p90": matches['project_hours'].quantile(0.9),
+        "latest": matches['join_date'].max(),
+    })
+    assert sorted(groups) == sorted(expected.index)
+    for department, row in expected.iterrows():
+        group = groups[department]
+        assert group["count"] == row["count"]
+        assert group["sum_project_hours"] == row["sum"]
+        assert group["mean_hours"] == pytest.approx(row["mean"])
+        assert group["p90_hours"] == pytest.approx(row["p90"])
+        assert pd.Timestamp(group["latest"]) == row["latest"]
+
+
+def test_batch_results_match_pandas_and_isolate_invalid_queries(client, reference):
+    queries = QUERIES[1:8] + [{"department": "Sales", "limit": -1}]
+    response = client.post('/query/batch', json={"queries": queries})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == len(queries)
+    for body, result in zip(queries[:-1], results):
+        assert result["success"] is True
+        assert result["total_matches"] == reference_mask(reference, body).sum()
+        assert [row["id"] for row in result["data"]] == reference_page(reference, body)
+    assert results[-1]["success"] is False
+    assert results[-1]["error"] == {"error": "Invalid limit: -1"}
+
+
+@pytest.mark.parametrize("body", QUERIES)
+def test_count_mode_matches_pandas(client, reference, body):
+    result = client.post('/query', json={**body, "mode": "count"}).json()
+    assert result["data"] == []
+    assert result["total_matches"] == reference_mask(reference, body).sum()
+
+
+@pytest.mark.parametrize("body", [
+    {"department": "Engineering"},
+    {"status": "on_leave", "role": "manager"},
+    {"department": "Sales", "ranges": {"project_hours": {"gte": 100, "lt": 150}}},
+    {"ranges": {"join_date": {"after": "2022-01-01"}}, "search": "analyst"},
+])
+def test_estimate_bounds_contain_the_exact_count(client, reference, body):
+    result = client.post('/query', json={**body, "mode": "estimate"}).json()
+    bounds = result["bounds"]
+    assert bounds["lower"] <= result["total_matches"] <= bounds["upper"]
+    assert bounds["lower"] <= reference_mask(reference, body).sum() <= bounds["upper"]
+
+
+def test_estimate_without_sample_matches_keeps_lower_bound_at_zero(client, reference):
+    # Sales roles only occur in the Sales department
+    body = {"department": "Engineering", "role": "sales"}
+    assert reference_mask(reference, body).sum() == 0
+    result = client.post('/query', json={**body, "mode": "estimate", "sample": True}).json()
+    assert result["method"] == "sample"
+    assert result["sample"]["matches"] == 0
+    assert result["bounds"]["lower"] == 0
+    assert result["total_matches"] <= result["bounds"]["upper"]
+
+
+def test_snapshot_skipped_when_csv_changes_while_parsing(data_path, tmp_path, monkeypatch):
+    path = str(tmp_path / "employees.csv")
+    with open(data_path) as source:
+        lines = source.read().splitlines()
+    with open(path, "w") as target:
+        target.write("\n".join(lines[:101]) + "\n")
+    parse_csv = main.parse_csv
+
+    def parse_then_append(*args, **kwargs):
+        frame = parse_csv(*args, **kwargs)
+        with open(path, "a") as target:
+            target.write(lines[101] + "\n")
+        return frame
+
+    monkeypatch.setattr(main, "SNAPSHOT_ENABLED", True)
+    monkeypatch.setattr(main, "parse_csv", parse_then_append)
+    frame, _, state = main.read_data_file(path)
+    assert len(frame) == 100
+    assert state == main.UNKNOWN_STATE
+    assert snapshot_store.load_snapshot(path) is None
+
+    monkeypatch.setattr(main, "parse_csv", parse_csv)
+    frame, _, _ = main.read_data_file(path)
+    assert len(frame) == 101
+    assert len(snapshot_store.load_snapshot(path)) == 101
+
+
+@pytest.mark.parametrize("body", [
+    {"filters": ["department"]},
+    {"ranges": "project_hours"},
+    {"ranges": {"project_hours": 5}},
+    {"ranges": {"project_hours": {"lt": "abc"}}},
+    {"ranges": {"join_date": {"after": "not a date"}}},
+    {"ranges": {"project_hours": {"between": 5}}},
+    {"department": {"foo": "bar"}},
+    {"project_hours": {"contains": "1"}},
+    {"sort_by": ["id"]},
+    {"sort": ["id"]},
+    {"sort": {"field": "id", "order": ["asc"]}},
+    {"sort_by": "id", "sort_order": "sideways"},
+    {"limit": True},
+    {"limit": 2.5},
+    {"limit": "5"},
+    {"limit": -1},
+    {"offset": False},
+    {"offset": -3},
+    {"timeout_ms": True},
+    {"timeout_ms": "500"},
+    {"timeout_ms": 0},
+])
+def test_malformed_requests_are_rejected(client, body):
+    response = client.post('/query', json=body)
+    assert response.status_code == 400
+    assert "error" in response.json()["detail"]
+
+
+def test_well_formed_pagination_is_accepted(client, reference):
+    body = {"limit": 5, "offset": 2}
+    result = client.post('/query', json=body).json()
+    assert [row["id"] for row in result["data"]] == reference_page(reference, body)
+
+
+def test_memory_report_includes_indexes(client):
+    memory = client.get('/stats').json()["memory"]
+    assert memory["indexes"]["total_bytes"] == sum(memory["indexes"]["columns"].values()) > 0
+
+
+def test_result_computed_before_a_publish_is_not_cached(client, monkeypatch):
+    render_query = main.render_query
+
+    def render_then_publish(current, *args):
+        body = render_query(current, *args)
+        main.publish_dataset(current.frame, current.indexes, current.memory)
+        return body
+
+    monkeypatch.setattr(main, "render_query", render_then_publish)
+    before = main.result_cache.stats()["stale_puts"]
+    response = client.post('/query', json={"department": "Legal", "limit": 3})
+    assert response.status_code == 200
+    assert main.result_cache.stats()["entries"] == 0
+    assert main.result_cache.stats()["stale_puts"] == before + 1
+
+
+# Scan-heavy requests (substring and numeric predicates, sorted pages) for
+# comparing the other ways of holding the data with the in-memory path
+MODE_QUERIES = [
+    {"role": "manager"},
+    {"project_hours": 140, "sort_by": "join_date", "limit": 30},
+    {"search": "sales man", "sort_by": "name", "sort_order": "desc", "limit": 20, "offset": 5},
+    {"role": "developer", "sort_by": "project_hours", "limit": 50, "cursor": True},
+    {"department": "Engineering", "role": "sales"},
+    {"ranges": {"project_hours": {"gt": 300}}, "status": "active", "limit": 40},
+    # The page runs past the lowest project_hours into the rows that have none
+    {"sort_by": "project_hours", "sort_order": "desc", "offset": 39_800, "limit": 100},
+]
+
+MODE_AGGREGATES = [
+    {
+        "role": "developer",
+        "group_by": ["department", "status"],
+        "metrics": [
+            "count",
+            {"op": "sum", "field": "project_hours"},
+            {"op": "mean", "field": "project_hours"},
+            {"op": "p90", "field": "project_hours"},
+            {"op": "min", "field": "join_date"},
+        ],
+    },
+    {"search": "an", "metrics": ["count", {"op": "median", "field": "project_hours"}]},
+    {
+        "ranges": {"project_hours": {"gte": 150}},
+        "group_by": "department",
+        "metrics": [{"op": "p25", "field": "project_hours"}],
+        "limit": 3,
+    },
+]
+
+
+def without_metadata(result: dict) -> dict:
+    return {key: value for key, value in result.items() if key != "metadata"}
+
+
+def mode_answers(client) -> dict:
+    """Responses to MODE_QUERIES (rows and count) and MODE_AGGREGATES."""
+    return {
+        "rows": [without_metadata(client.post('/query', json=body).json()) for body in MODE_QUERIES],
+        "count": [
+            client.post('/query', json={**body, "mode": "count"}).json()["total_matches"]
+            for body in MODE_QUERIES
+        ],
+        "aggregate": [client.post('/aggregate', json=body).json()["data"] for body in MODE_AGGREGATES],
+    }
+
+
+def assert_same_answers(answers: dict, expected: dict) -> None:
+    assert answers["rows"] == expected["rows"]
+    assert answers["count"] == expected["count"]
+    for rows, expected_rows in zip(answers["aggregate"], expected["aggregate"]):
+        # Partial sums are added in another order
+        assert rows == pytest.approx(expected_rows)
+
+
+@pytest.fixture(scope="module")
+def in_memory(client):
+    assert main.dataset.source is None and main.dataset.partitions is None
+    return mode_answers(client)
+
+
+class CountingScanner(ParallelScanner):
+    """Counts the scans the worker processes completed."""
+
+    def __init__(self, workers: int):
+        super().__init__(workers)
+        self.scans = 0
+
+    def _map(self, fn, partitions, *args):
+        results = super()._map(fn, partitions, *args)
+        self.scans += 1
+        return results
+
+
+@pytest.fixture
+def parallel(client, tmp_path):
+    """The generated file split into partitions under tmp_path and scanned by two processes."""
+    scanner = CountingScanner(2)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(parallel_scan, "PARTITION_ROOT", str(tmp_path))
+        patch.setattr(main, "PARALLEL_MIN_ROWS", 1_000)
+        patch.setattr(main, "PARALLEL_WORKERS", 3)
+        patch.setattr(main, "parallel_scanner", scanner)
+        main.load_data()
+        assert len(main.dataset.partitions.partitions) == 3
+        assert len(list(tmp_path.iterdir())) == 3
+        yield scanner
+    scanner.shutdown()
+    main.load_data()
+
+
+def test_parallel_scans_match_the_in_memory_path(client, in_memory, parallel):
+    current = main.dataset
+    queries = [plan_request(current.frame, body, current.indexes) for body in MODE_QUERIES]
+    aggregates = [plan_aggregate(current.frame, body, current.indexes)[0] for body in MODE_AGGREGATES]
+    query_scans = sum(main.runs_parallel(current, plan) for plan in queries)
+    aggregate_scans = sum(main.runs_parallel(current, plan) for plan in aggregates)
+    assert query_scans >= 3 and aggregate_scans >= 2
+
+    assert_same_answers(mode_answers(client), in_memory)
+    # One scan for the rows and one for the count of each query; none fell back to one core
+    assert parallel.scans == 2 * query_scans + aggregate_scans
+
+
+@pytest.fixture
+def out_of_core(client):
+    """The generated file scanned per request in chunks of 7,000 rows."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main, "OUT_OF_CORE", True)
+        patch.setattr(main, "SCAN_CHUNK_ROWS", 7_000)
+        main.load_data()
+        assert main.dataset.source is not None
+        yield main.dataset.source
+    main.load_data()
+
+
+def test_chunked_scans_match_the_in_memory_path(client, in_memory, out_of_core):
+    assert [len(chunk) for chunk in out_of_core.chunks()] == [7_000] * 5 + [5_000]
+    assert_same_answers(mode_answers(client), in_memory)
+
+
+@pytest.fixture
+def shared(client, tmp_path):
+    """The generated file published as a shared version under tmp_path and served from its mapping."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(shared_dataset, "SHARED_ROOT", str(tmp_path))
+        patch.setattr(main, "SHARED_DATASET", True)
+        patch.setattr(main, "shared_store", None)
+        patch.setattr(main, "shared_version", None)
+        main.load_data()
+        assert main.shared_store.directory.startswith(str(tmp_path))
+        assert main.shared_store.leading and main.shared_version == main.shared_store.live_version()
+        yield main.shared_store
+    main.load_data()
+
+
+def test_shared_dataset_matches_the_in_memory_path(client, in_memory, shared):
+    assert_same_answers(mode_answers(client), in_memory)
+    # What another worker attaches serves the same rows
+    follower = shared_dataset.SharedDataset(main.DATA_FILE_PATH).attach()
+    assert follower.name == main.shared_version
+    assert follower.frame.astype(object).equals(main.dataset.frame.astype(object))
+
+
+@pytest.mark.parametrize("mode", [None, "parallel", "out_of_core", "shared"])
+def test_batches_match_the_in_memory_path(client, in_memory, request, mode):
+    if mode is not None:
+        request.getfixturevalue(mode)
+    queries = MODE_QUERIES + [{**body, "mode": "count"} for body in MODE_QUERIES] + [{"limit": -1}]
+    response = client.post('/query/batch', json={"queries": queries})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[:len(MODE_QUERIES)] == in_memory["rows"]
+    assert [result["total_matches"] for result in results[len(MODE_QUERIES):-1]] == in_memory["count"]
+    assert results[-1] == {"success": False, "error": {"error": "Invalid limit: -1"}}
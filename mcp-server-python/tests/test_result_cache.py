@@ -0,0 +1,27 @@
+# mcp-server-python/tests/test_result_cache.py
+"""Bounds, expiry and version checks of the response cache (result_cache.py)."""
+from result_cache import ResultCache
+
+
+def test_puts_for_an_older_dataset_version_are_dropped():
+    cache = ResultCache(max_bytes=1024, max_entries=8, ttl_seconds=60)
+    cache.clear(1)
+    assert cache.put((1, "q"), b"old", version=1)
+    cache.clear(2)
+    assert cache.get((1, "q")) is None
+    # Computed for version 1 but finished after version 2 was published
+    assert not cache.put((1, "q"), b"old", version=1)
+    assert cache.put((2, "q"), b"new", version=2)
+    assert cache.get((2, "q")) == b"new"
+    assert cache.stats()["stale_puts"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ResultCache(max_bytes=10, max_entries=8, ttl_seconds=60)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.stats()["evictions"] == 1